@@ -13,15 +13,42 @@ from .core import (
     rename_files,
     should_process_file,
     
+    # Manifest uploads
+    upload_manifest,
+    
+    # Watch mode
+    watch_folder,
+    
     # Downloader
     download_folder,
     
+    # Mirror mode
+    mirror_folder,
+    
     # Browser
     list_folders,
     list_s3_folder_objects,
+    iter_objects,
+    
+    # Search
+    search_objects,
+    search_bucket,
+    
+    # Storage usage
+    folder_usage,
+    disk_usage,
+    
+    # Folder manifests
+    write_folder_manifest,
+    read_folder_manifest,
+    
+    # Listing filters
+    parse_filter,
     
     # Formatter
-    format_output
+    format_output,
+    write_output,
+    write_results
 )
 
 # Import and export config functions
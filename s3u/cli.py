@@ -4,6 +4,7 @@ import os
 import sys
 import argparse
 import asyncio
+import contextlib
 import readline
 
 # Import functions from core modules
@@ -12,9 +13,19 @@ from .core import (
     list_s3_folder_objects, 
     check_folder_exists, 
     download_folder,
-    list_folders
+    list_folders,
+    search_bucket,
+    disk_usage,
+    upload_manifest,
+    watch_folder,
+    mirror_folder
 )
 
+from .core.archive import is_archive, ARCHIVE_EXTENSIONS
+from .core.uploader import EXTENSION_GROUPS
+from .core.filters import parse_filter
+from .core.inventory import set_inventory_source
+
 # Import optimizer
 from .optimizer import process_directory as optimize_images
 
@@ -91,13 +102,6 @@ def get_input(prompt, default=None):
     value = input(prompt).strip()
     return value if value else default
 
-# Define common extension groups for easy selection
-EXTENSION_GROUPS = {
-    "images": ["jpg", "jpeg", "png", "gif", "webp", "svg"],
-    "videos": ["mp4", "mov", "avi", "webm", "mkv"],
-    "documents": ["pdf", "doc", "docx", "txt", "md"],
-}
-
 def parse_extensions(extensions_input):
     """
     Parse file extensions input and return a normalized list.
@@ -226,20 +230,71 @@ async def main():
     # Create argument parser for optional command line arguments FIRST
     parser = argparse.ArgumentParser(description="Upload files to S3 bucket with optional renaming.")
     parser.add_argument("-c", "--concurrent", type=int, help="Maximum concurrent uploads")
+    parser.add_argument("-p", "--processes", type=int, help="Number of upload worker processes (each runs -c uploads)")
     parser.add_argument("-b", "--browse", metavar="FOLDER", help="Get CDN links from an existing folder in the bucket")
     parser.add_argument("-d", "--download", metavar="FOLDER", help="Download all files from a folder in the bucket")
     parser.add_argument("-o", "--output", metavar="DIR", help="Output directory for downloads (used with -d)")
+    parser.add_argument("-dc", "--download-concurrent", metavar="N", help="Concurrent download requests, or 'auto' to tune from throughput (used with -d)")
+    parser.add_argument("--archive", metavar="FILE", help="Download into a .zip/.tar/.tar.gz archive instead of files ('-' for a tar on stdout, used with -d)")
+    parser.add_argument("--filter", metavar="EXPR", help="Only include matching objects (used with -b, -d, --search, --du or --mirror), e.g. \"ext:images size<5MB since:7d\"")
+    parser.add_argument("--fsync", choices=["none", "batch", "always"], help="When downloaded files are flushed to disk (used with -d, default: batch)")
+    parser.add_argument("--force", action="store_true", help="Download every file again instead of skipping unchanged ones (used with -d)")
     parser.add_argument("-ls", "--list", action="store_true", help="List all folders in the bucket with item count")
+    parser.add_argument("--du", nargs="?", const="", metavar="FOLDER", help="Show storage used by a folder (or the whole bucket) and its subfolders")
+    parser.add_argument("--depth", type=int, default=1, help="Levels of subfolders to total separately (used with --du, default: 1)")
+    parser.add_argument("--search", metavar="QUERY", help="Find files anywhere in the bucket by name, e.g. hero_banner or \"hero_*.jpg\"")
+    parser.add_argument("--inventory", metavar="SOURCE", help="Load listings from S3 Inventory reports (s3://bucket/prefix or a local directory) instead of listing S3")
+    parser.add_argument("--refresh", action="store_true", help="Refresh the local listing index before answering (used with -ls, -b, --search or --du)")
     parser.add_argument("-config", nargs="*", metavar="OPTION [VALUE]", help="Configure persistent settings (use without args to show all options)")
     parser.add_argument("-setup", action="store_true", help="Run the setup wizard to configure S3U")
     parser.add_argument("-q", "--quick", action="store_true", help="Quick mode: skip all prompts and use default settings with folder 'default'")
-    parser.add_argument("count", nargs="?", type=int, help="Optional number of files to process (for -b or -d)")
+    parser.add_argument("count", nargs="?", help="Optional number of files to process (for -b, -d or --search)")
     parser.add_argument("-f", "--first", action="store_true", help="Copy only the first URL to clipboard")
+    parser.add_argument("--output-file", metavar="FILE", help="Write the URL output to a file instead of the clipboard ('-' for stdout, used with -b, --search, --manifest and uploads)")
     parser.add_argument("-sf", "--subfolder-mode", choices=["ignore", "pool", "preserve"], 
                         help="How to handle subfolders: ignore, pool, or preserve")
-    parser.add_argument("path", nargs="?", help="Path to the directory containing files to upload")
+    parser.add_argument("--manifest", metavar="FILE", help="Upload the files listed in a CSV or JSONL manifest")
+    parser.add_argument("--folder", metavar="FOLDER", help="S3 folder for non-interactive uploads and mirroring (used with --manifest, --watch or --mirror)")
+    parser.add_argument("--rename-map", metavar="FILE", help="Write a CSV mapping local files to their S3 keys and URLs")
+    parser.add_argument("--watch", action="store_true", help="Keep running and upload new or changed files in the source directory")
+    parser.add_argument("--mirror", choices=["up", "down"], help="Make --folder match the local path (up) or the local path match --folder (down)")
+    parser.add_argument("--delete", action="store_true", help="Delete files that exist only in the destination (used with --mirror)")
+    parser.add_argument("--dry-run", action="store_true", help="Print what would be transferred or deleted without changing anything (used with --mirror)")
+    parser.add_argument("--checksum", action="store_true", help="Compare files by MD5 instead of modification time (used with --mirror)")
+    parser.add_argument("path", nargs="?", help="Path to the directory (or zip/tar archive) containing files to upload")
     args = parser.parse_args()
     
+    # A lone path lands in the count slot (e.g. 's3u --watch ./renders'), so move it over
+    if args.count is not None:
+        try:
+            args.count = int(args.count)
+        except ValueError:
+            if args.path is not None:
+                parser.error(f"argument count: invalid int value: '{args.count}'")
+            args.path, args.count = args.count, None
+    
+    # An inventory source on the command line replaces the configured one for this run
+    if args.inventory:
+        set_inventory_source(args.inventory)
+    
+    # With the output on stdout, messages and prompts are printed to stderr
+    output_file = args.output_file
+    messages = contextlib.nullcontext()
+    if output_file == '-':
+        output_file = sys.stdout
+        messages = contextlib.redirect_stdout(sys.stderr)
+    
+    with messages:
+        return await run_command(args, output_file)
+
+async def run_command(args, output_file=None):
+    """
+    Run the command selected by the parsed arguments.
+    
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+        output_file (str or file): Where URL output goes instead of the clipboard, if anywhere
+    """
     # Check if quick mode is enabled
     quick_mode = args.quick
     
@@ -250,23 +305,121 @@ async def main():
         print("\nSetup completed. Run 's3u' again to use the tool.")
         return
 
-    # Handle special commands next (config, list, browse, download)
+    # Handle special commands next (config, list, browse, search, du, download)
     if args.config is not None:
         return handle_config_command(args.config)
     
     if args.list:
-        return await list_folders()
+        folders = await list_folders(refresh=args.refresh)
+        if not folders:
+            print("No folders found in S3 bucket")
+            return folders
+        print("Folders in S3 bucket:")
+        print("-" * 50)
+        print(f"{'Folder Name':<40} {'Items':<10}")
+        print("-" * 50)
+        for folder, count in folders:
+            print(f"{folder:<40} {count:<10}")
+        print("-" * 50)
+        print(f"Total: {len(folders)} folders")
+        return folders
+    
+    # Validate the listing filter before any requests are made
+    object_filter = None
+    if args.filter:
+        try:
+            object_filter = parse_filter(args.filter)
+        except ValueError as e:
+            print(f"Error: Invalid filter: {str(e)}")
+            return
     
     if args.browse:
         # Load config for format setting
         config = load_config()
         count = args.count or 0  # 0 means all files
-        return await list_s3_folder_objects(args.browse, limit=count, output_format=config.get('format', 'array'))
+        return await list_s3_folder_objects(args.browse, limit=count, output_format=config.get('format', 'array'),
+                                            object_filter=object_filter, refresh=args.refresh,
+                                            output_file=output_file)
+    
+    if args.du is not None:
+        return await disk_usage(args.du, depth=max(args.depth, 0), object_filter=object_filter, refresh=args.refresh)
+    
+    if args.search:
+        config = load_config()
+        return await search_bucket(args.search, limit=args.count or 0, output_format=config.get('format', 'array'),
+                                   object_filter=object_filter, refresh=args.refresh, output_file=output_file)
     
     if args.download:
         count = args.count or 0  # 0 means all files
         output_dir = args.output or '.'
-        return await download_folder(args.download, output_dir, limit=count)
+        config = load_config()
+        download_concurrent = args.download_concurrent or config.get('download_concurrent', 'auto')
+        if str(download_concurrent).lower() == 'auto':
+            download_concurrent = 'auto'
+        else:
+            try:
+                download_concurrent = int(download_concurrent)
+            except ValueError:
+                print(f"Error: Download concurrency must be 'auto' or a number, got: {download_concurrent}")
+                return
+        return await download_folder(args.download, output_dir, limit=count, force=args.force,
+                                     max_concurrent=download_concurrent, archive=args.archive,
+                                     object_filter=object_filter, fsync=args.fsync or config.get('fsync', 'batch'))
+    
+    if args.mirror:
+        config = load_config()
+        local_dir = args.path or '.'
+        return await mirror_folder(
+            local_dir,
+            args.folder or os.path.basename(os.path.abspath(local_dir)),
+            direction=args.mirror,
+            delete=args.delete,
+            dry_run=args.dry_run,
+            max_concurrent=args.concurrent or config.get('concurrent', 5),
+            object_filter=object_filter,
+            checksum=args.checksum
+        )
+    
+    if args.manifest:
+        config = load_config()
+        return await upload_manifest(
+            args.manifest,
+            s3_folder=args.folder,
+            max_concurrent=args.concurrent or config.get('concurrent', 5),
+            output_format=config.get('format', 'array'),
+            only_first=args.first,
+            processes=args.processes or config.get('processes', 1),
+            output_file=output_file
+        )
+    
+    if args.watch:
+        config = load_config()
+        watch_dir = args.path or '.'
+        if not os.path.isdir(watch_dir):
+            print(f"Error: Path does not exist or is not a directory: {watch_dir}")
+            return
+        
+        # Optimize each batch only when optimization is always on
+        optimization_options = None
+        if config.get('optimize', 'auto') == 'always':
+            optimization_options = {
+                'size': config.get('size', 'optimized'),
+                'output_format': config.get('image_format', 'webp'),
+                'video_format': config.get('video_format', 'mp4'),
+                'optimize_videos': config.get('optimize_videos', 'no') == 'yes',
+                'preset': config.get('video_preset', 'medium'),
+                'max_workers': config.get('max_workers', 4),
+                'remove_audio': config.get('remove_audio', 'no') == 'yes'
+            }
+        
+        return await watch_folder(
+            watch_dir,
+            args.folder or os.path.basename(os.path.abspath(watch_dir)),
+            subfolder_mode=args.subfolder_mode or config.get('subfolder_mode', 'ignore'),
+            max_concurrent=args.concurrent or config.get('concurrent', 5),
+            output_format=config.get('format', 'array'),
+            optimization_options=optimization_options
+        )
     
     # Load configuration
     config = load_config()
@@ -303,6 +456,7 @@ async def main():
     
     # Set the source directory from path argument if provided
     source_dir = '.'
+    archive_path = None
     if args.path:
         source_dir = args.path
         
@@ -312,11 +466,16 @@ async def main():
             source_dir = source_dir[1:-1]
             
         # Verify path exists
-        if not os.path.isdir(source_dir):
-            print(f"Error: Path does not exist or is not a directory: {source_dir}")
+        if is_archive(source_dir):
+            # Archives are uploaded member by member without extracting
+            archive_path = os.path.abspath(source_dir)
+            source_dir = '.'
+            print(f"Using source archive: {archive_path}")
+        elif not os.path.isdir(source_dir):
+            print(f"Error: Path does not exist or is not a directory or archive: {source_dir}")
             return
-        
-        print(f"Using source directory: {source_dir}")
+        else:
+            print(f"Using source directory: {source_dir}")
     
     # Change working directory to source_dir if it's different from current
     original_dir = os.getcwd()
@@ -330,6 +489,13 @@ async def main():
     
     # Get current directory name as default folder name
     current_dir = os.path.basename(os.path.abspath('.'))
+    if archive_path:
+        # Default to the archive name without its extension
+        current_dir = os.path.basename(archive_path)
+        for ext in ARCHIVE_EXTENSIONS:
+            if current_dir.lower().endswith(ext):
+                current_dir = current_dir[:-len(ext)]
+                break
     
     # Use command line argument if provided, otherwise use config value
     # concurrent = args.concurrent or config.get('concurrent', 5)
@@ -350,7 +516,7 @@ async def main():
         subfolder_mode = args.subfolder_mode or config.get('subfolder_mode', 'ignore')
         
         # Use config settings for optimization
-        optimize = config.get('optimize', 'auto') == 'always'
+        optimize = config.get('optimize', 'auto') == 'always' and not archive_path
         optimize_size = config.get('size', 'optimized')
         image_format = config.get('image_format', 'webp')
         video_format = config.get('video_format', 'mp4')
@@ -393,7 +559,7 @@ async def main():
             only_videos = all(ext.lower() in video_extensions for ext in extensions)
         
         # Check for subfolders
-        subfolders = scan_for_subfolders('.')
+        subfolders = scan_for_subfolders('.') if not archive_path else []
         has_subfolders = len(subfolders) > 0
         
         # Determine subfolder mode
@@ -446,7 +612,7 @@ async def main():
         remove_audio = False
         optimization_options = None
         
-        if not only_videos:
+        if not only_videos and not archive_path:
             # Use config setting for optimize
             optimize_config = config.get('optimize', 'auto')
             
@@ -583,7 +749,7 @@ async def main():
         # If the user pressed tab or seems to be looking for completion, then fetch folders
         if not folder or folder == current_dir:
             print("Fetching existing folders for tab completion...")
-            folder_tuples = await list_folders()
+            folder_tuples = await list_folders(counts=False)
             existing_folders = [folder for folder, _ in folder_tuples]
             print(f"Found {len(existing_folders)} folders")
             
@@ -652,7 +818,12 @@ async def main():
     else:
         print("  No renaming")
     print(f"  Output Format: {selected_format.capitalize()} (from config)")
+    if output_file:
+        print(f"  Output File: {'stdout' if output_file is sys.stdout else output_file}")
     print(f"  Concurrent Uploads: {concurrent} (from config)")
+    processes = args.processes or config.get('processes', 1)
+    if processes > 1:
+        print(f"  Upload Processes: {processes}")
     
     # Check if user wants to cancel (non-quick mode only)
     if confirm.lower() != 'y':
@@ -689,11 +860,14 @@ async def main():
         rename_mode=rename_mode,
         only_first=only_first,
         max_concurrent=concurrent,
-        source_dir=source_dir if source_dir == '.' else os.path.abspath(source_dir),  # Use absolute path if not current dir
+        source_dir=archive_path or (source_dir if source_dir == '.' else os.path.abspath(source_dir)),  # Use absolute path if not current dir
         specific_files=optimized_files,
         include_existing=include_existing,
         output_format=selected_format,
-        subfolder_mode=subfolder_mode
+        subfolder_mode=subfolder_mode,
+        rename_map=args.rename_map,
+        processes=args.processes or config.get('processes', 1),
+        output_file=output_file
     )
     
     # Important: Change back to original directory if we changed it
@@ -23,7 +23,16 @@ CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.json')
 # Default configuration settings
 DEFAULT_CONFIG = {
     "format": "array",
+    "clipboard_limit": 5,       # Largest output (MB) copied to the clipboard; bigger output is saved to a file
     "concurrent": 5,
+    "processes": 1,             # Upload worker processes (each runs 'concurrent' uploads)
+    "download_concurrent": "auto",  # Concurrent download requests, or auto-tuned
+    "fsync": "batch",           # When downloads are flushed to disk (none, batch, always)
+    "use_index": "no",          # Answer listings from the local index in ~/.s3u
+    "index_max_age": 300,       # Seconds an indexed listing stays fresh
+    "inventory": "",            # S3 Inventory reports to list from (s3:// location or local path)
+    "folder_manifest": "no",    # Write _manifest.json on upload and read it when browsing
+    "manifest_max_age": 86400,  # Seconds a folder manifest is trusted before the folder is listed
     "optimize": "auto",
     "size": "optimized",
     "rename_mode": "replace",
@@ -46,14 +55,59 @@ DEFAULT_CONFIG = {
 CONFIG_OPTIONS = {
     "format": {
         "description": "Output format for generated URLs",
-        "values": ["array", "json", "xml", "html", "csv"],
+        "values": ["array", "json", "ndjson", "xml", "html", "csv"],
         "default": "array"
     },
+    "clipboard_limit": {
+        "description": "Largest output (MB) copied to the clipboard; larger output is saved to a file instead",
+        "values": [1, 5, 10, 50, 100],
+        "default": 5
+    },
     "concurrent": {
         "description": "Default number of concurrent uploads",
         "values": list(range(1, 21)),  # 1-20
         "default": 5
     },
+    "processes": {
+        "description": "Number of upload worker processes (each runs 'concurrent' uploads)",
+        "values": list(range(1, 65)),  # 1-64
+        "default": 1
+    },
+    "download_concurrent": {
+        "description": "Concurrent download requests ('auto' tunes from throughput and throttling)",
+        "values": ["auto"] + list(range(1, 257)),  # auto or 1-256
+        "default": "auto"
+    },
+    "fsync": {
+        "description": "When downloaded files are flushed to disk ('batch' syncs groups of files)",
+        "values": ["none", "batch", "always"],
+        "default": "batch"
+    },
+    "use_index": {
+        "description": "Answer folder listings from a local index of the bucket (~/.s3u/index.sqlite)",
+        "values": ["yes", "no"],
+        "default": "no"
+    },
+    "index_max_age": {
+        "description": "Seconds an indexed listing is used before it is refreshed from S3",
+        "values": [0, 60, 300, 900, 3600, 86400],
+        "default": 300
+    },
+    "inventory": {
+        "description": "S3 Inventory reports to load listings from (s3://bucket/prefix or a local directory, 'none' to list S3)",
+        "values": [],  # Any location
+        "default": ""
+    },
+    "folder_manifest": {
+        "description": "Write a _manifest.json to each folder on upload and read it instead of listing when browsing",
+        "values": ["yes", "no"],
+        "default": "no"
+    },
+    "manifest_max_age": {
+        "description": "Seconds a folder manifest is trusted before the folder is listed instead",
+        "values": [300, 3600, 86400, 604800],
+        "default": 86400
+    },
     "optimize": {
         "description": "Default image optimization setting",
         "values": ["auto", "always", "never"],
@@ -219,6 +273,23 @@ def validate_option(option, value):
         except ValueError:
             return False, f"Value for {option} must be an integer"
     
+    if option == "download_concurrent":
+        if str(value).lower() == "auto":
+            return True, f"Set {option} to auto"
+        try:
+            num_value = int(value)
+            if num_value in CONFIG_OPTIONS[option]["values"]:
+                return True, f"Set {option} to {num_value}"
+            else:
+                return False, f"Value for {option} must be 'auto' or between 1 and 256"
+        except ValueError:
+            return False, f"Value for {option} must be 'auto' or an integer"
+    
+    if option == "inventory":
+        if str(value).lower() in ("", "none"):
+            return True, "Listings come from S3 (no inventory source)"
+        return True, f"Set {option} to {value}"
+    
     # For string options, convert to lowercase for case-insensitive comparison
     if isinstance(value, str):
         value_lower = value.lower()
@@ -259,6 +330,10 @@ def configure_option(option, value=None):
             # Get the proper case for string values
             if option == "concurrent":
                 proper_value = int(value)
+            elif option == "download_concurrent":
+                proper_value = "auto" if str(value).lower() == "auto" else int(value)
+            elif option == "inventory":
+                proper_value = "" if value.lower() == "none" else value
             else:
                 value_lower = value.lower()
                 allowed_values = [str(v).lower() for v in CONFIG_OPTIONS[option]["values"]]
@@ -296,6 +371,32 @@ def configure_option(option, value=None):
                     print(f"Value must be between 1 and 20")
             except ValueError:
                 print("Please enter a valid integer")
+    elif option == "download_concurrent":
+        # Numeric option with an 'auto' setting, also text input
+        while True:
+            user_input = input(f"Enter new value (auto or 1-256) [{current_value}]: ").strip()
+            if not user_input:
+                return False  # Keep current value
+            
+            is_valid, message = validate_option(option, user_input)
+            if is_valid:
+                config[option] = "auto" if user_input.lower() == "auto" else int(user_input)
+                save_config(config)
+                print(message)
+                return True
+            else:
+                print(message)
+    elif option == "inventory":
+        # Free-form location, also text input
+        user_input = input(f"Enter an s3:// location or local path ('none' to list S3) [{current_value}]: ").strip()
+        if not user_input:
+            return False  # Keep current value
+        
+        is_valid, message = validate_option(option, user_input)
+        config[option] = "" if user_input.lower() == "none" else user_input
+        save_config(config)
+        print(message)
+        return True
     else:
         # For string options, use questionary if available
         if QUESTIONARY_AVAILABLE:
@@ -6,30 +6,74 @@ Core S3 operations for the s3u utility.
 from .s3_core import (
     check_folder_exists,
     ensure_s3_folder_exists,
-    get_s3_session
+    get_s3_session,
+    get_s3_client
 )
 
 from .uploader import (
     upload_files,
     upload_file,
+    upload_fileobj,
+    upload_items,
     rename_files,
+    build_rename_plan,
+    write_rename_map,
     should_process_file
 )
 
+from .manifest import (
+    iter_manifest,
+    upload_manifest
+)
+
+from .watcher import watch_folder
+
 from .downloader import (
     download_folder,
     download_file
 )
 
+from .mirror import (
+    mirror_folder,
+    diff_trees
+)
+
+from .filters import (
+    ObjectFilter,
+    parse_filter
+)
+
+from .records import ObjectRecord
+
 from .browser import (
     list_folders,
-    list_s3_folder_objects
+    list_s3_folder_objects,
+    iter_objects
+)
+
+from .search import (
+    search_objects,
+    search_bucket
+)
+
+from .usage import (
+    FolderUsage,
+    folder_usage,
+    disk_usage
+)
+
+from .folder_manifest import (
+    write_folder_manifest,
+    read_folder_manifest
 )
 
 from .formatter import (
     format_output,
+    write_output,
+    write_results,
     format_array,
     format_json,
+    format_ndjson,
     format_xml,
     format_html,
     format_csv
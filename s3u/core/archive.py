@@ -0,0 +1,214 @@
+"""
+Reading zip and tar archives as an upload source without extracting them.
+"""
+
+import os
+import asyncio
+import tarfile
+import zipfile
+import tempfile
+import threading
+import concurrent.futures
+
+from .s3_core import format_s3_path
+
+# File extensions recognised as archives
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Members up to this size may be buffered in memory, larger ones go to a temp file
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Bytes of buffered members held in memory at once; members that don't fit go to temp files
+MAX_BUFFERED_BYTES = 32 * 1024 * 1024
+
+# Chunk size used when copying member data out of the archive
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def is_archive(path):
+    """
+    Check if a path is a zip or tar archive that can be used as an upload source.
+
+    Args:
+        path (str): Path to check
+
+    Returns:
+        bool: True if the path is a supported archive file
+    """
+    return os.path.isfile(path) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def get_member_key(member_path, s3_folder, subfolder_mode):
+    """
+    Map an archive member path to an S3 key using the subfolder mode semantics.
+
+    Args:
+        member_path (str): Path of the member inside the archive
+        s3_folder (str): The folder name in the S3 bucket
+        subfolder_mode (str): How to handle subfolders: 'ignore', 'pool', or 'preserve'
+
+    Returns:
+        str: The S3 key, or None if the member should be skipped
+    """
+    rel_path = member_path.replace('\\', '/').lstrip('/')
+    while rel_path.startswith('./'):
+        rel_path = rel_path[2:]
+
+    if not rel_path or rel_path.startswith('__MACOSX/') or '..' in rel_path.split('/'):
+        return None
+
+    if '/' in rel_path:
+        if subfolder_mode == 'ignore':
+            return None
+        if subfolder_mode == 'pool':
+            rel_path = os.path.basename(rel_path)
+
+    return format_s3_path(s3_folder, rel_path)
+
+class _MemoryBudget:
+    """
+    Bytes that buffered members may hold in memory, shared by the reader and the uploads.
+    """
+    def __init__(self, size):
+        self.available = size
+        self.lock = threading.Lock()
+    
+    def reserve(self, nbytes):
+        """Take nbytes from the budget, or return False if they don't fit."""
+        with self.lock:
+            if nbytes > self.available:
+                return False
+            self.available -= nbytes
+            return True
+    
+    def release(self, nbytes):
+        """Return bytes to the budget."""
+        with self.lock:
+            self.available += nbytes
+
+class _MemberBuffer(tempfile.SpooledTemporaryFile):
+    """
+    An in-memory member buffer that gives its bytes back to the budget once closed.
+    """
+    def __init__(self, size, budget):
+        super().__init__(max_size=size)
+        self._size = size
+        self._budget = budget
+    
+    def close(self):
+        if self._budget:
+            self._budget.release(self._size)
+            self._budget = None
+        super().close()
+    
+    def __exit__(self, exc, value, tb):
+        self.close()
+
+def _iter_zip_members(path):
+    """Yield (name, size, open member file) for each regular file in a zip archive."""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            with archive.open(info) as member:
+                yield info.filename, info.file_size, member
+
+def _iter_tar_members(path):
+    """Yield (name, size, open member file) for each regular file in a tar archive, reading it as a stream."""
+    with tarfile.open(path, 'r|*') as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            member = archive.extractfile(info)
+            if member is not None:
+                yield info.name, info.size, member
+
+async def iter_archive_items(archive_path, s3_folder, subfolder_mode='ignore', should_include=None,
+                             max_buffered=10):
+    """
+    Stream the members of an archive as upload items.
+
+    Decompression runs in a background thread while the caller uploads,
+    with at most ``max_buffered`` decompressed members waiting at a time.
+    Members waiting or being uploaded share MAX_BUFFERED_BYTES of memory;
+    members that don't fit are buffered in temporary files instead.
+
+    Args:
+        archive_path (str): Path to the zip or tar archive
+        s3_folder (str): The folder name in the S3 bucket
+        subfolder_mode (str): How to handle subfolders: 'ignore', 'pool', or 'preserve'
+        should_include (callable): Optional predicate on member file names
+        max_buffered (int): Maximum number of decompressed members held at once
+
+    Yields:
+        tuple: (file object, s3_key, extra_args) for each member to upload
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max(1, max_buffered))
+    stop = threading.Event()
+    done = object()
+    budget = _MemoryBudget(MAX_BUFFERED_BYTES)
+
+    def put(entry):
+        # Block the reader thread until the queue has room or the consumer stops
+        future = asyncio.run_coroutine_threadsafe(queue.put(entry), loop)
+        while not stop.is_set():
+            try:
+                return future.result(timeout=0.5)
+            except concurrent.futures.TimeoutError:
+                continue
+        future.cancel()
+        try:
+            future.result()
+        except concurrent.futures.CancelledError:
+            # Never queued, so the consumer won't close it
+            if isinstance(entry, tuple):
+                entry[0].close()
+
+    def read_archive():
+        if zipfile.is_zipfile(archive_path):
+            members = _iter_zip_members(archive_path)
+        else:
+            members = _iter_tar_members(archive_path)
+
+        try:
+            for name, size, member in members:
+                if stop.is_set():
+                    break
+
+                s3_key = get_member_key(name, s3_folder, subfolder_mode)
+                file_name = os.path.basename(name)
+                if s3_key is None or (should_include and not should_include(file_name)):
+                    continue
+
+                if size <= SPOOL_MAX_SIZE and budget.reserve(size):
+                    buffer = _MemberBuffer(size, budget)
+                else:
+                    buffer = tempfile.TemporaryFile()
+                while True:
+                    chunk = member.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    buffer.write(chunk)
+                buffer.seek(0)
+                put((buffer, s3_key, None))
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    reader = loop.run_in_executor(None, read_archive)
+    try:
+        while True:
+            entry = await queue.get()
+            if entry is done:
+                break
+            if isinstance(entry, Exception):
+                raise entry
+            yield entry
+    finally:
+        stop.set()
+        await reader
+        # Release any buffers that were read but never handed out
+        while not queue.empty():
+            entry = queue.get_nowait()
+            if isinstance(entry, tuple):
+                entry[0].close()
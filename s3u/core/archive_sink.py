@@ -0,0 +1,374 @@
+"""
+Downloading a folder straight into a tar or zip archive.
+
+Objects are written to the archive in key order while later objects are
+fetched ahead concurrently. Fetched objects wait in a reorder buffer that
+is bounded by both object count and bytes; objects too large to buffer are
+streamed into the archive when their turn comes.
+"""
+
+import io
+import os
+import sys
+import time
+import queue
+import asyncio
+import tarfile
+import zipfile
+import contextlib
+from botocore.exceptions import NoCredentialsError
+
+from .s3_core import get_s3_session, get_s3_client, get_bucket_name
+from .downloader import (
+    iter_folder_pages, get_local_path, DEFAULT_DOWNLOAD_CONCURRENCY, MAX_AUTO_CONCURRENCY, DOWNLOAD_CHUNK_SIZE
+)
+from ..utils.progress import ProgressBar
+from ..utils.concurrency import AdaptiveLimiter
+
+# Tar write modes for each archive extension
+TAR_MODES = {
+    '.tar': 'w|',
+    '.tar.gz': 'w|gz',
+    '.tgz': 'w|gz',
+    '.tar.bz2': 'w|bz2',
+    '.tbz2': 'w|bz2',
+    '.tar.xz': 'w|xz',
+    '.txz': 'w|xz',
+}
+
+# Maximum bytes of fetched objects waiting to be written
+REORDER_BUFFER_SIZE = 64 * 1024 * 1024
+
+# Maximum number of objects fetched ahead of the one being written
+MAX_READ_AHEAD = 256
+
+# Objects larger than this are streamed into the archive instead of buffered
+MAX_BUFFERED_OBJECT = 8 * 1024 * 1024
+
+# Chunks of a streamed object that may wait for the archive writer
+STREAM_QUEUE_SIZE = 8
+
+# Seconds to wait on the archive writer before checking that it is still running
+WRITER_PUT_TIMEOUT = 1.0
+
+# Range of modification times a zip member can record
+ZIP_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ZIP_MAX_DATE_TIME = (2107, 12, 31, 23, 59, 58)
+
+def get_archive_mode(archive_path):
+    """
+    Work out the archive type from its file name.
+    
+    Args:
+        archive_path (str): Output path, or '-' for an uncompressed tar on stdout
+        
+    Returns:
+        str: 'zip' or a tarfile stream write mode, or None if the type is not supported
+    """
+    if archive_path == '-':
+        return 'w|'
+    
+    lower = archive_path.lower()
+    if lower.endswith('.zip'):
+        return 'zip'
+    for extension, mode in TAR_MODES.items():
+        if lower.endswith(extension):
+            return mode
+    return None
+
+class _ByteBudget:
+    """
+    Limits the bytes held in the reorder buffer.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._condition = asyncio.Condition()
+    
+    async def acquire(self, nbytes):
+        """Wait until nbytes fit in the budget (an empty buffer always admits one object)."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used == 0 or self.used + nbytes <= self.limit)
+            self.used += nbytes
+    
+    async def release(self, nbytes):
+        """Return nbytes to the budget."""
+        async with self._condition:
+            self.used -= nbytes
+            self._condition.notify_all()
+
+class _ChunkReader:
+    """
+    File-like reader over a queue of byte chunks ending with None, for tarfile.
+    """
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunk = b''
+        self.offset = 0
+        self.finished = False
+    
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if self.offset >= len(self.chunk):
+                chunk = None if self.finished else self.chunks.get()
+                if chunk is None:
+                    self.finished = True
+                    break
+                self.chunk, self.offset = chunk, 0
+            
+            end = len(self.chunk) if size < 0 else min(len(self.chunk), self.offset + size)
+            parts.append(self.chunk[self.offset:end])
+            if size > 0:
+                size -= end - self.offset
+            self.offset = end
+        return b''.join(parts)
+
+def _write_archive(out, mode, entries):
+    """
+    Write archive members from a queue until it yields None. Runs in a worker thread.
+    
+    Args:
+        out: Binary file object to write the archive to
+        mode (str): 'zip' or a tarfile stream write mode
+        entries: Queue of (name, size, mtime, data) where data is bytes or a chunk queue
+    """
+    if mode == 'zip':
+        # Media is usually compressed already, so members are stored as-is
+        with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for name, size, mtime, data in iter(entries.get, None):
+                date_time = tuple(time.localtime(mtime)[:6])
+                info = zipfile.ZipInfo(name, date_time=min(max(date_time, ZIP_MIN_DATE_TIME), ZIP_MAX_DATE_TIME))
+                info.file_size = size
+                with archive.open(info, 'w', force_zip64=size >= zipfile.ZIP64_LIMIT) as member:
+                    if isinstance(data, bytes):
+                        member.write(data)
+                    else:
+                        for chunk in iter(data.get, None):
+                            member.write(chunk)
+    else:
+        with tarfile.open(fileobj=out, mode=mode) as archive:
+            for name, size, mtime, data in iter(entries.get, None):
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mtime = mtime
+                info.mode = 0o644
+                reader = io.BytesIO(data) if isinstance(data, bytes) else _ChunkReader(data)
+                archive.addfile(info, reader)
+
+async def _read_object(s3, file_key):
+    """Read a whole object into memory."""
+    response = await s3.get_object(Bucket=get_bucket_name(), Key=file_key)
+    body = response['Body']
+    try:
+        return await body.read()
+    finally:
+        body.close()
+
+async def download_to_archive(folder_name, archive_path, limit=None, max_concurrent='auto', object_filter=None):
+    """
+    Download files from an S3 folder into a tar or zip archive.
+    
+    Args:
+        folder_name (str): The folder to download
+        archive_path (str): Archive file to write (.zip, .tar, .tar.gz, ...), or '-' for a tar on stdout
+        limit (int): Optional limit on the number of files to download
+        max_concurrent (int or str): Maximum concurrent requests, or 'auto' to tune the number
+        object_filter (ObjectFilter): Optional filter objects must match
+        
+    Returns:
+        int: Number of files written to the archive
+    """
+    mode = get_archive_mode(archive_path)
+    if mode is None:
+        print(f"Error: Unsupported archive type: {archive_path} (use .zip, .tar, .tar.gz, .tar.bz2 or .tar.xz)")
+        return 0
+    
+    to_stdout = archive_path == '-'
+    if to_stdout:
+        out = sys.stdout.buffer
+        # Keep progress and messages out of the archive
+        messages = contextlib.redirect_stdout(sys.stderr)
+    else:
+        # Write under a temporary name so a failed run leaves no truncated archive
+        part_path = f"{archive_path}.s3u-part"
+        out = open(part_path, 'wb')
+        messages = contextlib.nullcontext()
+    
+    with messages:
+        try:
+            written = await _stream_folder_to_archive(folder_name, out, mode, limit, max_concurrent, object_filter)
+        except BaseException:
+            if not to_stdout:
+                out.close()
+                os.remove(part_path)
+            raise
+        
+        if to_stdout:
+            out.flush()
+        else:
+            out.close()
+            os.replace(part_path, archive_path)
+            print(f"Wrote {written} files to {archive_path}")
+        return written
+
+async def _stream_folder_to_archive(folder_name, out, mode, limit, max_concurrent, object_filter=None):
+    """
+    List, fetch and write a folder's objects to an open archive file.
+    
+    Returns:
+        int: Number of files written to the archive
+    """
+    session = get_s3_session()
+    loop = asyncio.get_running_loop()
+    folder_prefix = folder_name if folder_name.endswith('/') else f"{folder_name}/"
+    
+    auto_concurrency = max_concurrent in (None, 'auto')
+    concurrency = DEFAULT_DOWNLOAD_CONCURRENCY if auto_concurrency else max(1, int(max_concurrent))
+    pool_size = MAX_AUTO_CONCURRENCY if auto_concurrency else concurrency
+    
+    try:
+        async with get_s3_client(session, pool_size) as s3:
+            if auto_concurrency:
+                semaphore = AdaptiveLimiter(concurrency, maximum=MAX_AUTO_CONCURRENCY)
+                semaphore.observe_client(s3)
+            else:
+                semaphore = asyncio.Semaphore(concurrency)
+            
+            budget = _ByteBudget(REORDER_BUFFER_SIZE)
+            # Objects in key order as (key, size, mtime, prefetch task or None)
+            pending = asyncio.Queue(maxsize=MAX_READ_AHEAD)
+            entries = queue.Queue(maxsize=2)
+            writer = loop.run_in_executor(None, _write_archive, out, mode, entries)
+            
+            async def put(target, item):
+                # Don't block forever if the writer thread has failed
+                while True:
+                    if writer.done():
+                        writer.result()
+                        raise IOError("archive writer stopped unexpectedly")
+                    try:
+                        return await loop.run_in_executor(None, lambda: target.put(item, timeout=WRITER_PUT_TIMEOUT))
+                    except queue.Full:
+                        continue
+            
+            async def prefetch(file_key, size):
+                async with semaphore:
+                    data = await _read_object(s3, file_key)
+                    if isinstance(semaphore, AdaptiveLimiter):
+                        semaphore.record(size)
+                    return data
+            
+            progress = None
+            total_files = 0
+            
+            async def produce():
+                nonlocal progress, total_files
+                try:
+                    async for batch in iter_folder_pages(s3, folder_prefix, limit, object_filter):
+                        total_files += len(batch)
+                        if progress is None:
+                            print(f"Archiving files from {folder_name}")
+                            progress = ProgressBar(0, prefix='Archiving:', suffix='Complete', growing=True)
+                        progress.add_total(len(batch))
+                        for file_key, size, _, last_modified in batch:
+                            mtime = last_modified.timestamp() if last_modified else time.time()
+                            task = None
+                            if size <= MAX_BUFFERED_OBJECT:
+                                await budget.acquire(size)
+                                task = asyncio.ensure_future(prefetch(file_key, size))
+                            await pending.put((file_key, size, mtime, task))
+                except Exception as e:
+                    # Hand listing errors to the consumer instead of leaving it waiting
+                    await pending.put(e)
+                    return
+                await pending.put(None)
+            
+            async def stream_object(file_key, name, size, mtime):
+                # Too large to buffer: stream it through while later objects prefetch
+                async with semaphore:
+                    response = await s3.get_object(Bucket=get_bucket_name(), Key=file_key)
+                    body = response['Body']
+                    try:
+                        chunks = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+                        await put(entries, (name, size, mtime, chunks))
+                        try:
+                            while True:
+                                chunk = await body.read(DOWNLOAD_CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                await put(chunks, chunk)
+                        except Exception as e:
+                            # The member header is already written, so the archive can't be completed
+                            raise IOError(f"failed while streaming {file_key}: {str(e)}")
+                        finally:
+                            await put(chunks, None)
+                    finally:
+                        body.close()
+            
+            async def consume():
+                written = 0
+                while True:
+                    item = await pending.get()
+                    if item is None:
+                        return written
+                    if isinstance(item, Exception):
+                        raise item
+                    file_key, size, mtime, task = item
+                    name, _ = get_local_path(file_key, '')
+                    
+                    if task is None:
+                        await stream_object(file_key, name, size, mtime)
+                        written += 1
+                    else:
+                        try:
+                            data = await task
+                        except Exception as e:
+                            print(f"\nError downloading {file_key}: {str(e)}")
+                            data = None
+                        finally:
+                            await budget.release(size)
+                        if data is not None:
+                            await put(entries, (name, size, mtime, data))
+                            written += 1
+                    progress.update(1)
+            
+            def stop_writer():
+                # Make room for the stop marker even if the writer is stuck or gone
+                while True:
+                    try:
+                        entries.put_nowait(None)
+                        return
+                    except queue.Full:
+                        try:
+                            entries.get_nowait()
+                        except queue.Empty:
+                            pass
+            
+            producer = asyncio.ensure_future(produce())
+            try:
+                written = await consume()
+                await producer
+                await put(entries, None)
+                await writer
+            except BaseException:
+                producer.cancel()
+                while not pending.empty():
+                    item = pending.get_nowait()
+                    if isinstance(item, tuple) and item[3] is not None:
+                        item[3].cancel()
+                stop_writer()
+                with contextlib.suppress(Exception):
+                    await writer
+                raise
+            
+            if not total_files:
+                print(f"No files found in folder: {folder_name}")
+                return 0
+            
+            progress.add_total(0, done=True)
+            print(f"\nArchived {written} of {total_files} files")
+            return written
+    except NoCredentialsError:
+        print("Credentials not available")
+        sys.exit(1)
@@ -2,49 +2,131 @@
 Folder and file browsing functionality.
 """
 
-import os
 import sys
-import pyperclip
+import math
+import asyncio
 from datetime import datetime
 from botocore.exceptions import NoCredentialsError
 
-from .s3_core import get_s3_session, get_bucket_name, get_cloudfront_url
-from .formatter import format_output
+from .s3_core import (get_s3_session, get_s3_client, get_bucket_name, get_cloudfront_url, get_list_page_size,
+                      MAX_LIST_KEYS)
+from .formatter import write_results, describe_results
+from .filters import parse_filter
+from .listing import LIST_CONCURRENCY
+from .records import ObjectRecord
+from .bucket_index import get_fresh_index, get_bucket_index, iter_listing
+from .folder_manifest import is_folder_manifest_enabled, is_manifest_key, read_folder_manifest
 
-async def list_folders(prefix=""):
+# Folders counted at the same time when list_folders counts in parallel
+COUNT_CONCURRENCY = 16
+
+async def _count_prefix(s3, prefix, start_after=None):
+    """
+    Count the objects under a prefix, not counting its folder marker.
+    
+    Args:
+        s3: S3 client
+        prefix (str): Prefix to count, with a trailing slash
+        start_after (str): Optional key to continue counting after
+        
+    Returns:
+        int: Number of objects
+    """
+    paginator = s3.get_paginator('list_objects_v2')
+    params = {'Bucket': get_bucket_name(), 'Prefix': prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+    
+    count = 0
+    async for page in paginator.paginate(**params):
+        count += sum(1 for obj in page.get('Contents', []) if obj['Key'] != prefix)
+    return count
+
+def _add_page_counts(counts, page, prefix):
+    """
+    Add a recursive listing page's keys to the counts of their top-level folders.
+    """
+    for obj in page.get('Contents', []):
+        head, separator, rest = obj['Key'][len(prefix):].partition('/')
+        if not separator:
+            # Objects beside the folders aren't in any of them
+            continue
+        folder = prefix + head
+        if folder in counts and rest:
+            counts[folder] += 1
+
+async def list_folders(prefix="", strategy='auto', counts=True, refresh=False):
     """
     List all folders in the S3 bucket with item count.
     
+    Items can be counted with one recursive listing of the whole bucket
+    (few requests, but one after another) or by listing every folder in
+    parallel (more requests, but concurrent). With 'auto', the first page of
+    the recursive listing is used to estimate both and the faster one is
+    used for the rest; the objects already counted are not listed again.
+    When the local listing index is on, folders and counts come from it.
+    
     Args:
         prefix (str): Optional prefix to filter folders
+        strategy (str): 'auto', 'single' (one recursive listing) or 'parallel' (one listing per folder)
+        counts (bool): Count the items in each folder (False just lists the folders)
+        refresh (bool): Refresh the local listing index first (if it's turned on)
         
     Returns:
-        list: List of tuples containing (folder_name, item_count)
+        list: List of tuples containing (folder_name, item_count), with None counts if counts is False
     """
     session = get_s3_session()
-    folders = {}
     
     try:
-        async with session.client('s3') as s3:
+        async with get_s3_client(session, COUNT_CONCURRENCY) as s3:
+            index = await get_fresh_index(s3, prefix, refresh)
+            if index is not None:
+                return [(folder, count if counts else None) for folder, count in index.folder_counts(prefix)]
+            
             paginator = s3.get_paginator('list_objects_v2')
             
-            async for page in paginator.paginate(Bucket=get_bucket_name(), Delimiter='/'):
+            folders = {}
+            async for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=prefix, Delimiter='/'):
                 if 'CommonPrefixes' in page:
                     for prefix_obj in page['CommonPrefixes']:
                         folder_name = prefix_obj['Prefix'].rstrip('/')
                         folders[folder_name] = 0
             
-            # Now count items in each folder
-            for folder_name in folders.keys():
-                folder_prefix = folder_name + '/'
-                
-                item_count = 0
-                async for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=folder_prefix):
-                    if 'Contents' in page:
-                        # Don't count the folder marker itself
-                        item_count += sum(1 for obj in page['Contents'] if obj['Key'] != folder_prefix)
+            if not counts:
+                return [(folder, None) for folder in folders]
+            if not folders:
+                return []
+            
+            # Folders that still need to be counted by parallel listings
+            remaining = list(folders)
+            start_after = None
+            
+            if strategy != 'parallel':
+                request = {'Bucket': get_bucket_name(), 'Prefix': prefix}
+                page = await s3.list_objects_v2(**request)
+                _add_page_counts(folders, page, prefix)
                 
-                folders[folder_name] = item_count
+                if strategy == 'single' or not page.get('IsTruncated') or \
+                        _single_pass_is_faster(page, prefix, len(folders)):
+                    while page.get('IsTruncated'):
+                        page = await s3.list_objects_v2(ContinuationToken=page['NextContinuationToken'], **request)
+                        _add_page_counts(folders, page, prefix)
+                    remaining = []
+                else:
+                    # Folders sorting before the page's last key are complete; the one holding
+                    # that key (if any) continues where the page stopped
+                    start_after = page['Contents'][-1]['Key']
+                    remaining = [folder for folder in folders
+                                 if folder + '/' > start_after or start_after.startswith(folder + '/')]
+            
+            semaphore = asyncio.Semaphore(COUNT_CONCURRENCY)
+            
+            async def count_folder(folder):
+                async with semaphore:
+                    continue_after = start_after if start_after and start_after.startswith(folder + '/') else None
+                    folders[folder] += await _count_prefix(s3, folder + '/', continue_after)
+            
+            await asyncio.gather(*(count_folder(folder) for folder in remaining))
             
             return [(folder, count) for folder, count in folders.items()]
     except NoCredentialsError:
@@ -54,7 +136,100 @@ async def list_folders(prefix=""):
         print(f"Error listing folders: {str(e)}")
         return []
 
-async def list_s3_folder_objects(s3_folder, return_urls_only=False, limit=None, output_format='array', recursive=False):
+def _single_pass_is_faster(page, prefix, folder_count):
+    """
+    Estimate from the first page of a recursive listing whether finishing it beats parallel counting.
+    
+    The page shows roughly how many objects a folder holds. A single pass
+    takes about one sequential request per page of the whole bucket, while
+    parallel counting takes rounds of COUNT_CONCURRENCY folders, each as
+    long as its folder has pages.
+    """
+    contents = page.get('Contents', [])
+    spanned = len({obj['Key'][len(prefix):].split('/', 1)[0] for obj in contents}) or 1
+    objects_per_folder = len(contents) / spanned
+    page_size = max(len(contents), 1)
+    
+    single_pass_requests = math.ceil(folder_count * objects_per_folder / page_size)
+    parallel_rounds = max(math.ceil(folder_count / COUNT_CONCURRENCY), math.ceil(objects_per_folder / page_size))
+    return single_pass_requests <= parallel_rounds
+
+async def _iter_entry_pages(entries):
+    """Yield listing entries read from a folder manifest in pages, like a listing."""
+    for start in range(0, len(entries), MAX_LIST_KEYS):
+        yield entries[start:start + MAX_LIST_KEYS]
+
+async def iter_objects(s3_folder, recursive=False, object_filter=None, limit=None, refresh=False, s3=None):
+    """
+    Yield the objects in an S3 folder as they are listed.
+    
+    Objects arrive one listing page at a time in key order, so memory stays
+    bounded however large the folder is, and breaking out of the loop stops
+    the listing. Nothing is printed or copied to the clipboard. When folder
+    manifests are on (and the listing index isn't), a fresh _manifest.json
+    in the folder is read instead of listing it.
+    
+    Example:
+        async for obj in iter_objects('renders', recursive=True, object_filter='ext:png'):
+            print(obj.url, obj.size)
+    
+    Args:
+        s3_folder (str): The folder name in the S3 bucket to list ('' for the whole bucket)
+        recursive (bool): Whether to include objects in subfolders
+        object_filter (str or ObjectFilter): Optional filter expression (see filters.py),
+                                             e.g. "ext:images size<5MB since:7d"
+        limit (int): Optional maximum number of objects
+        refresh (bool): Refresh the local listing index first (if it's turned on)
+        s3: Optional S3 client to list with; a new client is opened if not provided
+        
+    Yields:
+        ObjectRecord: Each object (folder markers are skipped)
+    """
+    if s3 is None:
+        async with get_s3_client(get_s3_session(), LIST_CONCURRENCY) as client:
+            async for record in iter_objects(s3_folder, recursive, object_filter, limit, refresh, client):
+                yield record
+        return
+    
+    object_filter = parse_filter(object_filter)
+    
+    # Add trailing slash if not present to ensure we're listing folder contents
+    folder_prefix = s3_folder if not s3_folder or s3_folder.endswith('/') else f"{s3_folder}/"
+    
+    # S3 lists keys in order, so a limited listing can stop as soon as it has enough
+    limit = limit if limit and limit > 0 else None
+    page_size = get_list_page_size(None if object_filter else limit) if limit else None
+    
+    # Recursive listings skip subfolder markers and report each object's subfolder
+    base_url = get_cloudfront_url()
+    subfolder_prefix = folder_prefix if recursive else None
+    count = 0
+    pages = None
+    if is_folder_manifest_enabled() and not refresh and get_bucket_index() is None:
+        entries = await read_folder_manifest(s3, folder_prefix)
+        if entries is not None:
+            if not recursive:
+                entries = [obj for obj in entries if '/' not in obj['Key'][len(folder_prefix):]]
+            pages = _iter_entry_pages(entries)
+    if pages is None:
+        pages = iter_listing(s3, folder_prefix, recursive, page_size, refresh)
+    try:
+        async for contents in pages:
+            for obj in contents:
+                # Skip the folder itself (which appears as a key) and folder manifests
+                if obj['Key'] != folder_prefix and not (recursive and obj['Key'].endswith('/')) \
+                        and not is_manifest_key(obj['Key']) \
+                        and (object_filter is None or object_filter(obj)):
+                    yield ObjectRecord.from_listing(obj, base_url, subfolder_prefix)
+                    count += 1
+                    # Stop before the listing requests another page
+                    if limit and count >= limit:
+                        return
+    finally:
+        await pages.aclose()
+
+async def list_s3_folder_objects(s3_folder, return_urls_only=False, limit=None, output_format='array', recursive=False,
+                                 object_filter=None, refresh=False, output_file=None):
     """
     List objects in an S3 folder and return their CloudFront URLs.
     
@@ -62,93 +237,37 @@ async def list_s3_folder_objects(s3_folder, return_urls_only=False, limit=None,
         s3_folder (str): The folder name in the S3 bucket to list
         return_urls_only (bool): If True, just return the URLs without printing or clipboard copy
         limit (int): Optional limit on the number of URLs to return
-        output_format (str): Format for output: 'array', 'json', 'xml', 'html', or 'csv'
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
         recursive (bool): Whether to list objects recursively including subfolders
+        object_filter (str or ObjectFilter): Optional filter expression (see filters.py),
+                                             e.g. "ext:images size<5MB since:7d"
+        refresh (bool): Refresh the local listing index first (if it's turned on)
+        output_file (str or file): Optional file path, '-' for stdout or open text file to write the output to
+                                   instead of the clipboard
         
     Returns:
-        list: List of CloudFront URLs or objects with metadata for items in the folder
+        list: List of CloudFront URLs, or ObjectRecords with metadata for items in the folder
     """
-    session = get_s3_session()
-    urls = []
-    objects = []
+    object_filter = parse_filter(object_filter)
     
     try:
-        async with session.client('s3') as s3:
-            paginator = s3.get_paginator('list_objects_v2')
-            
-            # Add trailing slash if not present to ensure we're listing folder contents
-            folder_prefix = s3_folder if s3_folder.endswith('/') else f"{s3_folder}/"
-            
-            if recursive:
-                # List all objects recursively (no delimiter)
-                async for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=folder_prefix):
-                    if 'Contents' in page:
-                        for obj in page['Contents']:
-                            # Skip the folder itself and any subfolder markers
-                            if obj['Key'] != folder_prefix and not obj['Key'].endswith('/'):
-                                url = f"{get_cloudfront_url()}/{obj['Key']}"
-                                urls.append(url)
-                                
-                                # Collect metadata for formats that need it
-                                if output_format != 'array':
-                                    obj_meta = {
-                                        'url': url,
-                                        'filename': os.path.basename(obj['Key']),
-                                        's3_path': obj['Key'],
-                                        'size': obj['Size'],
-                                        'last_modified': obj['LastModified'].isoformat(),
-                                        'type': os.path.splitext(obj['Key'])[1].lstrip('.').lower() if '.' in obj['Key'] else '',
-                                        'subfolder': os.path.dirname(obj['Key'].replace(folder_prefix, '')) if '/' in obj['Key'].replace(folder_prefix, '') else ''
-                                    }
-                                    objects.append(obj_meta)
+        records = [record async for record in iter_objects(s3_folder, recursive, object_filter, limit, refresh)]
+        urls = [record.url for record in records] if output_format == 'array' or return_urls_only else []
+        
+        if not return_urls_only:
+            if not records:
+                print(f"No objects found in folder: {s3_folder}" + (" (including subfolders)" if recursive else "") +
+                      (f" matching filter: {object_filter.expression}" if object_filter else ""))
             else:
-                # List only objects in the specific folder (using delimiter)
-                async for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=folder_prefix, Delimiter='/'):
-                    if 'Contents' in page:
-                        for obj in page['Contents']:
-                            # Skip the folder itself (which appears as a key)
-                            if obj['Key'] != folder_prefix:
-                                url = f"{get_cloudfront_url()}/{obj['Key']}"
-                                urls.append(url)
-                                
-                                # Collect metadata for formats that need it
-                                if output_format != 'array':
-                                    obj_meta = {
-                                        'url': url,
-                                        'filename': os.path.basename(obj['Key']),
-                                        's3_path': obj['Key'],
-                                        'size': obj['Size'],
-                                        'last_modified': obj['LastModified'].isoformat(),
-                                        'type': os.path.splitext(obj['Key'])[1].lstrip('.').lower() if '.' in obj['Key'] else ''
-                                    }
-                                    objects.append(obj_meta)
-            
-            # Sort the URLs alphabetically for consistent results when limiting
-            urls.sort()
-            if objects:
-                objects.sort(key=lambda x: x['s3_path'])
-            
-            # Apply limit if specified
-            if limit and limit > 0:
-                if limit < len(urls):
-                    urls = urls[:limit]
-                if objects and limit < len(objects):
-                    objects = objects[:limit]
-            
-            if not return_urls_only:
-                if not urls:
-                    print(f"No objects found in folder: {s3_folder}" + (" (including subfolders)" if recursive else ""))
-                else:
-                    print(f"Found {len(urls)} objects in folder: {s3_folder}" + (" (including subfolders)" if recursive else ""))
-                    
-                    # Format the output based on the specified format
-                    clipboard_content = format_output(urls, objects, output_format)
-                    
-                    # Copy to clipboard
-                    pyperclip.copy(clipboard_content)
-                    print(f"\nCopied {output_format} of {len(urls)} URLs to clipboard")
+                print(f"Found {len(records)} objects in folder: {s3_folder}" + (" (including subfolders)" if recursive else ""))
                 
-            return urls if output_format == 'array' or return_urls_only else objects
+                # Stream the output to the clipboard or output file
+                location = write_results(urls, records, output_format, output_file, s3_folder)
+                message = describe_results(location, f"{output_format} of {len(records)} URLs", output_file)
+                if message:
+                    print(f"\n{message}")
+            
+        return urls if output_format == 'array' or return_urls_only else records
     except NoCredentialsError:
         print("Credentials not available")
         sys.exit(1)
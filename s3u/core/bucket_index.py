@@ -0,0 +1,547 @@
+"""
+Local SQLite index of the bucket's objects.
+
+When the 'use_index' setting is on, listings (folder lists, browsing and
+the existing files added to upload results) are answered from a local copy
+of the bucket's key, size, ETag and modification time instead of listing
+S3 every time. Each prefix records when it was last listed; a listing
+older than 'index_max_age' seconds is refreshed (just for that prefix,
+writing only the objects that changed) before it is used. s3u's own
+uploads and deletes update the index as they happen, so it stays current
+between refreshes.
+
+Searching keys (see search.py) adds a trigram index of the keys, which
+triggers keep in step with the objects table. With an S3 Inventory source
+configured (see inventory.py), the index is loaded from inventory reports
+instead of listing S3.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from .s3_core import get_bucket_name, MAX_LIST_KEYS
+from .listing import iter_prefix_pages
+from .inventory import get_inventory_source, load_inventory
+from .. import config
+from ..config import load_config
+
+# Index database in the config directory, shared by all buckets
+INDEX_DB_NAME = 'index.sqlite'
+
+# Seconds a listing stays fresh when the config doesn't say
+DEFAULT_MAX_AGE = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (bucket, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS prefixes (
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    refreshed REAL NOT NULL,
+    PRIMARY KEY (bucket, prefix)
+);
+CREATE TABLE IF NOT EXISTS inventories (
+    bucket TEXT PRIMARY KEY,
+    report TEXT NOT NULL,
+    loaded REAL NOT NULL
+);
+"""
+
+# Trigram index of the keys, created the first time the bucket is searched.
+# search_keys gives each key the rowid key_trigrams needs; the triggers
+# apply every change to the objects table to both
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_keys (
+    id INTEGER PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    UNIQUE (bucket, key)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS key_trigrams USING fts5(
+    key, content='search_keys', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS search_keys_insert AFTER INSERT ON search_keys BEGIN
+    INSERT INTO key_trigrams (rowid, key) VALUES (new.id, new.key);
+END;
+CREATE TRIGGER IF NOT EXISTS search_keys_delete AFTER DELETE ON search_keys BEGIN
+    INSERT INTO key_trigrams (key_trigrams, rowid, key) VALUES ('delete', old.id, old.key);
+END;
+CREATE TRIGGER IF NOT EXISTS objects_search_insert AFTER INSERT ON objects BEGIN
+    INSERT OR IGNORE INTO search_keys (bucket, key) VALUES (new.bucket, new.key);
+END;
+CREATE TRIGGER IF NOT EXISTS objects_search_delete AFTER DELETE ON objects BEGIN
+    DELETE FROM search_keys WHERE bucket = old.bucket AND key = old.key;
+END;
+"""
+
+# Shortest term the trigram index can look up
+MIN_TRIGRAM_TERM = 3
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def _prefix_range(prefix):
+    """
+    Get the key range covered by a prefix.
+    
+    Keys are compared as UTF-8 bytes, the same order S3 lists them in.
+    
+    Returns:
+        tuple: (lowest key, key just past the range or None for no upper bound)
+    """
+    if not prefix:
+        return '', None
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def get_index_path():
+    """Get the index database path, in the config directory at the time of the call."""
+    return os.path.join(config.CONFIG_DIR, INDEX_DB_NAME)
+
+class BucketIndex:
+    """
+    The indexed objects of one bucket.
+    """
+    def __init__(self, bucket, path=None):
+        """
+        Open (and create if needed) the index for a bucket.
+        
+        Args:
+            bucket (str): Bucket name
+            path (str): SQLite database file (defaults to get_index_path())
+        """
+        path = path or get_index_path()
+        self.bucket = bucket
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Shared with worker threads and guarded by the lock
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.RLock()
+        # Whether the trigram index is usable, once enable_search has checked
+        self._search_enabled = None
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+    
+    def _range_clause(self, prefix):
+        """SQL condition and parameters selecting the keys under a prefix."""
+        low, high = _prefix_range(prefix)
+        if high is None:
+            return 'bucket = ? AND key >= ?', [self.bucket, low]
+        return 'bucket = ? AND key >= ? AND key < ?', [self.bucket, low, high]
+    
+    def is_fresh(self, prefix, max_age):
+        """
+        Check if a prefix (or a prefix containing it) was listed within max_age seconds.
+        
+        Args:
+            prefix (str): Prefix to check
+            max_age (float): Maximum age in seconds
+            
+        Returns:
+            bool: True if the index can answer for the prefix
+        """
+        cutoff = time.time() - max_age
+        with self._lock:
+            rows = self._conn.execute('SELECT prefix, refreshed FROM prefixes WHERE bucket = ?',
+                                      (self.bucket,)).fetchall()
+        return any(prefix.startswith(covered) and refreshed >= cutoff for covered, refreshed in rows)
+    
+    def start_refresh(self, prefix, keep_objects=False):
+        """
+        Begin replacing the objects under a prefix (see add_objects, sync_page and finish_refresh).
+        
+        The prefix is marked stale until finish_refresh, so an interrupted
+        refresh is simply redone next time. Its objects are cleared, unless
+        keep_objects is set because the listing is applied with sync_page.
+        """
+        where, params = self._range_clause(prefix)
+        with self._lock, self._conn:
+            if not keep_objects:
+                self._conn.execute(f'DELETE FROM objects WHERE {where}', params)
+            self._conn.execute('DELETE FROM prefixes WHERE bucket = ? AND substr(prefix, 1, ?) = ?',
+                               (self.bucket, len(prefix), prefix))
+    
+    def add_objects(self, objects):
+        """
+        Add listed objects to the index.
+        
+        Args:
+            objects (list): list_objects_v2 entries (with Key, Size, ETag and LastModified)
+        """
+        rows = [self._row(obj) for obj in objects]
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)', rows)
+    
+    def _row(self, obj):
+        """The objects table row of a list_objects_v2 entry."""
+        return (self.bucket, obj['Key'], obj.get('Size', 0), obj.get('ETag'),
+                obj['LastModified'].isoformat() if obj.get('LastModified') else None)
+    
+    def sync_page(self, prefix, after, objects):
+        """
+        Make the indexed objects in part of a prefix match one page of its listing.
+        
+        Pages come in key order, so a page accounts for every key after the
+        previous page's last key up to its own last key. Only objects that
+        changed are written and only keys that are gone are deleted, so a
+        refresh of an unchanged prefix writes nothing (and leaves the
+        trigram index alone).
+        
+        Args:
+            prefix (str): The prefix being refreshed
+            after (str): Last key of the previous page, or None for the first page
+            objects (list): The page's list_objects_v2 entries in key order; an empty list
+                            ends the listing, removing every indexed key after `after`
+            
+        Returns:
+            str: The page's last key, to pass as `after` with the next page
+        """
+        where, params = self._range_clause(prefix)
+        if after is not None:
+            where += ' AND key > ?'
+            params.append(after)
+        if objects:
+            where += ' AND key <= ?'
+            params.append(objects[-1]['Key'])
+        listed = [self._row(obj) for obj in objects]
+        
+        with self._lock, self._conn:
+            indexed = {row[0]: row[1:] for row in self._conn.execute(
+                f'SELECT key, size, etag, last_modified FROM objects WHERE {where}', params)}
+            new, changed = [], []
+            for row in listed:
+                previous = indexed.pop(row[1], None)
+                if previous is None:
+                    new.append(row)
+                elif previous != row[2:]:
+                    # Updated in place, so the key keeps its trigram index entry
+                    changed.append(row[2:] + row[:2])
+            self._conn.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)', new)
+            self._conn.executemany('UPDATE objects SET size = ?, etag = ?, last_modified = ? '
+                                   'WHERE bucket = ? AND key = ?', changed)
+            self._conn.executemany('DELETE FROM objects WHERE bucket = ? AND key = ?',
+                                   [(self.bucket, key) for key in indexed])
+        return objects[-1]['Key'] if objects else after
+    
+    def finish_refresh(self, prefix, started):
+        """
+        Mark a prefix as listed.
+        
+        Args:
+            prefix (str): The refreshed prefix
+            started (float): When the listing began (changes after it may be missing)
+        """
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO prefixes VALUES (?, ?, ?)', (self.bucket, prefix, started))
+    
+    def record_upload(self, key, size, etag=None):
+        """
+        Record an object s3u just uploaded.
+        
+        Args:
+            key (str): S3 object key
+            size (int): Object size in bytes
+            etag (str): Optional object ETag
+        """
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)',
+                               (self.bucket, key, size, etag, datetime.now(timezone.utc).isoformat()))
+    
+    def remove(self, keys):
+        """
+        Remove objects s3u just deleted.
+        
+        Args:
+            keys (list): S3 object keys
+        """
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM objects WHERE bucket = ? AND key = ?',
+                                   [(self.bucket, key) for key in keys])
+    
+    def iter_objects(self, prefix, recursive=True, limit=None, page_size=MAX_LIST_KEYS):
+        """
+        Yield the indexed objects under a prefix in key order.
+        
+        Rows are read page_size at a time, each page starting after the
+        previous page's last key, so memory stays bounded however many
+        objects the prefix holds.
+        
+        Args:
+            prefix (str): Prefix to list
+            recursive (bool): Include objects in subfolders of the prefix
+            limit (int): Optional maximum number of rows to read
+            page_size (int): Rows read per query
+            
+        Yields:
+            dict: Entries shaped like list_objects_v2 results (Key, Size, ETag, LastModified)
+        """
+        where, params = self._range_clause(prefix)
+        if not recursive:
+            where += ' AND instr(substr(key, ?), ?) = 0'
+            params += [len(prefix) + 1, '/']
+        
+        last_key = None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            count = page_size if remaining is None else min(page_size, remaining)
+            after = ' AND key > ?' if last_key is not None else ''
+            sql = f'SELECT key, size, etag, last_modified FROM objects WHERE {where}{after} ORDER BY key LIMIT ?'
+            with self._lock:
+                rows = self._conn.execute(sql, params + ([last_key] if after else []) + [count]).fetchall()
+            
+            for key, size, etag, last_modified in rows:
+                yield {
+                    'Key': key,
+                    'Size': size,
+                    'ETag': etag,
+                    'LastModified': datetime.fromisoformat(last_modified) if last_modified else None
+                }
+            if len(rows) < count:
+                return
+            last_key = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+    
+    def folder_counts(self, prefix=''):
+        """
+        Count the indexed objects in each folder directly under a prefix.
+        
+        Args:
+            prefix (str): Prefix the folders are in
+            
+        Returns:
+            list: (folder_name, item_count) tuples in S3's folder order
+        """
+        where, params = self._range_clause(prefix)
+        start = len(prefix) + 1
+        # Position of the '/' that ends the folder name, relative to the prefix
+        slash = f"instr(substr(key, {start}), '/')"
+        sql = (f"SELECT substr(key, 1, {start - 1} + {slash} - 1) AS folder, "
+               f"SUM(length(key) > {start - 1} + {slash}) "
+               f"FROM objects WHERE {where} AND {slash} > 0 "
+               f"GROUP BY folder ORDER BY folder || '/'")
+        with self._lock:
+            return [(folder, count) for folder, count in self._conn.execute(sql, params).fetchall()]
+    
+    def get_inventory(self):
+        """Get the inventory report last loaded into the index (see inventory.py), or None."""
+        with self._lock:
+            row = self._conn.execute('SELECT report FROM inventories WHERE bucket = ?', (self.bucket,)).fetchone()
+        return row[0] if row else None
+    
+    def set_inventory(self, report):
+        """Record the inventory report that was loaded into the index."""
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO inventories VALUES (?, ?, ?)', (self.bucket, report, time.time()))
+    
+    def enable_search(self):
+        """
+        Create the trigram index of the keys, if it doesn't exist yet.
+        
+        Returns:
+            bool: True if keys can be searched by trigram (SQLite needs FTS5 with the trigram tokenizer)
+        """
+        with self._lock:
+            if self._search_enabled is not None:
+                return self._search_enabled
+            try:
+                with self._conn:
+                    exists = self._conn.execute(
+                        "SELECT 1 FROM sqlite_master WHERE name = 'key_trigrams'").fetchone()
+                    self._conn.executescript(SEARCH_SCHEMA)
+                    if not exists:
+                        # Index the keys listed before search was first used
+                        self._conn.execute('INSERT OR IGNORE INTO search_keys (bucket, key) '
+                                           'SELECT bucket, key FROM objects')
+                self._search_enabled = True
+            except sqlite3.OperationalError:
+                self._search_enabled = False
+            return self._search_enabled
+    
+    def iter_candidates(self, terms, page_size=MAX_LIST_KEYS):
+        """
+        Yield the indexed objects that may contain every term, in key order.
+        
+        Terms of MIN_TRIGRAM_TERM or more characters are looked up in the
+        trigram index, which matches them case-insensitively anywhere in
+        the key. Shorter terms (and every term, without the trigram index)
+        aren't checked, so callers must still test the keys they get. Rows
+        are read page_size at a time, as in iter_objects.
+        
+        Args:
+            terms (list): Substrings the keys must contain
+            page_size (int): Rows read per query
+            
+        Yields:
+            dict: Entries shaped like list_objects_v2 results (Key, Size, ETag, LastModified)
+        """
+        phrases = ['"' + term.replace('"', '""') + '"' for term in terms if len(term) >= MIN_TRIGRAM_TERM]
+        if phrases and self.enable_search():
+            # CROSS JOIN keeps the trigram lookup first; SQLite would otherwise
+            # scan the bucket's keys and run the match once per key
+            sql = ('SELECT o.key, o.size, o.etag, o.last_modified FROM key_trigrams '
+                   'CROSS JOIN search_keys s ON s.id = key_trigrams.rowid '
+                   'CROSS JOIN objects o ON o.bucket = s.bucket AND o.key = s.key '
+                   'WHERE key_trigrams MATCH ? AND s.bucket = ?{after} ORDER BY o.key LIMIT ?')
+            after_clause = ' AND o.key > ?'
+            params = [' AND '.join(phrases), self.bucket]
+        else:
+            sql = 'SELECT key, size, etag, last_modified FROM objects WHERE bucket = ?{after} ORDER BY key LIMIT ?'
+            after_clause = ' AND key > ?'
+            params = [self.bucket]
+        
+        last_key = None
+        while True:
+            after = after_clause if last_key is not None else ''
+            with self._lock:
+                rows = self._conn.execute(sql.format(after=after),
+                                          params + ([last_key] if after else []) + [page_size]).fetchall()
+            
+            for key, size, etag, last_modified in rows:
+                yield {
+                    'Key': key,
+                    'Size': size,
+                    'ETag': etag,
+                    'LastModified': datetime.fromisoformat(last_modified) if last_modified else None
+                }
+            if len(rows) < page_size:
+                return
+            last_key = rows[-1][0]
+
+def get_index_max_age():
+    """Get the configured freshness bound in seconds."""
+    try:
+        return float(load_config().get('index_max_age', DEFAULT_MAX_AGE))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_AGE
+
+def get_bucket_index(required=False, path=None):
+    """
+    Get the index for the configured bucket.
+    
+    The index is always used when listings come from an inventory source.
+    
+    Args:
+        required (bool): Open the index even if 'use_index' is off (for commands that need it, like search)
+        path (str): Optional SQLite database file (defaults to get_index_path())
+    
+    Returns:
+        BucketIndex: The index, or None if indexing is turned off (or the database can't be opened)
+    """
+    bucket = get_bucket_name()
+    if not bucket:
+        return None
+    if not required and load_config().get('use_index', 'no') != 'yes' and not get_inventory_source():
+        return None
+    
+    path = path or get_index_path()
+    with _indexes_lock:
+        if (path, bucket) not in _indexes:
+            try:
+                _indexes[path, bucket] = BucketIndex(bucket, path)
+            except sqlite3.Error as e:
+                print(f"Not using the listing index {path}: {str(e)}")
+                _indexes[path, bucket] = None
+        return _indexes[path, bucket]
+
+async def refresh_prefix(s3, index, prefix):
+    """
+    List a prefix from S3 (or the inventory source) and bring its objects in the index up to date.
+    
+    Each listing page is compared with the indexed objects in its key
+    range as it arrives, so only changes are written.
+    
+    Args:
+        s3: S3 client
+        index (BucketIndex): The index to update
+        prefix (str): Prefix to refresh ('' for the whole bucket)
+    """
+    source = get_inventory_source()
+    if source:
+        await load_inventory(s3, index, source, prefix)
+        return
+    
+    started = time.time()
+    index.start_refresh(prefix, keep_objects=True)
+    after = None
+    async for contents in iter_prefix_pages(s3, prefix):
+        after = index.sync_page(prefix, after, contents)
+    index.sync_page(prefix, after, [])
+    index.finish_refresh(prefix, started)
+
+async def get_fresh_index(s3, prefix, refresh=False, required=False):
+    """
+    Get the index, refreshing the prefix first if its listing is too old.
+    
+    Args:
+        s3: S3 client
+        prefix (str): Prefix about to be read
+        refresh (bool): Refresh even if the listing is still fresh
+        required (bool): Use the index even if 'use_index' is off
+        
+    Returns:
+        BucketIndex: The index, or None if indexing is turned off
+    """
+    index = get_bucket_index(required)
+    if index is None:
+        return None
+    if refresh or not index.is_fresh(prefix, get_index_max_age()):
+        await refresh_prefix(s3, index, prefix)
+    return index
+
+async def iter_listing(s3, prefix, recursive=True, page_size=None, refresh=False):
+    """
+    Yield the objects under a prefix in pages, from the index if it's on or from S3.
+    
+    Args:
+        s3: S3 client
+        prefix (str): Prefix to list
+        recursive (bool): Include objects in subfolders of the prefix
+        page_size (int): Optional keys per S3 request, for listings that stop early
+        refresh (bool): Refresh the indexed listing even if it's still fresh
+        
+    Yields:
+        list: list_objects_v2 'Contents' entries, in key order
+    """
+    index = await get_fresh_index(s3, prefix, refresh)
+    if index is not None:
+        page = []
+        for obj in index.iter_objects(prefix, recursive):
+            page.append(obj)
+            if len(page) >= MAX_LIST_KEYS:
+                yield page
+                page = []
+        if page:
+            yield page
+        return
+    
+    async for contents in iter_prefix_pages(s3, prefix, page_size, None if recursive else '/'):
+        yield contents
+
+def record_upload(key, size, etag=None):
+    """Record an upload in the index, if indexing is on."""
+    index = get_bucket_index()
+    if index:
+        try:
+            index.record_upload(key, size, etag)
+        except sqlite3.Error as e:
+            print(f"Could not update the listing index: {str(e)}")
+
+def record_deletes(keys):
+    """Remove deleted objects from the index, if indexing is on."""
+    index = get_bucket_index()
+    if index:
+        try:
+            index.remove(keys)
+        except sqlite3.Error as e:
+            print(f"Could not update the listing index: {str(e)}")
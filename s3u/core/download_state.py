@@ -0,0 +1,405 @@
+"""
+Local state that lets folder downloads skip unchanged files and resume partial ones.
+
+Completed files are recorded in a small sidecar index in the output
+directory. Files being downloaded are written to a ``.s3u-part`` file next
+to their final path, with a JSON state file describing which bytes are done.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+# Sidecar index of completed downloads, stored in the output directory
+INDEX_FILENAME = '.s3u-index.json'
+
+# Suffixes for in-progress data and its resume state
+PART_SUFFIX = '.s3u-part'
+STATE_SUFFIX = '.s3u-part.json'
+
+# Save the index after this many newly completed files
+INDEX_SAVE_INTERVAL = 100
+
+# Size of each read when hashing local files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# How finished downloads are made durable before being moved into place:
+# 'none' leaves it to the OS, 'batch' syncs groups of files, 'always' syncs each file
+FSYNC_POLICIES = ('none', 'batch', 'always')
+
+# A batch is synced once it holds this many files or bytes, or its oldest file waited this long
+FSYNC_BATCH_FILES = 64
+FSYNC_BATCH_BYTES = 256 * 1024 * 1024
+FSYNC_BATCH_SECONDS = 5.0
+
+# Server-side encryption types whose ETags are not the MD5 of the object
+NON_MD5_ENCRYPTION = ('aws:kms', 'aws:kms:dsse')
+
+def normalize_etag(etag):
+    """Strip the quotes S3 puts around ETags."""
+    return etag.strip('"') if etag else etag
+
+def is_md5_etag(etag, encryption=None, customer_key=False):
+    """
+    Check if an ETag is the plain MD5 of the object.
+    
+    Multipart uploads have ETags like ``<hash>-<parts>`` that can't be compared
+    to a local checksum. Objects encrypted with SSE-KMS or a customer key
+    (SSE-C) have 32-digit ETags that look like an MD5 but aren't one, which
+    only the object's headers tell apart.
+    
+    Args:
+        etag (str): Object ETag
+        encryption (str): Object's ServerSideEncryption header, if known
+        customer_key (bool): Whether the object is encrypted with a customer key
+    """
+    if encryption in NON_MD5_ENCRYPTION or customer_key:
+        return False
+    etag = normalize_etag(etag)
+    return bool(etag) and len(etag) == 32 and '-' not in etag
+
+def response_has_md5_etag(response):
+    """
+    Check if a GetObject or HeadObject response's ETag is the MD5 of the object.
+    
+    Args:
+        response (dict): S3 response with the object's ETag and encryption headers
+        
+    Returns:
+        bool: True if the data can be verified against the ETag
+    """
+    return is_md5_etag(response.get('ETag'), response.get('ServerSideEncryption'),
+                       bool(response.get('SSECustomerAlgorithm')))
+
+def file_md5(path):
+    """
+    Compute the MD5 hex digest of a local file.
+    
+    Args:
+        path (str): Path to the file
+        
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _write_json_atomic(path, data):
+    """Write JSON to a temporary file and rename it over the target."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class DownloadIndex:
+    """
+    Records which files in an output directory match which S3 object versions.
+    """
+    def __init__(self, output_dir):
+        """
+        Load the index for an output directory.
+        
+        Args:
+            output_dir (str): Local directory downloads are written to
+        """
+        self.path = os.path.join(output_dir, INDEX_FILENAME)
+        self.entries = {}
+        self.skipped = 0
+        self.resumed = 0
+        self._unsaved = 0
+        # Checks run in worker threads while the event loop records downloads
+        self._lock = threading.Lock()
+        
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"Ignoring unreadable download index {self.path}: {str(e)}")
+    
+    def is_current(self, rel_path, local_path, size, etag):
+        """
+        Check if the local copy of an object is already up to date.
+        
+        A file is current when its size matches and either the index recorded
+        it for this ETag (with an unchanged modification time) or, for objects
+        with a plain MD5 ETag, its checksum matches. Objects the index
+        recorded as encrypted with SSE-KMS or SSE-C are never hashed, since
+        their ETags aren't checksums. This may hash the file, so call it
+        from a worker thread.
+        
+        Args:
+            rel_path (str): Path relative to the output directory
+            local_path (str): Local file path
+            size (int): Remote object size
+            etag (str): Remote object ETag
+            
+        Returns:
+            bool: True if the file can be skipped
+        """
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return False
+        
+        if size is not None and stat.st_size != size:
+            return False
+        
+        etag = normalize_etag(etag)
+        with self._lock:
+            entry = self.entries.get(rel_path)
+        if entry and entry.get('etag') == etag and entry.get('size') == stat.st_size \
+                and entry.get('mtime') == stat.st_mtime:
+            return True
+        
+        # Not indexed (or touched since): fall back to comparing checksums
+        if is_md5_etag(etag) and (not entry or entry.get('md5', True)) and file_md5(local_path) == etag:
+            self.record(rel_path, local_path, etag)
+            return True
+        
+        return False
+    
+    def record(self, rel_path, local_path, etag, md5=True):
+        """
+        Record a completed download.
+        
+        Args:
+            rel_path (str): Path relative to the output directory
+            local_path (str): Local file path
+            etag (str): Remote object ETag
+            md5 (bool): Whether the ETag is the object's MD5 (False for SSE-KMS and SSE-C objects)
+        """
+        stat = os.stat(local_path)
+        with self._lock:
+            self.entries[rel_path] = {
+                'etag': normalize_etag(etag),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime
+            }
+            if not md5:
+                self.entries[rel_path]['md5'] = False
+            self._unsaved += 1
+            save_now = self._unsaved >= INDEX_SAVE_INTERVAL
+        if save_now:
+            self.save()
+    
+    def forget(self, rel_path):
+        """
+        Remove a file that was deleted locally from the index.
+        
+        Args:
+            rel_path (str): Path relative to the output directory
+        """
+        with self._lock:
+            if self.entries.pop(rel_path, None) is not None:
+                self._unsaved += 1
+    
+    def save(self):
+        """Write the index to disk."""
+        with self._lock:
+            if not self._unsaved and os.path.exists(self.path):
+                return
+            try:
+                _write_json_atomic(self.path, self.entries)
+                self._unsaved = 0
+            except OSError as e:
+                print(f"Could not save download index {self.path}: {str(e)}")
+
+def load_part_state(local_path, size, etag):
+    """
+    Load the resume state of a partial download if it matches the remote object.
+    
+    Args:
+        local_path (str): Final local path of the file
+        size (int): Remote object size
+        etag (str): Remote object ETag
+        
+    Returns:
+        dict: The saved state, or None if there is nothing to resume
+    """
+    state_path = local_path + STATE_SUFFIX
+    if not os.path.exists(local_path + PART_SUFFIX) or not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return None
+    
+    if state.get('etag') != normalize_etag(etag) or state.get('size') != size:
+        return None
+    return state
+
+def save_part_state(local_path, state):
+    """
+    Save the resume state of a partial download.
+    
+    Args:
+        local_path (str): Final local path of the file
+        state (dict): State with 'etag', 'size' and download progress
+    """
+    _write_json_atomic(local_path + STATE_SUFFIX, state)
+
+def clear_part_state(local_path, remove_data=False):
+    """
+    Remove the resume state (and optionally the partial data) of a download.
+    
+    Args:
+        local_path (str): Final local path of the file
+        remove_data (bool): Also remove the partial data file
+    """
+    paths = [local_path + STATE_SUFFIX]
+    if remove_data:
+        paths.append(local_path + PART_SUFFIX)
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _fsync_path(path):
+    """Flush a file or directory to disk, ignoring platforms that can't sync directories."""
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _sync_and_replace(moves, sync):
+    """
+    Move finished files into place, syncing their data first when requested.
+    
+    Args:
+        moves (list): (temporary path, final path) pairs
+        sync (bool): Whether to fsync the files and their directories
+        
+    Returns:
+        set: Final paths that could not be moved into place
+    """
+    failed = set()
+    if sync:
+        for tmp_path, _ in moves:
+            _fsync_path(tmp_path)
+    for tmp_path, final_path in moves:
+        try:
+            os.replace(tmp_path, final_path)
+        except OSError as e:
+            print(f"\nError moving {tmp_path} into place: {str(e)}")
+            failed.add(final_path)
+    if sync:
+        # Make the renames themselves durable
+        for directory in {os.path.dirname(final_path) or '.' for _, final_path in moves}:
+            _fsync_path(directory)
+    return failed
+
+class FileCommitter:
+    """
+    Moves finished downloads from their temporary names into place under an fsync policy.
+    
+    With the 'batch' policy files are synced and renamed in groups, so a
+    large pull pays for one round of fsyncs per batch instead of per file.
+    A file keeps its temporary name until its data is on disk, so a crash
+    never leaves a truncated file under the final name. Files of a batch
+    that can't be moved into place are returned by close(), since the
+    downloads that committed them have already finished.
+    """
+    def __init__(self, policy='batch'):
+        """
+        Initialize the committer.
+        
+        Args:
+            policy (str): 'none', 'batch' or 'always'
+        """
+        if policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {policy} (use {', '.join(FSYNC_POLICIES)})")
+        self.policy = policy
+        self._pending = []
+        self._pending_bytes = 0
+        self._pending_since = None
+        self._flushes = set()
+        self._lock = asyncio.Lock()
+        self._failed = []
+    
+    async def commit(self, tmp_path, final_path, size=0, on_commit=None):
+        """
+        Move a finished file into place, now or with its batch.
+        
+        With the 'none' and 'always' policies the file is moved before this
+        returns. With 'batch' it may be moved later, and a failed move is
+        reported by close() instead.
+        
+        Args:
+            tmp_path (str): Temporary path holding the complete, verified data
+            final_path (str): Path the file should end up at
+            size (int): File size, used to size batches
+            on_commit (callable): Optional function called once the file is in place
+            
+        Raises:
+            IOError: If the file can't be moved into place (with the 'none' and 'always' policies)
+        """
+        loop = asyncio.get_running_loop()
+        if self.policy != 'batch':
+            failed = await loop.run_in_executor(None, _sync_and_replace, [(tmp_path, final_path)],
+                                                self.policy == 'always')
+            if failed:
+                raise IOError(f"could not move {tmp_path} into place")
+            if on_commit:
+                on_commit()
+            return
+        
+        self._pending.append((tmp_path, final_path, on_commit))
+        self._pending_bytes += size or 0
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        
+        if len(self._pending) >= FSYNC_BATCH_FILES or self._pending_bytes >= FSYNC_BATCH_BYTES or \
+                time.monotonic() - self._pending_since >= FSYNC_BATCH_SECONDS:
+            # Sync in the background so downloads keep going
+            task = asyncio.ensure_future(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+    
+    async def flush(self):
+        """Sync and move every pending file into place."""
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            self._pending_bytes = 0
+            self._pending_since = None
+            if not batch:
+                return
+            
+            moves = [(tmp_path, final_path) for tmp_path, final_path, _ in batch]
+            try:
+                failed = await asyncio.get_running_loop().run_in_executor(None, _sync_and_replace, moves, True)
+            except Exception as e:
+                print(f"\nError moving downloaded files into place: {str(e)}")
+                failed = {final_path for _, final_path in moves}
+            for _, final_path, on_commit in batch:
+                if final_path in failed:
+                    self._failed.append(final_path)
+                elif on_commit:
+                    on_commit()
+    
+    async def close(self):
+        """
+        Wait for background batches and commit everything still pending.
+        
+        Returns:
+            list: Final paths of batched files that could not be moved into place
+        """
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
+        failed, self._failed = self._failed, []
+        return failed
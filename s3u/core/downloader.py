@@ -4,13 +4,396 @@ File and folder download functionality.
 
 import os
 import sys
+import time
 import asyncio
-from botocore.exceptions import NoCredentialsError
+import hashlib
+import threading
+from botocore.exceptions import NoCredentialsError, ClientError
 
-from .s3_core import get_s3_session, get_bucket_name
-from ..utils.progress import ProgressBar
+from .s3_core import get_s3_session, get_s3_client, get_bucket_name, get_list_page_size
+from .filters import parse_filter
+from .listing import iter_prefix_pages
+from .inventory import get_inventory_source
+from .bucket_index import iter_listing
+from .folder_manifest import is_manifest_key
+from .download_state import (
+    DownloadIndex, FileCommitter, PART_SUFFIX, normalize_etag, response_has_md5_etag, file_md5,
+    load_part_state, save_part_state, clear_part_state
+)
+from ..utils.progress import TransferProgress
+from ..utils.concurrency import AdaptiveLimiter
 
-async def download_file(s3, file_key, output_dir, semaphore, progress, progress_lock):
+# Objects at least this large are fetched as parallel byte ranges
+RANGED_DOWNLOAD_THRESHOLD = 64 * 1024 * 1024
+
+# Bounds for the size of each byte range
+MIN_PART_SIZE = 8 * 1024 * 1024
+MAX_PART_SIZE = 256 * 1024 * 1024
+
+# Requests in flight when downloads start (and the fixed default before auto mode)
+DEFAULT_DOWNLOAD_CONCURRENCY = 10
+
+# Upper bound for automatically tuned download concurrency
+MAX_AUTO_CONCURRENCY = 256
+
+# Size of each read from a response body
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Files at least this large have their size reserved on disk before writing
+PREALLOCATE_MIN_SIZE = 1024 * 1024
+
+# Files at least this large keep resume state; smaller ones simply restart
+RESUMABLE_MIN_SIZE = 8 * 1024 * 1024
+
+# Single-stream downloads save their resume offset after this many bytes
+STREAM_STATE_INTERVAL = 8 * 1024 * 1024
+
+# Serializes seek+write on platforms without os.pwrite
+_write_lock = threading.Lock()
+
+def split_ranges(size, part_size):
+    """Split an object into inclusive (start, end) byte ranges of part_size bytes."""
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+def plan_ranges(size, concurrency):
+    """
+    Split an object into byte ranges for parallel download.
+    
+    Parts are sized so each object is split into a few ranges per available
+    connection, within MIN_PART_SIZE and MAX_PART_SIZE.
+    
+    Args:
+        size (int): Object size in bytes
+        concurrency (int): Total number of concurrent requests allowed
+        
+    Returns:
+        tuple: (ranges, parallel) - list of inclusive (start, end) byte ranges
+               and the number of ranges to fetch at once
+    """
+    concurrency = max(1, concurrency)
+    part_size = max(MIN_PART_SIZE, min(MAX_PART_SIZE, size // (concurrency * 4)))
+    ranges = split_ranges(size, part_size)
+    return ranges, min(len(ranges), concurrency)
+
+def get_local_path(file_key, output_dir):
+    """
+    Get the local path for a downloaded object.
+    
+    The first component of the key (the folder being downloaded) is dropped.
+    
+    Returns:
+        tuple: (relative_path, local_path)
+    """
+    if '/' in file_key:
+        folder_prefix = file_key.split('/')[0] + '/'
+        relative_path = file_key[len(folder_prefix):]
+    else:
+        relative_path = file_key
+    return relative_path, os.path.join(output_dir, relative_path)
+
+def _write_at(fd, data, offset):
+    """Write data at an absolute file offset."""
+    if hasattr(os, 'pwrite'):
+        os.pwrite(fd, data, offset)
+    else:
+        with _write_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+async def _write_in_thread(loop, write, *args):
+    """
+    Run a blocking write in a worker thread.
+    
+    A cancelled caller still waits for the write to finish, since the thread
+    can't be stopped and the file must stay open until it is done.
+    """
+    future = loop.run_in_executor(None, write, *args)
+    try:
+        await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        raise
+
+def _preallocate(fd, size):
+    """Reserve disk space for a file of the given size."""
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, size)
+
+def _is_precondition_failure(error):
+    """Check if a request failed because the object changed (If-Match mismatch)."""
+    return isinstance(error, ClientError) and \
+        error.response.get('Error', {}).get('Code') in ('PreconditionFailed', '412')
+
+async def _download_range(s3, file_key, fd, start, end, etag=None, on_bytes=None):
+    """
+    Download one byte range of an object and write it at its offset.
+    
+    Args:
+        s3: S3 client
+        file_key (str): S3 object key
+        fd (int): File descriptor of the preallocated local file
+        start (int): First byte of the range
+        end (int): Last byte of the range (inclusive)
+        etag (str): Optional ETag the object must still match
+        on_bytes (callable): Optional function called with the size of each chunk written
+        
+    Returns:
+        bool: True if the object's ETag is its MD5 (see response_has_md5_etag)
+    """
+    request = {'Bucket': get_bucket_name(), 'Key': file_key, 'Range': f"bytes={start}-{end}"}
+    if etag:
+        # Fail rather than mix parts of two versions of the object
+        request['IfMatch'] = etag
+    
+    response = await s3.get_object(**request)
+    body = response['Body']
+    loop = asyncio.get_running_loop()
+    offset = start
+    try:
+        while True:
+            chunk = await body.read(DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            # Writes go through a worker thread so slow disks don't stall the other ranges
+            await _write_in_thread(loop, _write_at, fd, chunk, offset)
+            offset += len(chunk)
+            if on_bytes:
+                on_bytes(len(chunk))
+    finally:
+        body.close()
+    
+    if offset != end + 1:
+        raise IOError(f"incomplete range {start}-{end} ({offset - start} of {end - start + 1} bytes)")
+    return response_has_md5_etag(response)
+
+async def _download_stream(s3, file_key, local_path, offset=0, etag=None, size=None, save_offset=None,
+                           on_bytes=None):
+    """
+    Download an object (or its tail from offset) as a single stream.
+    
+    Args:
+        s3: S3 client
+        file_key (str): S3 object key
+        local_path (str): Local file to write; written from offset when resuming
+        offset (int): Byte offset to resume from
+        etag (str): Optional ETag the object must still match
+        size (int): Optional object size, used to preallocate the file
+        save_offset (callable): Optional function called with the number of bytes safely written
+        on_bytes (callable): Optional function called with the size of each chunk written
+        
+    Returns:
+        tuple: (end offset, MD5 hex digest when downloaded from the start (else None),
+                whether the object's ETag is its MD5)
+    """
+    request = {'Bucket': get_bucket_name(), 'Key': file_key}
+    if offset:
+        request['Range'] = f"bytes={offset}-"
+    if etag:
+        request['IfMatch'] = etag
+    
+    response = await s3.get_object(**request)
+    body = response['Body']
+    loop = asyncio.get_running_loop()
+    # Hash while writing so fresh downloads don't need a second read to verify
+    digest = hashlib.md5() if not offset else None
+    try:
+        with open(local_path, 'r+b' if offset else 'wb') as f:
+            if not offset and size and size >= PREALLOCATE_MIN_SIZE:
+                _preallocate(f.fileno(), size)
+            f.seek(offset)
+            saved = offset
+            while True:
+                chunk = await body.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await _write_in_thread(loop, f.write, chunk)
+                offset += len(chunk)
+                if on_bytes:
+                    on_bytes(len(chunk))
+                if digest:
+                    digest.update(chunk)
+                if save_offset and offset - saved >= STREAM_STATE_INTERVAL:
+                    # Data must reach the file before the state claims it
+                    f.flush()
+                    save_offset(offset)
+                    saved = offset
+            f.flush()
+            if save_offset:
+                save_offset(offset)
+    finally:
+        body.close()
+    
+    return offset, digest.hexdigest() if digest else None, response_has_md5_etag(response)
+
+async def download_ranged(s3, file_key, local_path, size, etag=None, concurrency=10, range_semaphore=None,
+                          resume_state=None, save_state=None, on_bytes=None):
+    """
+    Download a large object as concurrent byte ranges into a preallocated file.
+    
+    Completed ranges are reported through save_state so an interrupted
+    download can continue where it stopped.
+    
+    Args:
+        s3: S3 client
+        file_key (str): S3 object key
+        local_path (str): Local file path to write
+        size (int): Object size in bytes
+        etag (str): Optional ETag the object must still match
+        concurrency (int): Total concurrency budget used to size the ranges
+        range_semaphore: Optional asyncio semaphore (or AdaptiveLimiter) shared by all ranged downloads
+        resume_state (dict): Saved part state of an earlier attempt to continue from
+        save_state (callable): Optional function called with the part state as ranges complete
+        on_bytes (callable): Optional function called with the size of each chunk written
+        
+    Returns:
+        bool: True if the object's ETag is its MD5, or None if every range was already done
+    """
+    if resume_state and resume_state.get('part_size'):
+        # Keep the earlier attempt's ranges so its completed ones line up
+        part_size = resume_state['part_size']
+        ranges = split_ranges(size, part_size)
+        parallel = min(len(ranges), max(1, concurrency))
+        done = set(resume_state.get('done', []))
+    else:
+        ranges, parallel = plan_ranges(size, concurrency)
+        part_size = ranges[0][1] + 1 if ranges else size
+        done = set()
+    
+    semaphore = range_semaphore or asyncio.Semaphore(parallel)
+    state = {'etag': normalize_etag(etag), 'size': size, 'part_size': part_size, 'done': sorted(done)}
+    
+    fd = os.open(local_path, os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        if not done:
+            _preallocate(fd, size)
+        if save_state:
+            save_state(state)
+        
+        async def fetch(start, end):
+            async with semaphore:
+                md5 = await _download_range(s3, file_key, fd, start, end, etag, on_bytes)
+                if isinstance(semaphore, AdaptiveLimiter):
+                    semaphore.record(end - start + 1)
+            done.add(start)
+            if save_state:
+                state['done'] = sorted(done)
+                save_state(state)
+            return md5
+        
+        tasks = [asyncio.ensure_future(fetch(start, end)) for start, end in ranges if start not in done]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # The other ranges still write to fd, so stop them before it is closed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    finally:
+        os.close(fd)
+    return all(results) if results else None
+
+async def fetch_object(s3, file_key, local_path, size=None, etag=None, concurrency=10, range_semaphore=None,
+                       resume=True, committer=None, on_complete=None, on_bytes=None):
+    """
+    Download an object to local_path via a part file, resuming and verifying it.
+    
+    Data is written to ``<local_path>.s3u-part`` and only moved into place
+    once its size (and MD5, for objects with a plain MD5 ETag) has been
+    verified, so an interrupted run never leaves a file that looks complete.
+    Objects encrypted with SSE-KMS or SSE-C are verified by size only, since
+    their ETags aren't checksums; If-Match still keeps their ranges from
+    mixing versions.
+    
+    Args:
+        s3: S3 client
+        file_key (str): S3 object key
+        local_path (str): Final local file path
+        size (int): Object size from the listing, if known
+        etag (str): Object ETag from the listing, if known
+        concurrency (int): Total concurrency budget used to size ranged downloads
+        range_semaphore: Optional asyncio semaphore limiting ranged requests across all files
+        resume (bool): Continue from a matching partial download if one exists
+        committer (FileCommitter): Optional committer that moves the file into place under
+                                   its fsync policy (defaults to an immediate rename)
+        on_complete (callable): Optional function called once the file is in place, with whether
+                                the object's ETag is its MD5 (for DownloadIndex.record)
+        on_bytes (callable): Optional function called with the size of each chunk received
+        
+    Returns:
+        bool: True if an earlier partial download was resumed
+    """
+    part_path = local_path + PART_SUFFIX
+    # Small files are cheaper to fetch again than to track; ranged downloads always keep state
+    resumable = size is not None and size >= min(RESUMABLE_MIN_SIZE, RANGED_DOWNLOAD_THRESHOLD)
+    resume_state = load_part_state(local_path, size, etag) if resume and resumable else None
+    if not resume_state:
+        clear_part_state(local_path, remove_data=resumable)
+    
+    def save_state(state):
+        save_part_state(local_path, state)
+    
+    digest = None
+    md5 = None
+    try:
+        if size is not None and size >= RANGED_DOWNLOAD_THRESHOLD:
+            md5 = await download_ranged(s3, file_key, part_path, size, etag, concurrency, range_semaphore, resume_state,
+                                  save_state=save_state, on_bytes=on_bytes)
+        else:
+            # Parts written before offsets were saved were never preallocated
+            offset = resume_state.get('offset', os.path.getsize(part_path)) if resume_state else 0
+            state = {'etag': normalize_etag(etag), 'size': size, 'offset': offset}
+            
+            def save_offset(written):
+                state['offset'] = written
+                save_state(state)
+            
+            end = offset
+            if not resume_state or size is None or offset < size:
+                end, digest, md5 = await _download_stream(s3, file_key, part_path, offset, etag, size,
+                                                          save_offset if resumable else None, on_bytes)
+            if size is not None and end != size:
+                raise IOError(f"incomplete download ({end} of {size} bytes)")
+    except Exception as e:
+        if _is_precondition_failure(e):
+            # The object changed since it was listed; its partial data is useless
+            clear_part_state(local_path, remove_data=True)
+        raise
+    
+    # Verify before moving the file into place
+    actual_size = os.path.getsize(part_path)
+    if size is not None and actual_size != size:
+        raise IOError(f"size mismatch ({actual_size} of {size} bytes)")
+    if md5 is None and etag:
+        # Nothing was left to fetch, so ask for the headers that tell if the ETag is a checksum
+        md5 = response_has_md5_etag(await s3.head_object(Bucket=get_bucket_name(), Key=file_key, IfMatch=etag))
+    if md5:
+        if digest is None:
+            digest = await asyncio.get_running_loop().run_in_executor(None, file_md5, part_path)
+        if digest != normalize_etag(etag):
+            clear_part_state(local_path, remove_data=True)
+            raise IOError("checksum mismatch, the partial download was discarded")
+    
+    def completed():
+        clear_part_state(local_path)
+        if on_complete:
+            on_complete(bool(md5))
+    
+    if committer:
+        await committer.commit(part_path, local_path, actual_size, completed)
+    else:
+        os.replace(part_path, local_path)
+        completed()
+    return resume_state is not None
+
+async def download_file(s3, file_key, output_dir, semaphore, progress, progress_lock, size=None, etag=None,
+                        concurrency=10, range_semaphore=None, index=None, resume=True, committer=None,
+                        created_dirs=None):
     """
     Download a single file from S3.
     
@@ -18,54 +401,152 @@ async def download_file(s3, file_key, output_dir, semaphore, progress, progress_
         s3: S3 client
         file_key (str): S3 object key
         output_dir (str): Local directory to save to
-        semaphore: Asyncio semaphore for concurrency control
+        semaphore: Asyncio semaphore (or AdaptiveLimiter) for concurrency control
         progress: Progress bar object
         progress_lock: Asyncio lock for progress updates
+        size (int): Optional object size from the listing; large objects are fetched as parallel ranges
+        etag (str): Optional object ETag from the listing
+        concurrency (int): Total concurrency budget used to size ranged downloads
+        range_semaphore: Optional asyncio semaphore limiting ranged requests across all files
+        index (DownloadIndex): Optional index that completed downloads are recorded in
+        resume (bool): Skip files the index shows are unchanged and resume partial downloads
+        committer (FileCommitter): Optional committer that moves finished files into place
+        created_dirs (set): Optional set of directories already created during this run
         
     Returns:
         bool: True if successful, False otherwise
     """
     async with semaphore:
+        # Byte-level progress when the bar supports it
+        by_bytes = isinstance(progress, TransferProgress)
+        received = 0
+        started = time.monotonic()
+        
+        def on_bytes(nbytes):
+            nonlocal received
+            received += nbytes
+            progress.add_bytes(nbytes)
+        
         try:
-            # Extract folder prefix
-            if '/' in file_key:
-                folder_prefix = file_key.split('/')[0] + '/'
-                relative_path = file_key[len(folder_prefix):]
+            relative_path, local_path = get_local_path(file_key, output_dir)
+            
+            # Skip files that already match the remote object
+            if index and resume and await asyncio.get_running_loop().run_in_executor(
+                    None, index.is_current, relative_path, local_path, size, etag):
+                index.skipped += 1
             else:
-                relative_path = file_key
+                # Ensure the directory exists, once per directory per run
+                directory = os.path.dirname(local_path)
+                if created_dirs is None or directory not in created_dirs:
+                    os.makedirs(directory, exist_ok=True)
+                    if created_dirs is not None:
+                        created_dirs.add(directory)
                 
-            local_path = os.path.join(output_dir, relative_path)
-            
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            
-            # Download the file
-            await s3.download_file(get_bucket_name(), file_key, local_path)
+                # Download the file
+                def record(md5):
+                    index.record(relative_path, local_path, etag, md5)
+                resumed = await fetch_object(s3, file_key, local_path, size, etag, concurrency,
+                                             range_semaphore, resume=resume, committer=committer,
+                                             on_complete=record if index else None,
+                                             on_bytes=on_bytes if by_bytes else None)
+                if index:
+                    index.resumed += int(resumed)
+                if isinstance(semaphore, AdaptiveLimiter):
+                    semaphore.record(size)
             
             # Update the progress bar
             async with progress_lock:
-                file_size = os.path.getsize(local_path)
-                progress.update(1)
+                if by_bytes:
+                    progress.finish_file(relative_path, size, received, time.monotonic() - started)
+                else:
+                    progress.update(1)
             
             return True
         except Exception as e:
             print(f"\nError downloading {file_key}: {str(e)}")
             async with progress_lock:
-                progress.update(1)
+                if by_bytes:
+                    progress.finish_file(file_key, size, received, time.monotonic() - started, success=False)
+                else:
+                    progress.update(1)
             return False
 
-async def download_folder(folder_name, output_dir=None, limit=None):
+async def iter_folder_pages(s3, folder_prefix, limit=None, object_filter=None):
+    """
+    Stream the objects under a prefix one listing page at a time.
+    
+    S3 lists keys in sorted order, so stopping after limit objects gives the
+    same files as sorting the full listing, without reading all of it, and
+    pages are only as large as the limit needs. The filter is applied to the
+    raw page entries, so limit counts matching objects (and full pages are
+    requested, since any number of objects may not match). With an inventory
+    source configured, the objects come from the inventory report instead.
+    
+    Args:
+        s3: S3 client
+        folder_prefix (str): Prefix to list, with a trailing slash
+        limit (int): Optional maximum number of objects
+        object_filter (ObjectFilter): Optional filter objects must match
+        
+    Yields:
+        list: (key, size, etag, last_modified) tuples for each page
+    """
+    remaining = limit if limit and limit > 0 else None
+    # Without a limit the whole prefix is read, so it is listed in concurrent parts
+    page_size = get_list_page_size(None if object_filter else remaining) if remaining else None
+    if get_inventory_source():
+        pages = iter_listing(s3, folder_prefix)
+    else:
+        pages = iter_prefix_pages(s3, folder_prefix, page_size)
+    
+    async for contents in pages:
+        # Skip the folder itself and folder manifests
+        batch = [(obj['Key'], obj['Size'], obj.get('ETag'), obj.get('LastModified'))
+                 for obj in contents
+                 if obj['Key'] != folder_prefix and not is_manifest_key(obj['Key'])
+                 and (object_filter is None or object_filter(obj))]
+        if remaining is not None:
+            batch = batch[:remaining]
+            remaining -= len(batch)
+        if batch:
+            yield batch
+        if remaining == 0:
+            return
+
+async def download_folder(folder_name, output_dir=None, limit=None, force=False, max_concurrent='auto', archive=None,
+                          object_filter=None, fsync='batch'):
     """
     Download files from an S3 folder.
     
+    Files whose size and ETag match an earlier download (recorded in a
+    sidecar index in the output directory) are skipped, and interrupted
+    downloads are resumed from their partial data. Files are written under
+    temporary names and renamed into place once complete.
+    
     Args:
         folder_name (str): The folder to download
         output_dir (str): Local directory to save files (defaults to folder_name)
         limit (int): Optional limit on the number of files to download
+        force (bool): Download every file again, ignoring local copies and partial downloads
+        max_concurrent (int or str): Maximum concurrent requests, or 'auto' to tune the number
+                                     from observed throughput and throttling
+        archive (str): Optional .zip/.tar/.tar.gz path (or '-' for a tar on stdout) to stream
+                       the files into instead of writing them to output_dir
+        object_filter (str or ObjectFilter): Optional filter expression (see filters.py),
+                                             e.g. "ext:images size<5MB since:7d"
+        fsync (str): When to flush finished files to disk: 'none', 'batch' (groups of files)
+                     or 'always' (every file before it is renamed)
         
     Returns:
-        int: Number of files downloaded
+        int: Number of files downloaded or already up to date
     """
+    object_filter = parse_filter(object_filter)
+    
+    if archive:
+        # Imported here because the archive sink imports this module
+        from .archive_sink import download_to_archive
+        return await download_to_archive(folder_name, archive, limit, max_concurrent, object_filter)
+    
     session = get_s3_session()
     
     # Make sure folder name has trailing slash
@@ -76,53 +557,103 @@ async def download_folder(folder_name, output_dir=None, limit=None):
         output_dir = folder_name
     
     os.makedirs(output_dir, exist_ok=True)
+    index = DownloadIndex(output_dir)
+    committer = FileCommitter(fsync or 'batch')
+    created_dirs = set()
     
-    # Get list of all objects in the folder
-    files_to_download = []
+    # Concurrency is shared between whole files and the byte ranges of large files
+    auto_concurrency = max_concurrent in (None, 'auto')
+    if auto_concurrency:
+        concurrency = DEFAULT_DOWNLOAD_CONCURRENCY
+        pool_size = MAX_AUTO_CONCURRENCY * 2
+        worker_count = MAX_AUTO_CONCURRENCY
+    else:
+        concurrency = max(1, int(max_concurrent))
+        pool_size = concurrency * 2
+        worker_count = concurrency
     
     try:
-        async with session.client('s3') as s3:
-            paginator = s3.get_paginator('list_objects_v2')
-            
-            print(f"Scanning folder: {folder_name}")
-            async for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=folder_prefix):
-                if 'Contents' in page:
-                    for obj in page['Contents']:
-                        # Skip the folder itself
-                        if obj['Key'] != folder_prefix:
-                            files_to_download.append(obj['Key'])
-            
-            if not files_to_download:
-                print(f"No files found in folder: {folder_name}")
-                return 0
-            
-            # Sort the files alphabetically for consistent results when limiting
-            files_to_download.sort()
+        async with get_s3_client(session, pool_size) as s3:
+            # Create a semaphore to limit concurrent downloads
+            if auto_concurrency:
+                semaphore = AdaptiveLimiter(concurrency, maximum=MAX_AUTO_CONCURRENCY)
+                range_semaphore = AdaptiveLimiter(concurrency, maximum=MAX_AUTO_CONCURRENCY)
+                semaphore.observe_client(s3)
+                range_semaphore.observe_client(s3)
+            else:
+                semaphore = asyncio.Semaphore(concurrency)
+                range_semaphore = asyncio.Semaphore(concurrency)
             
-            # Apply limit if specified
-            if limit and limit > 0 and limit < len(files_to_download):
-                print(f"Limiting download to {limit} of {len(files_to_download)} files")
-                files_to_download = files_to_download[:limit]
+            # Track progress
+            progress = None
+            progress_lock = asyncio.Lock()
             
-            print(f"Downloading {len(files_to_download)} files from {folder_name}")
+            # Downloads start as soon as the first listing page arrives
+            download_queue = asyncio.Queue(maxsize=worker_count * 2)
+            total_files = 0
+            successful_downloads = 0
             
-            # Create a progress bar
-            progress = ProgressBar(len(files_to_download), prefix=f'Downloading:', suffix='Complete')
+            async def worker():
+                nonlocal successful_downloads
+                while True:
+                    item = await download_queue.get()
+                    if item is None:
+                        return
+                    file_key, size, etag, _ = item
+                    if await download_file(s3, file_key, output_dir, semaphore, progress, progress_lock,
+                                           size=size, etag=etag, concurrency=concurrency,
+                                           range_semaphore=range_semaphore, index=index, resume=not force,
+                                           committer=committer, created_dirs=created_dirs):
+                        successful_downloads += 1
             
-            # Create a semaphore to limit concurrent downloads
-            semaphore = asyncio.Semaphore(10)  # Limit to 10 concurrent downloads
+            print(f"Scanning folder: {folder_name}")
+            if limit and limit > 0:
+                print(f"Limiting download to the first {limit} files")
             
-            # Track progress
-            progress_lock = asyncio.Lock()
+            workers = [asyncio.ensure_future(worker()) for _ in range(worker_count)]
+            try:
+                try:
+                    async for batch in iter_folder_pages(s3, folder_prefix, limit, object_filter):
+                        total_files += len(batch)
+                        if progress is None:
+                            print(f"Downloading files from {folder_name}")
+                            progress = TransferProgress(prefix='Downloading:', suffix='Complete', growing=True)
+                        progress.add_total(len(batch), nbytes=sum(size for _, size, _, _ in batch))
+                        for item in batch:
+                            await download_queue.put(item)
+                except BaseException:
+                    for task in workers:
+                        task.cancel()
+                    raise
+                
+                for _ in workers:
+                    await download_queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                # Keep what finished even if the run is interrupted
+                failed_moves = await committer.close()
+                successful_downloads -= len(failed_moves)
+                index.save()
             
-            # Download all files concurrently
-            tasks = [download_file(s3, file_key, output_dir, semaphore, progress, progress_lock) 
-                    for file_key in files_to_download]
-            results = await asyncio.gather(*tasks)
+            if not total_files:
+                print(f"No files found in folder: {folder_name}" +
+                      (f" matching filter: {object_filter.expression}" if object_filter else ""))
+                return 0
             
-            successful_downloads = sum(1 for result in results if result)
+            # The listing is complete, so the progress bar can finish
+            progress.add_total(0, done=True)
             
-            print(f"\nDownloaded {successful_downloads} of {len(files_to_download)} files to {output_dir}")
+            print(f"\nDownloaded {successful_downloads} of {total_files} files to {output_dir}")
+            if progress.transferred:
+                progress.print_summary()
+            if index.skipped or index.resumed:
+                print(f"Skipped {index.skipped} unchanged files, resumed {index.resumed} partial downloads")
+            if auto_concurrency:
+                peak = max(semaphore.peak, range_semaphore.peak)
+                if peak > concurrency:
+                    print(f"Auto concurrency reached {peak} requests in flight")
+                if semaphore.throttle_count:
+                    print(f"S3 throttled {semaphore.throttle_count} requests")
             
             return successful_downloads
     except NoCredentialsError:
@@ -130,4 +661,4 @@ async def download_folder(folder_name, output_dir=None, limit=None):
         sys.exit(1)
     except Exception as e:
         print(f"Error downloading folder {folder_name}: {str(e)}")
-        return 0
\ No newline at end of file
+        return 0
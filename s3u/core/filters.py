@@ -0,0 +1,203 @@
+"""
+Filter expressions for selecting objects from S3 listings.
+
+An expression is a list of terms separated by spaces:
+
+    ext:jpg,png         Extensions or extension groups (images, videos, documents);
+                        a bare group name or '.jpg' also works
+    *.jpg               Glob on the file name (or on the key, if the pattern contains '/')
+    size>1MB            Size comparison (>, >=, <, <=, =) with B, KB, MB, GB or TB units
+    size:1MB-10MB       Inclusive size range
+    since:2024-05-01    Modified on or after a date/time, or within an age such as 7d, 12h or 30m
+    before:2024-06-01   Modified before a date/time or age
+    
+An object must match one of the name terms (extensions and globs), if
+there are any, and every size and date term. Filters are applied to the
+raw listing entries, before any URLs, metadata or downloads are created.
+"""
+
+import re
+import fnmatch
+from datetime import datetime, timedelta, timezone
+
+from .uploader import EXTENSION_GROUPS, should_process_file
+
+# Multipliers for size units
+SIZE_UNITS = {
+    '': 1, 'b': 1,
+    'k': 1024, 'kb': 1024,
+    'm': 1024 ** 2, 'mb': 1024 ** 2,
+    'g': 1024 ** 3, 'gb': 1024 ** 3,
+    't': 1024 ** 4, 'tb': 1024 ** 4,
+}
+
+# Seconds in each relative age unit
+AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*$', re.IGNORECASE)
+SIZE_TERM_PATTERN = re.compile(r'^size\s*(>=|<=|>|<|=)\s*(.+)$', re.IGNORECASE)
+AGE_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)([smhdw])$', re.IGNORECASE)
+
+def parse_size(value):
+    """
+    Parse a size such as '500KB' or '1.5GB' into bytes.
+    
+    Raises:
+        ValueError: If the size can't be parsed
+    """
+    match = SIZE_PATTERN.match(value)
+    if not match or match.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+def parse_time(value):
+    """
+    Parse a date/time or a relative age ('7d', '12h') into a UTC datetime.
+    
+    Dates without a timezone are taken as local time.
+    
+    Raises:
+        ValueError: If the value can't be parsed
+    """
+    match = AGE_PATTERN.match(value)
+    if match:
+        seconds = float(match.group(1)) * AGE_UNITS[match.group(2).lower()]
+        return datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date or age: {value} (use e.g. 2024-05-01 or 7d)")
+    return parsed.astimezone(timezone.utc)
+
+class ObjectFilter:
+    """
+    A parsed filter expression that can be called on S3 listing entries.
+    """
+    def __init__(self, expression):
+        """
+        Parse a filter expression.
+        
+        Args:
+            expression (str): The filter expression (see the module docstring)
+            
+        Raises:
+            ValueError: If a term can't be parsed
+        """
+        self.expression = expression
+        self.extensions = []
+        self.globs = []
+        self.min_size = None
+        self.max_size = None
+        self.since = None
+        self.before = None
+        
+        for term in expression.split():
+            self._add_term(term)
+    
+    def _add_term(self, term):
+        """Parse one term of the expression."""
+        lower = term.lower()
+        
+        size_match = SIZE_TERM_PATTERN.match(term)
+        if size_match:
+            operator, size = size_match.group(1), parse_size(size_match.group(2))
+            if operator in ('>', '>='):
+                self._set_min_size(size + 1 if operator == '>' else size)
+            elif operator in ('<', '<='):
+                self._set_max_size(size - 1 if operator == '<' else size)
+            else:
+                self._set_min_size(size)
+                self._set_max_size(size)
+        elif lower.startswith('size:'):
+            low, separator, high = term[5:].partition('-')
+            if not separator:
+                raise ValueError(f"Invalid size range: {term} (use e.g. size:1MB-10MB)")
+            if low:
+                self._set_min_size(parse_size(low))
+            if high:
+                self._set_max_size(parse_size(high))
+        elif lower.startswith('since:'):
+            self.since = parse_time(term[6:])
+        elif lower.startswith('before:'):
+            self.before = parse_time(term[7:])
+        elif lower.startswith('ext:'):
+            for ext in term[4:].replace(';', ',').split(','):
+                ext = ext.strip().lstrip('.').lower()
+                if ext in EXTENSION_GROUPS:
+                    self.extensions.extend(EXTENSION_GROUPS[ext])
+                elif ext:
+                    self.extensions.append(ext)
+        elif any(char in term for char in '*?['):
+            self.globs.append(lower)
+        elif lower in EXTENSION_GROUPS:
+            self.extensions.extend(EXTENSION_GROUPS[lower])
+        elif lower.startswith('.') and len(lower) > 1:
+            self.extensions.append(lower[1:])
+        else:
+            raise ValueError(f"Unknown filter term: {term}")
+    
+    def _set_min_size(self, size):
+        self.min_size = size if self.min_size is None else max(self.min_size, size)
+    
+    def _set_max_size(self, size):
+        self.max_size = size if self.max_size is None else min(self.max_size, size)
+    
+    def matches(self, key, size=None, last_modified=None):
+        """
+        Check if an object matches the filter.
+        
+        Args:
+            key (str): S3 object key
+            size (int): Object size in bytes
+            last_modified (datetime): Object modification time
+            
+        Returns:
+            bool: True if the object matches
+        """
+        if self.min_size is not None and (size is None or size < self.min_size):
+            return False
+        if self.max_size is not None and (size is None or size > self.max_size):
+            return False
+        if self.since is not None and (last_modified is None or last_modified < self.since):
+            return False
+        if self.before is not None and (last_modified is None or last_modified >= self.before):
+            return False
+        
+        if self.extensions or self.globs:
+            file_name = key.rsplit('/', 1)[-1]
+            if self.extensions and should_process_file(file_name, self.extensions):
+                return True
+            key_lower = key.lower()
+            for pattern in self.globs:
+                if '/' in pattern:
+                    if fnmatch.fnmatchcase(key_lower, pattern) or fnmatch.fnmatchcase(key_lower, '*/' + pattern):
+                        return True
+                elif fnmatch.fnmatchcase(file_name.lower(), pattern):
+                    return True
+            return False
+        
+        return True
+    
+    def __call__(self, obj):
+        """Check a raw list_objects_v2 entry (with Key, Size and LastModified)."""
+        return self.matches(obj['Key'], obj.get('Size'), obj.get('LastModified'))
+
+def parse_filter(expression):
+    """
+    Parse a filter expression, passing through already parsed filters.
+    
+    Args:
+        expression (str or ObjectFilter): The filter expression
+        
+    Returns:
+        ObjectFilter: The parsed filter, or None for an empty expression
+        
+    Raises:
+        ValueError: If the expression can't be parsed
+    """
+    if expression is None or isinstance(expression, ObjectFilter):
+        return expression
+    if not expression.strip():
+        return None
+    return ObjectFilter(expression)
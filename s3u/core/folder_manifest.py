@@ -0,0 +1,405 @@
+"""
+Folder manifests: one object describing everything in a folder.
+
+When the 'folder_manifest' setting is on, uploads (upload_files, watch
+mode and mirror up) write <folder>/_manifest.json after each run, listing
+every object in the folder
+with its size, ETag, modification time, URL and (for images, when Pillow is
+installed) dimensions. Browsing the folder later reads that one object
+instead of listing the folder page by page.
+
+The manifest is fetched with a conditional GET against a copy cached in
+~/.s3u/manifests, so an unchanged manifest costs one small request and no
+download. After an upload, the keys s3u just changed are patched into the
+manifest with HEAD requests; the folder is listed again only when there
+is no usable manifest or that is cheaper. The manifest records when the
+folder was last listed, and once that is more than 'manifest_max_age'
+seconds ago it is treated as stale and the folder is listed instead,
+since other tools may have changed the folder without updating it.
+Manifests of other folders s3u writes to (including parent folders, whose
+manifests cover their subfolders) are deleted, so those folders are listed
+until their next upload.
+"""
+
+import os
+import json
+import asyncio
+from datetime import datetime, timezone
+from urllib.parse import quote
+from botocore.exceptions import ClientError
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from .s3_core import get_bucket_name, get_cloudfront_url, MAX_LIST_KEYS
+from .listing import iter_prefix_pages, LIST_CONCURRENCY
+from .. import config
+from ..config import load_config
+
+# Name of the manifest object in each folder
+MANIFEST_NAME = '_manifest.json'
+
+# Manifest layout version; other versions are ignored
+MANIFEST_VERSION = 1
+
+# Seconds a manifest is trusted when the config doesn't say
+DEFAULT_MANIFEST_MAX_AGE = 86400
+
+# Tries to write a manifest when other uploads keep replacing it
+WRITE_ATTEMPTS = 3
+
+# Keys per DeleteObjects request when removing outdated manifests
+DELETE_BATCH_SIZE = 1000
+
+# HEAD requests that cost about as much as listing one page, for choosing
+# between patching changed keys into a manifest and listing the folder
+HEADS_PER_LIST_PAGE = 10
+
+# Most changed keys callers collect for patching; beyond that the folder is listed
+MAX_PATCHED_KEYS = 10000
+
+# Directory in the config directory holding local copies of fetched manifests, for conditional GETs
+CACHE_DIR_NAME = 'manifests'
+
+def is_folder_manifest_enabled():
+    """Check if folder manifests are written on upload and read on browse."""
+    return load_config().get('folder_manifest', 'no') == 'yes'
+
+def get_manifest_max_age():
+    """Get the configured manifest freshness bound in seconds."""
+    try:
+        return float(load_config().get('manifest_max_age', DEFAULT_MANIFEST_MAX_AGE))
+    except (TypeError, ValueError):
+        return DEFAULT_MANIFEST_MAX_AGE
+
+def _manifest_key(folder):
+    """Key of a folder's manifest ('' for the bucket root)."""
+    folder = folder.strip('/')
+    return f"{folder}/{MANIFEST_NAME}" if folder else MANIFEST_NAME
+
+def is_manifest_key(key):
+    """Check if a key is a folder manifest (which browsing and listings leave out)."""
+    return key == MANIFEST_NAME or key.endswith('/' + MANIFEST_NAME)
+
+def image_dimensions(path):
+    """
+    Read the dimensions of an image from its header.
+    
+    Args:
+        path (str): Local image file
+        
+    Returns:
+        tuple: (width, height), or None if Pillow isn't installed or the file isn't an image
+    """
+    if not PIL_AVAILABLE:
+        return None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None
+
+def _is_stale(manifest):
+    """
+    Check if a manifest's folder was listed too long ago (or it's not a manifest this version can read).
+    
+    Patching a manifest doesn't move its listing time, so changes made by
+    other tools show up at most manifest_max_age after the last listing.
+    """
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return True
+    try:
+        listed = datetime.fromisoformat(manifest['listed'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    age = (datetime.now(timezone.utc) - listed).total_seconds()
+    return age > get_manifest_max_age()
+
+def _cache_path(manifest_key):
+    """Local path of a cached manifest."""
+    return os.path.join(config.CONFIG_DIR, CACHE_DIR_NAME, get_bucket_name(), quote(manifest_key, safe='') + '.json')
+
+def _load_cached(path):
+    """Read a cached manifest and its ETag, or None."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            cached = json.load(f)
+        return cached if 'etag' in cached and 'manifest' in cached else None
+    except (OSError, ValueError):
+        return None
+
+def _save_cached(path, etag, manifest):
+    """Cache a fetched manifest, replacing the old copy in one step."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'etag': etag, 'manifest': manifest}, f)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+async def _get_manifest(s3, manifest_key):
+    """
+    Fetch a manifest, reusing the cached copy if it hasn't changed.
+    
+    The manifest is requested with If-None-Match set to the cached copy's
+    ETag, so S3 answers 304 Not Modified without sending it again if it
+    hasn't changed.
+    
+    Returns:
+        tuple: (manifest, ETag), or (None, None) if the folder has no manifest
+    """
+    cache_path = _cache_path(manifest_key)
+    cached = _load_cached(cache_path)
+    
+    request = {'Bucket': get_bucket_name(), 'Key': manifest_key}
+    if cached:
+        request['IfNoneMatch'] = cached['etag']
+    
+    try:
+        response = await s3.get_object(**request)
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if cached and (status == 304 or code in ('304', 'NotModified')):
+            return cached['manifest'], cached['etag']
+        if code in ('NoSuchKey', '404'):
+            if cached:
+                os.remove(cache_path)
+            return None, None
+        raise
+    
+    body = response['Body']
+    try:
+        data = await body.read()
+    finally:
+        body.close()
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        # Unreadable manifests are replaced
+        return None, response['ETag']
+    _save_cached(cache_path, response['ETag'], manifest)
+    return manifest, response['ETag']
+
+async def read_folder_manifest(s3, folder_prefix):
+    """
+    Get the objects in a folder from its manifest.
+    
+    Args:
+        s3: S3 client
+        folder_prefix (str): Folder prefix, with a trailing slash
+        
+    Returns:
+        list: Entries shaped like list_objects_v2 results (Key, Size, ETag, LastModified) in key
+              order, or None if the folder has no fresh manifest and must be listed
+    """
+    manifest, _ = await _get_manifest(s3, folder_prefix + MANIFEST_NAME)
+    if manifest is None or _is_stale(manifest):
+        return None
+    
+    return [{
+        'Key': entry['key'],
+        'Size': entry['size'],
+        'ETag': entry.get('etag'),
+        'LastModified': datetime.fromisoformat(entry['last_modified']) if entry.get('last_modified') else None
+    } for entry in sorted(manifest.get('files', []), key=lambda entry: entry['key'])]
+
+def _entry(key, size, etag, last_modified, base_url):
+    """A manifest entry for an object."""
+    return {
+        'key': key,
+        'url': f"{base_url}/{key}",
+        'size': size,
+        'etag': (etag or '').strip('"'),
+        'last_modified': last_modified.isoformat() if last_modified else None
+    }
+
+async def _add_dimensions(entry, known, local_paths):
+    """Give an image entry its dimensions, read from the uploaded file or kept from the previous manifest."""
+    key = entry['key']
+    dimensions = None
+    if key in local_paths:
+        loop = asyncio.get_running_loop()
+        dimensions = await loop.run_in_executor(None, image_dimensions, local_paths[key])
+    elif key in known and known[key].get('etag') == entry['etag'] and 'width' in known[key]:
+        dimensions = (known[key]['width'], known[key]['height'])
+    if dimensions:
+        entry['width'], entry['height'] = dimensions
+    return entry
+
+async def _list_files(s3, folder_prefix, known, local_paths, base_url):
+    """List a folder into manifest entries."""
+    files = []
+    async for contents in iter_prefix_pages(s3, folder_prefix):
+        for obj in contents:
+            key = obj['Key']
+            if key.endswith('/') or is_manifest_key(key):
+                continue
+            entry = _entry(key, obj['Size'], obj.get('ETag'), obj.get('LastModified'), base_url)
+            files.append(await _add_dimensions(entry, known, local_paths))
+    return files
+
+async def _patch_files(s3, known, changed_keys, local_paths, base_url):
+    """Apply changed keys to the previous manifest's entries, with a HEAD request for each."""
+    files = dict(known)
+    semaphore = asyncio.Semaphore(LIST_CONCURRENCY)
+    
+    async def patch(key):
+        async with semaphore:
+            try:
+                response = await s3.head_object(Bucket=get_bucket_name(), Key=key)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                    raise
+                # Deleted
+                files.pop(key, None)
+                return
+        entry = _entry(key, response['ContentLength'], response.get('ETag'), response.get('LastModified'),
+                       base_url)
+        files[key] = await _add_dimensions(entry, known, local_paths)
+    
+    await asyncio.gather(*(patch(key) for key in changed_keys))
+    return [files[key] for key in sorted(files)]
+
+async def write_folder_manifest(s3, s3_folder, local_paths=None, changed_keys=None):
+    """
+    Write a folder's manifest, patching the previous one or listing the folder.
+    
+    With changed_keys given and a fresh previous manifest, only those keys
+    are looked up (with HEAD requests) and patched into it, when that takes
+    fewer requests than listing the folder. Otherwise the folder is listed
+    (in concurrent parts), which picks up changes made by other tools too,
+    and the manifest records the listing time that decides when it goes
+    stale. Dimensions are read from the local files just uploaded, and kept
+    from the previous manifest for objects whose ETag hasn't changed. The
+    manifest is written only if it is still the one that was read
+    (If-Match, or If-None-Match for a new one); if another upload replaced
+    it in the meantime, it is read and written again.
+    
+    Args:
+        s3: S3 client
+        s3_folder (str): The folder name in the S3 bucket
+        local_paths (dict): Optional S3 key -> local path of files just uploaded, for reading dimensions
+        changed_keys (iterable): Optional keys s3u just wrote or deleted; None lists the folder
+        
+    Returns:
+        int: Number of files in the manifest, or None if it couldn't be written
+    """
+    folder_prefix = f"{s3_folder.strip('/')}/" if s3_folder.strip('/') else ''
+    manifest_key = folder_prefix + MANIFEST_NAME
+    local_paths = local_paths or {}
+    base_url = get_cloudfront_url()
+    if changed_keys is not None:
+        changed_keys = sorted({key for key in changed_keys if key.startswith(folder_prefix) and
+                               not key.endswith('/') and not is_manifest_key(key)})
+    
+    for attempt in range(WRITE_ATTEMPTS):
+        previous, previous_etag = await _get_manifest(s3, manifest_key)
+        known = {entry['key']: entry for entry in previous.get('files', [])} \
+            if isinstance(previous, dict) else {}
+        
+        list_pages = len(known) // MAX_LIST_KEYS + 1
+        if changed_keys is not None and not _is_stale(previous) and \
+                len(changed_keys) <= list_pages * HEADS_PER_LIST_PAGE:
+            files = await _patch_files(s3, known, changed_keys, local_paths, base_url)
+            listed = previous['listed']
+        else:
+            listed = datetime.now(timezone.utc).isoformat()
+            files = await _list_files(s3, folder_prefix, known, local_paths, base_url)
+        
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'folder': s3_folder,
+            'updated': datetime.now(timezone.utc).isoformat(),
+            'listed': listed,
+            'count': len(files),
+            'files': files
+        }
+        
+        request = {
+            'Bucket': get_bucket_name(),
+            'Key': manifest_key,
+            'Body': json.dumps(manifest).encode('utf-8'),
+            'ContentType': 'application/json',
+            'CacheControl': 'no-cache'
+        }
+        if previous_etag:
+            request['IfMatch'] = previous_etag
+        else:
+            request['IfNoneMatch'] = '*'
+        
+        try:
+            response = await s3.put_object(**request)
+        except ClientError as e:
+            # Another upload wrote the manifest after it was read
+            if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409'):
+                raise
+            continue
+        # The next read of the manifest is answered from the cache
+        if response.get('ETag'):
+            _save_cached(_cache_path(manifest_key), response['ETag'], manifest)
+        return len(files)
+    
+    print(f"Could not update {manifest_key}: it kept changing during the update")
+    return None
+
+def _covering_folders(folders):
+    """The folders and all their parents, whose manifests cover the folders' objects."""
+    covering = set()
+    for folder in folders:
+        parts = folder.strip('/').split('/') if folder.strip('/') else []
+        for depth in range(len(parts) + 1):
+            covering.add('/'.join(parts[:depth]))
+    return covering
+
+async def update_folder_manifests(s3, s3_folder=None, changed_folders=(), local_paths=None, changed_keys=None):
+    """
+    Bring folder manifests up to date after s3u wrote or deleted objects.
+    
+    The manifest of s3_folder is rewritten (see write_folder_manifest). The manifests of the other
+    folders holding changed objects, and of their parents, would list
+    outdated contents until they expire, so the ones that exist are deleted.
+    
+    Args:
+        s3: S3 client
+        s3_folder (str): Optional folder whose manifest is rewritten
+        changed_folders (iterable): Folders of the objects that were written or deleted
+        local_paths (dict): Optional S3 key -> local path of files just uploaded, for reading dimensions
+        changed_keys (iterable): Optional keys that were written or deleted, to patch s3_folder's manifest
+                                 with instead of listing the folder
+        
+    Returns:
+        int: Number of files in s3_folder's manifest, or None if it wasn't written
+    """
+    target = s3_folder.strip('/') if s3_folder is not None else None
+    count = await write_folder_manifest(s3, target, local_paths, changed_keys) if target is not None else None
+    
+    outdated = [_manifest_key(folder) for folder in sorted(_covering_folders(changed_folders))
+                if folder != target]
+    semaphore = asyncio.Semaphore(LIST_CONCURRENCY)
+    
+    async def exists(key):
+        async with semaphore:
+            try:
+                await s3.head_object(Bucket=get_bucket_name(), Key=key)
+                return True
+            except ClientError as e:
+                if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                    return False
+                raise
+    
+    # Only existing manifests are deleted, so versioned buckets don't collect delete markers
+    found = await asyncio.gather(*(exists(key) for key in outdated))
+    existing = [key for key, present in zip(outdated, found) if present]
+    for start in range(0, len(existing), DELETE_BATCH_SIZE):
+        batch = existing[start:start + DELETE_BATCH_SIZE]
+        await s3.delete_objects(Bucket=get_bucket_name(),
+                                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+    if existing:
+        print(f"Removed {len(existing)} outdated folder manifests")
+    return count
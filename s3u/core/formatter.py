@@ -1,145 +1,310 @@
 """
-Output formatters for different output types (JSON, XML, HTML, CSV).
+Output formatters for different output types (JSON, NDJSON, XML, HTML, CSV).
+
+Each format has a writer that streams the output to a text file object
+(write_json, write_csv, ...) and a format_* function returning it as a
+string. write_results sends the output to a file, stdout or the clipboard.
 """
 
+import io
+import os
+import sys
+import csv
 import json
-import xml.dom.minidom
+import pyperclip
 from datetime import datetime
 
+from ..config import load_config
+
+# File extensions used when output is saved to a file
+FORMAT_EXTENSIONS = {
+    'array': 'json',
+    'json': 'json',
+    'ndjson': 'ndjson',
+    'xml': 'xml',
+    'html': 'html',
+    'csv': 'csv'
+}
+
+# Outputs larger than this (in MB) are saved to a file instead of the clipboard
+DEFAULT_CLIPBOARD_LIMIT = 5
+
+CSV_FIELDS = ['url', 'filename', 's3_path', 'size', 'last_modified', 'type']
+
+def _folder_name(objects):
+    """Top-level folder of the first object, used as the output's title."""
+    return objects[0]['s3_path'].split('/')[0] if objects else ""
+
+def _escape_xml(text):
+    """Escape text for an XML text node."""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+def write_output(urls, objects, output_format, out):
+    """
+    Write URLs and object metadata to a text file object in the specified format.
+    
+    Objects can be metadata dicts or ObjectRecords; records are only
+    expanded into their fields here, as each one is written.
+    
+    Args:
+        urls (list): List of URLs
+        objects (list): List of objects with metadata (dicts or ObjectRecords)
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
+        out: Writable text file object
+    """
+    write_functions = {
+        'array': write_array,
+        'json': write_json,
+        'ndjson': write_ndjson,
+        'xml': write_xml,
+        'html': write_html,
+        'csv': write_csv
+    }
+    
+    # Use the appropriate writer or default to array
+    writer = write_functions.get(output_format, write_array)
+    writer(urls, objects, out)
+
 def format_output(urls, objects, output_format):
     """
     Format URLs and object metadata according to the specified format.
     
     Args:
         urls (list): List of URLs
-        objects (list): List of objects with metadata
-        output_format (str): Format for output: 'array', 'json', 'xml', 'html', or 'csv'
+        objects (list): List of objects with metadata (dicts or ObjectRecords)
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
         
     Returns:
         str: Formatted output string
     """
-    format_functions = {
-        'array': format_array,
-        'json': format_json,
-        'xml': format_xml,
-        'html': format_html,
-        'csv': format_csv
-    }
-    
-    # Use the appropriate formatter or default to array
-    formatter = format_functions.get(output_format, format_array)
-    return formatter(urls, objects)
+    out = io.StringIO()
+    write_output(urls, objects, output_format, out)
+    return out.getvalue()
 
-def format_array(urls, objects):
+def write_array(urls, objects, out):
     """
-    Format URLs as a JSON array.
+    Write URLs as a JSON array.
     
     Args:
         urls (list): List of URLs
         objects (list): List of objects with metadata (not used)
-        
-    Returns:
-        str: JSON array of URLs
+        out: Writable text file object
     """
-    return "[" + ", ".join([f'"{url}"' for url in urls]) + "]"
+    out.write("[")
+    for i, url in enumerate(urls):
+        out.write(f'"{url}"' if i == 0 else f', "{url}"')
+    out.write("]")
 
-def format_json(urls, objects):
+def write_json(urls, objects, out):
     """
-    Format objects as a JSON object with metadata.
+    Write objects as a JSON object with metadata, one file entry at a time.
     
     Args:
         urls (list): List of URLs (not used)
         objects (list): List of objects with metadata
-        
-    Returns:
-        str: JSON formatted metadata
+        out: Writable text file object
     """
-    return json.dumps({
-        "folder": objects[0]['s3_path'].split('/')[0] if objects else "",
-        "count": len(objects),
-        "timestamp": datetime.now().isoformat(),
-        "files": objects
-    }, indent=2)
+    out.write("{\n")
+    out.write(f'  "folder": {json.dumps(_folder_name(objects))},\n')
+    out.write(f'  "count": {len(objects)},\n')
+    out.write(f'  "timestamp": {json.dumps(datetime.now().isoformat())},\n')
+    
+    if not objects:
+        out.write('  "files": []\n}')
+        return
+    
+    out.write('  "files": [\n')
+    for i, obj in enumerate(objects):
+        if i:
+            out.write(",\n")
+        entry = json.dumps(dict(obj), indent=2)
+        out.write("    " + entry.replace("\n", "\n    "))
+    out.write("\n  ]\n}")
 
-def format_xml(urls, objects):
+def write_ndjson(urls, objects, out):
     """
-    Format objects as an XML document.
+    Write objects as newline-delimited JSON, one object per line.
     
     Args:
         urls (list): List of URLs (not used)
         objects (list): List of objects with metadata
-        
-    Returns:
-        str: XML formatted metadata
+        out: Writable text file object
     """
-    doc = xml.dom.minidom.getDOMImplementation().createDocument(None, "files", None)
-    root = doc.documentElement
-    
-    # Add metadata
-    folder_elem = doc.createElement("folder")
-    folder_elem.appendChild(doc.createTextNode(objects[0]['s3_path'].split('/')[0] if objects else ""))
-    root.appendChild(folder_elem)
-    
-    count_elem = doc.createElement("count")
-    count_elem.appendChild(doc.createTextNode(str(len(objects))))
-    root.appendChild(count_elem)
+    for obj in objects:
+        out.write(json.dumps(dict(obj)) + "\n")
+
+def write_xml(urls, objects, out):
+    """
+    Write objects as an XML document, one file element at a time.
     
-    timestamp_elem = doc.createElement("timestamp")
-    timestamp_elem.appendChild(doc.createTextNode(datetime.now().isoformat()))
-    root.appendChild(timestamp_elem)
+    Args:
+        urls (list): List of URLs (not used)
+        objects (list): List of objects with metadata
+        out: Writable text file object
+    """
+    out.write('<?xml version="1.0" ?>\n<files>\n')
+    out.write(f"  <folder>{_escape_xml(_folder_name(objects))}</folder>\n")
+    out.write(f"  <count>{len(objects)}</count>\n")
+    out.write(f"  <timestamp>{datetime.now().isoformat()}</timestamp>\n")
     
-    # Add files
-    files_elem = doc.createElement("items")
-    root.appendChild(files_elem)
+    if not objects:
+        out.write("  <items/>\n</files>\n")
+        return
     
+    out.write("  <items>\n")
     for obj in objects:
-        file_elem = doc.createElement("file")
-        
+        out.write("    <file>\n")
         for key, value in obj.items():
-            elem = doc.createElement(key)
-            elem.appendChild(doc.createTextNode(str(value)))
-            file_elem.appendChild(elem)
-        
-        files_elem.appendChild(file_elem)
-    
-    return doc.toprettyxml(indent="  ")
+            out.write(f"      <{key}>{_escape_xml(str(value))}</{key}>\n")
+        out.write("    </file>\n")
+    out.write("  </items>\n</files>\n")
 
-def format_html(urls, objects):
+def write_html(urls, objects, out):
     """
-    Format objects as an HTML document with links.
+    Write objects as an HTML document with links.
     
     Args:
         urls (list): List of URLs (not used)
         objects (list): List of objects with metadata
-        
-    Returns:
-        str: HTML document with links
+        out: Writable text file object
     """
-    html = "<html>\n<head>\n  <title>File Links</title>\n</head>\n<body>\n"
-    html += f"  <h1>Files in {objects[0]['s3_path'].split('/')[0] if objects else ''}</h1>\n"
-    html += "  <p>Generated on " + datetime.now().isoformat() + "</p>\n"
-    html += "  <ul>\n"
+    out.write("<html>\n<head>\n  <title>File Links</title>\n</head>\n<body>\n")
+    out.write(f"  <h1>Files in {_folder_name(objects)}</h1>\n")
+    out.write("  <p>Generated on " + datetime.now().isoformat() + "</p>\n")
+    out.write("  <ul>\n")
     
     for obj in objects:
-        html += f'    <li><a href="{obj["url"]}" target="_blank">{obj["filename"]}</a> ({obj["size"]} bytes)</li>\n'
+        out.write(f'    <li><a href="{obj["url"]}" target="_blank">{obj["filename"]}</a> ({obj["size"]} bytes)</li>\n')
     
-    html += "  </ul>\n</body>\n</html>"
-    return html
+    out.write("  </ul>\n</body>\n</html>")
 
-def format_csv(urls, objects):
+def write_csv(urls, objects, out):
     """
-    Format objects as a CSV document.
+    Write objects as a CSV document.
     
     Args:
         urls (list): List of URLs (not used)
         objects (list): List of objects with metadata
+        out: Writable text file object
+    """
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(CSV_FIELDS)
+    for obj in objects:
+        writer.writerow([obj[field] for field in CSV_FIELDS])
+
+def format_array(urls, objects):
+    """Format URLs as a JSON array (see write_array)."""
+    return format_output(urls, objects, 'array')
+
+def format_json(urls, objects):
+    """Format objects as a JSON object with metadata (see write_json)."""
+    return format_output(urls, objects, 'json')
+
+def format_ndjson(urls, objects):
+    """Format objects as newline-delimited JSON (see write_ndjson)."""
+    return format_output(urls, objects, 'ndjson')
+
+def format_xml(urls, objects):
+    """Format objects as an XML document (see write_xml)."""
+    return format_output(urls, objects, 'xml')
+
+def format_html(urls, objects):
+    """Format objects as an HTML document with links (see write_html)."""
+    return format_output(urls, objects, 'html')
+
+def format_csv(urls, objects):
+    """Format objects as a CSV document (see write_csv)."""
+    return format_output(urls, objects, 'csv')
+
+def get_clipboard_limit():
+    """Get the largest output (in bytes) that is copied to the clipboard."""
+    try:
+        return int(float(load_config().get('clipboard_limit', DEFAULT_CLIPBOARD_LIMIT)) * 1024 * 1024)
+    except (TypeError, ValueError):
+        return DEFAULT_CLIPBOARD_LIMIT * 1024 * 1024
+
+class _ClipboardBuffer:
+    """
+    Collects output for the clipboard, moving it to a file once it grows past a limit.
+    """
+    def __init__(self, limit, fallback_path):
+        self.limit = limit
+        self.fallback_path = fallback_path
+        self.buffer = io.StringIO()
+        self.size = 0
+        self.file = None
+    
+    def write(self, text):
+        if self.file is None:
+            self.size += len(text)
+            if self.size <= self.limit:
+                return self.buffer.write(text)
+            # Too big for the clipboard: continue in the file
+            self.file = open(self.fallback_path, 'w', encoding='utf-8', newline='')
+            self.file.write(self.buffer.getvalue())
+            self.buffer = None
+        return self.file.write(text)
+
+def write_results(urls, objects, output_format, destination=None, name='s3u'):
+    """
+    Write formatted results to a file, stdout or the clipboard.
+    
+    Output is streamed as it is formatted. Clipboard output that grows past
+    the 'clipboard_limit' setting is saved to a file in the current directory
+    instead, since large clipboards are slow and often truncated.
+    
+    Args:
+        urls (list): List of URLs
+        objects (list): List of objects with metadata (dicts or ObjectRecords)
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
+        destination (str or file): File path, '-' for stdout, an open text file, or None for the clipboard
+        name (str): Base name for the file used when output is too large for the clipboard
         
     Returns:
-        str: CSV formatted metadata
+        str: Where the output went: 'clipboard', 'stdout' or the file path
     """
-    csv = "url,filename,s3_path,size,last_modified,type\n"
+    if destination == '-':
+        destination = sys.stdout
     
-    for obj in objects:
-        csv += f"{obj['url']},{obj['filename']},{obj['s3_path']},{obj['size']},{obj['last_modified']},{obj['type']}\n"
+    if hasattr(destination, 'write'):
+        write_output(urls, objects, output_format, destination)
+        destination.flush()
+        return 'stdout' if destination in (sys.stdout, sys.__stdout__) else getattr(destination, 'name', 'file')
     
-    return csv
\ No newline at end of file
+    if destination:
+        with open(destination, 'w', encoding='utf-8', newline='') as out:
+            write_output(urls, objects, output_format, out)
+        return destination
+    
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    safe_name = name.strip('/').replace('/', '_') or 's3u'
+    fallback_path = os.path.abspath(f"{safe_name}-{timestamp}.{FORMAT_EXTENSIONS.get(output_format, 'txt')}")
+    
+    out = _ClipboardBuffer(get_clipboard_limit(), fallback_path)
+    write_output(urls, objects, output_format, out)
+    if out.file is not None:
+        out.file.close()
+        return fallback_path
+    
+    pyperclip.copy(out.buffer.getvalue())
+    return 'clipboard'
+
+def describe_results(location, description, destination=None):
+    """
+    Describe where write_results put the output, for printing.
+    
+    Args:
+        location (str): Value returned by write_results
+        description (str): What was written, e.g. "json of 20 URLs"
+        destination: The destination that was passed to write_results
+        
+    Returns:
+        str: Message for the user, or None when the output went to stdout
+    """
+    if location == 'clipboard':
+        return f"Copied {description} to clipboard"
+    if location == 'stdout':
+        return None
+    if destination is None:
+        return f"Output too large for the clipboard; saved {description} to {location}"
+    return f"Saved {description} to {location}"
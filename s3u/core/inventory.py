@@ -0,0 +1,338 @@
+"""
+S3 Inventory reports as a listing source.
+
+Listing a bucket with tens of millions of objects takes tens of thousands
+of list_objects_v2 requests. S3 Inventory delivers the same listing as
+daily (or weekly) report files instead. When the 'inventory' setting (or
+--inventory) names where the reports are, the local listing index is
+loaded from the newest report rather than from S3, and every listing that
+goes through the index (folder lists, browsing, search, du, downloads and
+mirroring) uses it.
+
+The source is the report location in the destination bucket
+(s3://bucket/prefix/source-bucket/config-id/), or a local directory that
+holds the reports (or a manifest.json file) for working offline. CSV
+reports are read in streamed chunks; Parquet reports need pyarrow. A
+report is only loaded again once a newer manifest appears, so listings lag
+S3 by up to a report interval, apart from s3u's own uploads and deletes.
+"""
+
+import os
+import csv
+import json
+import time
+import zlib
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus
+
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+from .s3_core import get_bucket_name
+from ..config import load_config
+
+# Objects added to the index at a time while loading a report
+LOAD_BATCH_SIZE = 10000
+
+# Bytes read at a time from report files
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Columns of CSV reports when the manifest doesn't list them
+DEFAULT_CSV_SCHEMA = 'Bucket, Key, Size, LastModifiedDate, ETag'
+
+# Source given on the command line, used instead of the config setting
+_source_override = None
+
+def set_inventory_source(source):
+    """
+    Use an inventory source for this run instead of the 'inventory' setting.
+    
+    Args:
+        source (str): s3:// location or local path of the reports (None to use the setting)
+    """
+    global _source_override
+    _source_override = source
+
+def get_inventory_source():
+    """
+    Get the configured inventory source.
+    
+    Returns:
+        str: s3:// location or local path of the reports, or None if listings come from S3
+    """
+    return _source_override or load_config().get('inventory', '') or None
+
+def _split_s3_url(url):
+    """Split s3://bucket/prefix into (bucket, prefix)."""
+    bucket, _, prefix = url[len('s3://'):].partition('/')
+    return bucket, prefix
+
+def _parse_manifest(text, location):
+    """Read a manifest.json, adding where it was found."""
+    manifest = json.loads(text)
+    manifest['location'] = location
+    return manifest
+
+async def find_manifest(s3, source):
+    """
+    Find the newest inventory manifest for the configured bucket.
+    
+    Args:
+        s3: S3 client (used for s3:// sources)
+        source (str): s3:// location, local directory or local manifest.json
+        
+    Returns:
+        dict: The manifest, with 'location' set to where it was read from
+        
+    Raises:
+        ValueError: If no manifest for the bucket is found
+    """
+    bucket = get_bucket_name()
+    
+    if source.startswith('s3://'):
+        source_bucket, prefix = _split_s3_url(source)
+        paginator = s3.get_paginator('list_objects_v2')
+        # Manifests are in folders named after the report time, so the last key is the newest
+        newest = None
+        async for page in paginator.paginate(Bucket=source_bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('/manifest.json') and (newest is None or obj['Key'] > newest):
+                    newest = obj['Key']
+        if newest is None:
+            raise ValueError(f"No inventory manifest.json found under {source}")
+        
+        response = await s3.get_object(Bucket=source_bucket, Key=newest)
+        body = response['Body']
+        try:
+            text = await body.read()
+        finally:
+            body.close()
+        return _parse_manifest(text, f"s3://{source_bucket}/{newest}")
+    
+    if os.path.isfile(source):
+        with open(source, encoding='utf-8') as f:
+            return _parse_manifest(f.read(), os.path.abspath(source))
+    
+    if not os.path.isdir(source):
+        raise ValueError(f"Inventory source not found: {source}")
+    
+    manifests = []
+    for root, _, files in os.walk(source):
+        if 'manifest.json' in files:
+            path = os.path.join(root, 'manifest.json')
+            with open(path, encoding='utf-8') as f:
+                manifest = _parse_manifest(f.read(), os.path.abspath(path))
+            if not bucket or manifest.get('sourceBucket') in (None, bucket):
+                manifests.append(manifest)
+    if not manifests:
+        raise ValueError(f"No inventory manifest.json for bucket {bucket} found in {source}")
+    return max(manifests, key=lambda manifest: int(manifest.get('creationTimestamp', 0)))
+
+def manifest_id(manifest):
+    """Identify a report, to tell whether it was loaded already."""
+    return f"{manifest['location']}@{manifest.get('creationTimestamp', '')}"
+
+def _local_data_path(manifest, source, key):
+    """
+    Find a report file of a local inventory.
+    
+    Report files are looked for at their key under the source directory (a
+    copy of the destination bucket), in the report configuration's data
+    folder next to the manifest's folder, and next to the manifest.
+    """
+    manifest_dir = os.path.dirname(manifest['location'])
+    name = os.path.basename(key)
+    candidates = [
+        os.path.join(os.path.dirname(manifest_dir), 'data', name),
+        os.path.join(manifest_dir, name)
+    ]
+    if os.path.isdir(source):
+        candidates.insert(0, os.path.join(source, key))
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    raise ValueError(f"Inventory file not found: {key} (looked in {', '.join(candidates)})")
+
+async def _iter_file_chunks(s3, manifest, source, key):
+    """Yield the bytes of a report file in chunks, from S3 or the local copy."""
+    if manifest['location'].startswith('s3://'):
+        bucket = manifest.get('destinationBucket', '').split(':::')[-1] or \
+            _split_s3_url(manifest['location'])[0]
+        response = await s3.get_object(Bucket=bucket, Key=key)
+        body = response['Body']
+        try:
+            while True:
+                chunk = await body.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+        return
+    
+    with open(_local_data_path(manifest, source, key), 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+async def _iter_lines(chunks, compressed=True):
+    """Yield the text lines of a (gzipped) file from its chunks, holding one chunk at a time."""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16) if compressed else None
+    pending = b''
+    async for chunk in chunks:
+        if decompressor is not None:
+            data = decompressor.decompress(chunk)
+            # Concatenated gzip members each need a new decompressor
+            while decompressor.unused_data:
+                rest = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                data += decompressor.decompress(rest)
+            chunk = data
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8')
+    if decompressor is not None:
+        pending += decompressor.flush()
+    if pending:
+        yield pending.decode('utf-8')
+
+def _parse_timestamp(value):
+    """Parse an inventory LastModifiedDate such as 2024-01-02T03:04:05.000Z."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+async def _iter_csv_objects(s3, manifest, source, key, prefix):
+    """Yield the current objects under a prefix from a CSV report file."""
+    fields = [field.strip() for field in (manifest.get('fileSchema') or DEFAULT_CSV_SCHEMA).split(',')]
+    column = {field: i for i, field in enumerate(fields)}
+    compressed = key.endswith('.gz')
+    
+    async for line in _iter_lines(_iter_file_chunks(s3, manifest, source, key), compressed):
+        if not line:
+            continue
+        row = next(csv.reader([line]))
+        # Keys in CSV reports are URL-encoded
+        object_key = unquote_plus(row[column['Key']])
+        if not object_key.startswith(prefix):
+            continue
+        # Only the current version of each object is listed
+        if 'IsLatest' in column and row[column['IsLatest']] == 'false':
+            continue
+        if 'IsDeleteMarker' in column and row[column['IsDeleteMarker']] == 'true':
+            continue
+        yield {
+            'Key': object_key,
+            'Size': int(row[column['Size']] or 0) if 'Size' in column else 0,
+            'ETag': row[column['ETag']] if 'ETag' in column else None,
+            'LastModified': _parse_timestamp(row[column['LastModifiedDate']]) if 'LastModifiedDate' in column else None
+        }
+
+async def _iter_parquet_objects(s3, manifest, source, key, prefix):
+    """Yield the current objects under a prefix from a Parquet report file."""
+    if not PARQUET_AVAILABLE:
+        raise ValueError("Reading Parquet inventory reports requires pyarrow (pip install pyarrow)")
+    
+    temp_file = None
+    if manifest['location'].startswith('s3://'):
+        # Parquet is read by column chunks, so S3 report files are downloaded first
+        temp_file = tempfile.NamedTemporaryFile(suffix='.parquet', delete=False)
+        with temp_file:
+            async for chunk in _iter_file_chunks(s3, manifest, source, key):
+                temp_file.write(chunk)
+        path = temp_file.name
+    else:
+        path = _local_data_path(manifest, source, key)
+    
+    try:
+        parquet_file = pq.ParquetFile(path)
+        available = set(parquet_file.schema_arrow.names)
+        columns = [name for name in ('key', 'size', 'last_modified_date', 'e_tag', 'is_latest', 'is_delete_marker')
+                   if name in available]
+        for batch in parquet_file.iter_batches(batch_size=LOAD_BATCH_SIZE, columns=columns):
+            for row in batch.to_pylist():
+                if not row['key'].startswith(prefix) or row.get('is_latest') is False or row.get('is_delete_marker'):
+                    continue
+                modified = row.get('last_modified_date')
+                if modified is not None and modified.tzinfo is None:
+                    modified = modified.replace(tzinfo=timezone.utc)
+                yield {
+                    'Key': row['key'],
+                    'Size': row.get('size') or 0,
+                    'ETag': row.get('e_tag'),
+                    'LastModified': modified
+                }
+    finally:
+        if temp_file is not None:
+            os.unlink(temp_file.name)
+
+async def iter_inventory_pages(s3, manifest, source, prefix=''):
+    """
+    Yield the objects under a prefix from an inventory report, a batch at a time.
+    
+    Report files are read one after another in streamed chunks, so memory
+    stays bounded however large the report is. Objects are not in key order.
+    
+    Args:
+        s3: S3 client (used for reports in S3)
+        manifest (dict): Manifest returned by find_manifest
+        source (str): The inventory source the manifest was found in
+        prefix (str): Only yield keys starting with this prefix
+        
+    Yields:
+        list: Entries shaped like list_objects_v2 results (Key, Size, ETag, LastModified)
+    """
+    file_format = manifest.get('fileFormat', 'CSV').upper()
+    if file_format == 'CSV':
+        iter_objects = _iter_csv_objects
+    elif file_format == 'PARQUET':
+        iter_objects = _iter_parquet_objects
+    else:
+        raise ValueError(f"Unsupported inventory format: {file_format} (use CSV or Parquet)")
+    
+    batch = []
+    for data_file in manifest.get('files', []):
+        async for obj in iter_objects(s3, manifest, source, data_file['key'], prefix):
+            batch.append(obj)
+            if len(batch) >= LOAD_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+async def load_inventory(s3, index, source, prefix=''):
+    """
+    Answer a refresh of the listing index from the newest inventory report.
+    
+    The whole report is loaded into the index when it is newer than the one
+    loaded last; otherwise the prefix is just marked as checked.
+    
+    Args:
+        s3: S3 client
+        index (BucketIndex): The index to load
+        source (str): s3:// location or local path of the reports
+        prefix (str): Prefix being refreshed
+    """
+    started = time.time()
+    manifest = await find_manifest(s3, source)
+    report = manifest_id(manifest)
+    if index.get_inventory() == report:
+        index.finish_refresh(prefix, started)
+        return
+    
+    print(f"Loading inventory report {manifest['location']}...")
+    count = 0
+    index.start_refresh('')
+    async for batch in iter_inventory_pages(s3, manifest, source):
+        index.add_objects(batch)
+        count += len(batch)
+    index.finish_refresh('', started)
+    index.set_inventory(report)
+    print(f"Loaded {count} objects from the inventory report")
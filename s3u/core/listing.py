@@ -0,0 +1,228 @@
+"""
+Parallel listing of large prefixes.
+
+list_objects_v2 returns at most 1000 keys per request, and each page needs
+the previous page's continuation token, so listing a big prefix is a long
+chain of round trips. Here the key space is split into ranges that are
+listed concurrently (each starts after a key with StartAfter and ends at
+the next range's first boundary), and the pages are yielded back in key
+order.
+
+Every listing starts as one range. When a range's page comes back full,
+the rest of the range is split at the next characters of its keys, so big
+ranges keep splitting until their parts are small, and parts that turn out
+to be empty only cost one request.
+"""
+
+import asyncio
+
+from .s3_core import get_bucket_name, MAX_LIST_KEYS
+
+# Listing requests in flight at once
+LIST_CONCURRENCY = 16
+
+# Parts the rest of a full range is split into
+SPLIT_FANOUT = 8
+
+# Pages listed ahead of the range being consumed
+MAX_BUFFERED_PAGES = 64
+
+# Characters range boundaries are placed at. Keys tend to continue with the
+# same kind of character (numbered files stay numbered), so boundaries use
+# the kind of character the keys have where they are split
+CHAR_CLASSES = ('0123456789', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def _common_length(a, b):
+    """Length of the common prefix of two strings."""
+    return next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+
+def _boundaries(low, high, depth):
+    """
+    Boundary keys that follow low's first depth characters with a larger character.
+    
+    Args:
+        low (str): The range starts after this key
+        high (str): The range ends at this key (inclusive), or None for the end of the prefix
+        depth (int): Number of characters of low the boundaries share
+        
+    Returns:
+        list: Up to SPLIT_FANOUT - 1 boundary keys, evenly spread over the candidates
+    """
+    stem = low[:depth]
+    low_char = low[depth]
+    high_char = high[depth] if high is not None and high.startswith(stem) and len(high) > depth else None
+    chars = next((group for group in CHAR_CLASSES if low_char in group), '')
+    candidates = [c for c in chars if c > low_char and (high_char is None or c < high_char)]
+    if len(candidates) > SPLIT_FANOUT - 1:
+        candidates = [candidates[i * len(candidates) // (SPLIT_FANOUT - 1)] for i in range(SPLIT_FANOUT - 1)]
+    return [stem + c for c in candidates]
+
+def split_points(low, high, prefix, sample=None):
+    """
+    Pick keys that divide a range of the key space into parts.
+    
+    The keys of the page just listed hint where the rest of the range is:
+    boundaries are placed as deep as the sample key and low still share a
+    prefix, using characters like the ones the keys have there (so
+    'img_00999' splits at 'img_01', 'img_02', ...), and move towards the
+    first character where the range's ends differ if none fit. A range
+    that can't be split is listed on with its continuation token.
+    
+    Args:
+        low (str): The range starts after this key
+        high (str): The range ends at this key (inclusive), or None for the end of the prefix
+        prefix (str): Prefix every key starts with
+        sample (str): Optional key from the page that ended at low
+        
+    Returns:
+        list: Boundary keys in increasing order, strictly between low and high (empty if the range can't be split)
+    """
+    top = len(prefix) if high is None else _common_length(low, high)
+    if top >= len(low):
+        return []
+    
+    deepest = min(_common_length(sample, low), len(low) - 1) if sample else top
+    best = []
+    for depth in range(deepest, top - 1, -1):
+        points = _boundaries(low, high, depth)
+        if len(points) >= SPLIT_FANOUT // 2:
+            return points
+        if len(points) > len(best):
+            best = points
+    return best
+
+class _KeyRange:
+    """
+    A part of the key space: the keys after low, up to and including high.
+    """
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self.pages = asyncio.Queue()
+        self.children = []
+
+class _KeyspaceLister:
+    """
+    Lists the ranges of one prefix concurrently and yields their pages in order.
+    
+    Ranges ahead of the one being consumed stop listing once MAX_BUFFERED_PAGES
+    pages are waiting; the range being consumed can always continue.
+    """
+    def __init__(self, s3, prefix, concurrency):
+        self.s3 = s3
+        self.prefix = prefix
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.condition = asyncio.Condition()
+        self.buffered = 0
+        self.current = None
+        self.tasks = set()
+    
+    def start(self, key_range):
+        """Start listing a range in the background."""
+        task = asyncio.ensure_future(self.list_range(key_range))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+    
+    async def reserve(self, key_range):
+        """Wait until a range may list another page."""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.buffered < MAX_BUFFERED_PAGES or key_range is self.current)
+            self.buffered += 1
+    
+    async def release(self, current=None):
+        """Free a consumed page's place in the buffer, or move on to the next range."""
+        async with self.condition:
+            if current is None:
+                self.buffered -= 1
+            else:
+                self.current = current
+            self.condition.notify_all()
+    
+    async def list_range(self, key_range):
+        """List a range, splitting the rest of it into child ranges when a page comes back full."""
+        params = {'Bucket': get_bucket_name(), 'Prefix': self.prefix, 'MaxKeys': MAX_LIST_KEYS}
+        if key_range.low is not None:
+            params['StartAfter'] = key_range.low
+        
+        try:
+            while True:
+                await self.reserve(key_range)
+                async with self.semaphore:
+                    page = await self.s3.list_objects_v2(**params)
+                
+                contents = page.get('Contents', [])
+                if key_range.high is not None:
+                    within = [obj for obj in contents if obj['Key'] <= key_range.high]
+                else:
+                    within = contents
+                key_range.pages.put_nowait(within)
+                if len(within) < len(contents) or not page.get('IsTruncated'):
+                    break
+                
+                last_key = contents[-1]['Key']
+                points = split_points(last_key, key_range.high, self.prefix, contents[len(contents) // 2]['Key'])
+                if points:
+                    bounds = [last_key] + points + [key_range.high]
+                    key_range.children = [_KeyRange(low, high) for low, high in zip(bounds, bounds[1:])]
+                    for child in key_range.children:
+                        self.start(child)
+                    break
+                params['ContinuationToken'] = page['NextContinuationToken']
+        except Exception as e:
+            key_range.pages.put_nowait(e)
+        key_range.pages.put_nowait(None)
+    
+    async def iter_pages(self):
+        """Yield the pages of every range in key order."""
+        root = _KeyRange(None, None)
+        self.start(root)
+        pending = [root]
+        
+        try:
+            while pending:
+                key_range = pending.pop()
+                await self.release(current=key_range)
+                while True:
+                    page = await key_range.pages.get()
+                    if page is None:
+                        break
+                    if isinstance(page, Exception):
+                        raise page
+                    await self.release()
+                    if page:
+                        yield page
+                pending.extend(reversed(key_range.children))
+        finally:
+            for task in list(self.tasks):
+                task.cancel()
+
+async def iter_prefix_pages(s3, prefix, page_size=None, delimiter=None):
+    """
+    Yield the objects under a prefix one listing page at a time, in key order.
+    
+    Listings of everything under a prefix are split across concurrent
+    requests. Listings with a page size (used when the caller stops early)
+    or a delimiter follow a single continuation chain.
+    
+    Args:
+        s3: S3 client
+        prefix (str): Prefix to list
+        page_size (int): Optional number of keys per request; listed serially when given
+        delimiter (str): Optional delimiter; listed serially when given
+        
+    Yields:
+        list: list_objects_v2 'Contents' entries for each page
+    """
+    if page_size is None and delimiter is None:
+        async for contents in _KeyspaceLister(s3, prefix, LIST_CONCURRENCY).iter_pages():
+            yield contents
+        return
+    
+    params = {'Bucket': get_bucket_name(), 'Prefix': prefix}
+    if delimiter:
+        params['Delimiter'] = delimiter
+    if page_size:
+        params['PaginationConfig'] = {'PageSize': page_size}
+    paginator = s3.get_paginator('list_objects_v2')
+    async for page in paginator.paginate(**params):
+        yield page.get('Contents', [])
@@ -0,0 +1,183 @@
+"""
+Manifest-driven uploads.
+
+A manifest is a CSV or JSONL file listing the files to upload, one row per
+file, so large ingests can skip the directory walk and renaming steps.
+"""
+
+import os
+import csv
+import json
+
+from .s3_core import get_s3_session, get_s3_client, format_s3_path
+from .uploader import upload_items, copy_upload_results
+from .sharded import upload_items_sharded
+from .folder_manifest import is_folder_manifest_enabled, update_folder_manifests
+
+# Accepted column names for each manifest field
+SOURCE_COLUMNS = ('source', 'path', 'local_path', 'file')
+KEY_COLUMNS = ('key', 's3_key', 'target')
+CONTENT_TYPE_COLUMNS = ('content_type', 'content-type')
+CACHE_CONTROL_COLUMNS = ('cache_control', 'cache-control')
+
+# CSV columns starting with this prefix are sent as user metadata
+METADATA_PREFIX = 'meta_'
+
+def _first_value(row, columns):
+    """Return the first non-empty value in a row for any of the given columns."""
+    for column in columns:
+        value = row.get(column)
+        if value not in (None, ''):
+            return value
+    return None
+
+def parse_manifest_row(row, base_dir='.', s3_folder=None):
+    """
+    Convert a manifest row into an upload item.
+
+    Args:
+        row (dict): The manifest row
+        base_dir (str): Directory that relative source paths are resolved against
+        s3_folder (str): Optional folder that target keys are placed under
+
+    Returns:
+        tuple: (file_path, s3_key, extra_args), or None if the row has no source
+    """
+    source = _first_value(row, SOURCE_COLUMNS)
+    if not source:
+        return None
+
+    file_path = source if os.path.isabs(source) else os.path.join(base_dir, source)
+
+    # Default the key to the file name when the row doesn't set one
+    key = _first_value(row, KEY_COLUMNS) or os.path.basename(source)
+    s3_key = format_s3_path(s3_folder, key.lstrip('/'))
+
+    extra_args = {}
+    content_type = _first_value(row, CONTENT_TYPE_COLUMNS)
+    if content_type:
+        extra_args['ContentType'] = content_type
+    cache_control = _first_value(row, CACHE_CONTROL_COLUMNS)
+    if cache_control:
+        extra_args['CacheControl'] = cache_control
+
+    # JSONL rows may carry a metadata object, CSV rows use meta_* columns
+    metadata = row.get('metadata') if isinstance(row.get('metadata'), dict) else {}
+    metadata = {str(k): str(v) for k, v in metadata.items()}
+    for column, value in row.items():
+        if column and column.startswith(METADATA_PREFIX) and value not in (None, ''):
+            metadata[column[len(METADATA_PREFIX):]] = str(value)
+    if metadata:
+        extra_args['Metadata'] = metadata
+
+    return file_path, s3_key, extra_args
+
+def _iter_jsonl_rows(f):
+    """Yield (line number, row) for the non-blank lines of a JSONL file, with None for unparseable lines."""
+    for line_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+def iter_manifest(manifest_path, s3_folder=None, base_dir=None):
+    """
+    Stream upload items from a CSV or JSONL manifest one row at a time.
+
+    Rows that can't be used are reported with their file and line and skipped.
+
+    Args:
+        manifest_path (str): Path to a .csv, .jsonl or .ndjson manifest
+        s3_folder (str): Optional folder that target keys are placed under
+        base_dir (str): Directory for relative source paths (defaults to the manifest's directory)
+
+    Yields:
+        tuple: (file_path, s3_key, extra_args) for each usable row
+    """
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    is_jsonl = manifest_path.lower().endswith(('.jsonl', '.ndjson'))
+
+    with open(manifest_path, 'r', newline='', encoding='utf-8') as f:
+        if is_jsonl:
+            rows = _iter_jsonl_rows(f)
+        else:
+            reader = csv.DictReader(f)
+            rows = ((reader.line_num, row) for row in reader)
+
+        for line_number, row in rows:
+            item = None
+            if isinstance(row, dict):
+                try:
+                    item = parse_manifest_row(row, base_dir, s3_folder)
+                except (TypeError, AttributeError, ValueError):
+                    # Values of the wrong type, e.g. a number as the source path
+                    row = None
+            if not isinstance(row, dict):
+                print(f"Skipping {manifest_path}:{line_number}: invalid manifest row")
+                continue
+            if item is None:
+                print(f"Skipping {manifest_path}:{line_number}: no source path")
+                continue
+            yield item
+
+async def upload_manifest(manifest_path, s3_folder=None, max_concurrent=10, output_format='array',
+                          only_first=False, base_dir=None, processes=1, output_file=None):
+    """
+    Upload every file listed in a manifest, streaming rows into the upload engine.
+
+    Args:
+        manifest_path (str): Path to a .csv, .jsonl or .ndjson manifest
+        s3_folder (str): Optional folder that target keys are placed under
+        max_concurrent (int): Maximum concurrent uploads
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
+        only_first (bool): Only copy the first URL to clipboard
+        base_dir (str): Directory for relative source paths (defaults to the manifest's directory)
+        processes (int): Number of worker processes to shard uploads across (max_concurrent each)
+        output_file (str or file): Optional file path or '-' for stdout to write the results to instead of the clipboard
+
+    Returns:
+        list: List of CloudFront URLs for uploaded files
+    """
+    if not os.path.isfile(manifest_path):
+        print(f"Error: Manifest not found: {manifest_path}")
+        return []
+
+    session = get_s3_session()
+
+    print(f"Uploading files listed in manifest: {manifest_path}")
+    items = iter_manifest(manifest_path, s3_folder, base_dir)
+    # Only the successful uploads' metadata is kept for the output
+    uploaded = []
+
+    def on_result(index, result):
+        success, data = result
+        if success and data:
+            uploaded.append((index, data))
+
+    if processes and processes > 1:
+        total = await upload_items_sharded(items, processes, max_concurrent, on_result=on_result)
+    else:
+        total = await upload_items(session, items, max_concurrent, on_result=on_result)
+    uploaded_objects = [data for index, data in sorted(uploaded, key=lambda pair: pair[0])]
+
+    uploaded_urls = [data['url'] for data in uploaded_objects]
+
+    print(f"\nCompleted {len(uploaded_urls)} of {total} uploads")
+
+    # Rows can target any folder, so only the target folder's manifest is rewritten
+    if is_folder_manifest_enabled() and uploaded_objects:
+        try:
+            async with get_s3_client(session) as s3:
+                await update_folder_manifests(s3, s3_folder,
+                                              {os.path.dirname(data['key']) for data in uploaded_objects},
+                                              changed_keys=[data['key'] for data in uploaded_objects])
+        except Exception as e:
+            print(f"Error updating folder manifests: {str(e)}")
+
+    copy_upload_results(uploaded_urls, uploaded_objects, output_format, only_first, output_file)
+
+    return uploaded_urls
@@ -0,0 +1,539 @@
+"""
+Mirror mode: make an S3 folder match a local folder, or the other way round.
+
+Both trees are streamed in S3 key order (S3 lists keys sorted, and the
+local tree is walked in the same order) and merged in a single linear
+pass, so neither side is ever held in memory. Each difference becomes an
+action (new, changed or deleted) that is handed to the upload or download
+engine while the merge is still running.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import itertools
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError, NoCredentialsError
+
+from .s3_core import get_s3_session, get_s3_client, get_bucket_name
+from .uploader import upload_items
+from .downloader import iter_folder_pages, fetch_object
+from .download_state import (
+    DownloadIndex, FileCommitter, INDEX_FILENAME, PART_SUFFIX, normalize_etag, is_md5_etag, file_md5,
+    NON_MD5_ENCRYPTION
+)
+from .filters import parse_filter
+from .bucket_index import record_deletes
+from .folder_manifest import MANIFEST_NAME, MAX_PATCHED_KEYS, is_folder_manifest_enabled, update_folder_manifests
+from ..utils.progress import ProgressBar, TransferProgress, format_bytes
+
+# 'up' makes the S3 folder match the local folder, 'down' the local folder match S3
+MIRROR_DIRECTIONS = ('up', 'down')
+
+# Symbols used when printing a plan
+ACTION_SYMBOLS = {'new': '+', 'changed': '~', 'deleted': '-'}
+
+# Local files read per step of the scan (in a worker thread)
+SCAN_BATCH_SIZE = 1000
+
+# Batches each side of the merge may read ahead of it
+READ_AHEAD_BATCHES = 2
+
+# Keys per DeleteObjects request (the S3 maximum)
+DELETE_BATCH_SIZE = 1000
+
+# Seconds modification times may differ by before a file counts as changed
+MTIME_TOLERANCE = 2.0
+
+def _is_internal_file(name):
+    """Check if a file is download bookkeeping (index, partial data) or a folder manifest, which are never mirrored."""
+    return name.startswith(INDEX_FILENAME) or PART_SUFFIX in name or name == MANIFEST_NAME
+
+def iter_local_files(local_dir):
+    """
+    Walk a local tree in S3 key order.
+    
+    Directories are sorted as 'name/', so 'a-b.jpg' comes before 'a/c.jpg'
+    just as it does in an S3 listing. Unreadable directories raise an error
+    rather than being skipped, since a missing subtree would look deleted.
+    
+    Args:
+        local_dir (str): Directory to walk
+        
+    Yields:
+        tuple: (relative key, size, mtime) for each file
+    """
+    def walk(directory, prefix):
+        entries = []
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                if entry.is_dir(follow_symlinks=False):
+                    entries.append((entry.name + '/', entry))
+                elif not _is_internal_file(entry.name):
+                    entries.append((entry.name, entry))
+        entries.sort(key=lambda item: item[0])
+        
+        for name, entry in entries:
+            if name.endswith('/'):
+                yield from walk(entry.path, prefix + name)
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                # Removed while we were scanning
+                continue
+            yield prefix + name, stat.st_size, stat.st_mtime
+    
+    return walk(local_dir, '')
+
+async def _local_batches(local_dir, object_filter=None):
+    """Scan a local tree in a worker thread, yielding filtered batches of files."""
+    loop = asyncio.get_running_loop()
+    files = iter_local_files(local_dir) if os.path.isdir(local_dir) else iter(())
+    while True:
+        batch = await loop.run_in_executor(None, list, itertools.islice(files, SCAN_BATCH_SIZE))
+        if not batch:
+            return
+        if object_filter:
+            batch = [item for item in batch
+                     if object_filter.matches(item[0], item[1], datetime.fromtimestamp(item[2], timezone.utc))]
+        if batch:
+            yield batch
+
+async def _remote_batches(s3, folder_prefix, object_filter=None):
+    """List a folder, yielding batches of (relative key, size, etag, last_modified)."""
+    async for page in iter_folder_pages(s3, folder_prefix):
+        # Folder markers aren't files; the filter sees the same relative keys as the local side
+        batch = [(key[len(folder_prefix):], size, etag, last_modified)
+                 for key, size, etag, last_modified in page
+                 if not key.endswith('/') and
+                 (object_filter is None or object_filter.matches(key[len(folder_prefix):], size, last_modified))]
+        if batch:
+            yield batch
+
+async def _read_ahead(batches):
+    """
+    Run a batch iterator in the background and yield its items one by one.
+    
+    This lets the local scan and the S3 listing make progress at the same
+    time instead of taking turns in the merge.
+    """
+    queue = asyncio.Queue(maxsize=READ_AHEAD_BATCHES)
+    
+    async def pump():
+        try:
+            async for batch in batches:
+                await queue.put(batch)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(None)
+    
+    task = asyncio.ensure_future(pump())
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            for item in batch:
+                yield item
+    finally:
+        task.cancel()
+
+async def _next(iterator):
+    """Return the next item of an async iterator, or None when it is exhausted."""
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return None
+
+def _local_path(local_dir, rel_key):
+    """Map a relative key to a path under local_dir."""
+    return os.path.join(local_dir, *rel_key.split('/'))
+
+def is_changed(direction, local_path, local, remote, index=None, checksum=False):
+    """
+    Decide whether a file present on both sides needs to be transferred.
+    
+    Files of different sizes always differ. Otherwise, with checksum set,
+    objects with a plain MD5 ETag are compared by content (this reads the
+    file, so call it from a worker thread); objects the download index
+    recorded as encrypted with SSE-KMS or SSE-C are compared as without
+    checksum, since their ETags aren't MD5s. Without it, an upload is needed
+    when the local file was modified after the object was uploaded, and a
+    download when the download index recorded a different ETag or the
+    object was modified after the local file.
+    
+    Args:
+        direction (str): 'up' or 'down'
+        local_path (str): Local file path
+        local (tuple): (relative key, size, mtime)
+        remote (tuple): (relative key, size, etag, last_modified)
+        index (DownloadIndex): Optional index of earlier downloads into the local folder
+        checksum (bool): Compare MD5 checksums instead of modification times
+        
+    Returns:
+        bool: True if the file should be transferred
+    """
+    rel_key, local_size, local_mtime = local
+    _, remote_size, etag, last_modified = remote
+    if local_size != remote_size:
+        return True
+    
+    entry = index.entries.get(rel_key) if index else None
+    if checksum and is_md5_etag(etag) and (not entry or entry.get('md5', True)):
+        return file_md5(local_path) != normalize_etag(etag)
+    
+    remote_mtime = last_modified.timestamp() if last_modified else 0
+    if direction == 'up':
+        return local_mtime > remote_mtime + MTIME_TOLERANCE
+    
+    if entry and entry.get('size') == local_size and entry.get('mtime') == local_mtime:
+        return entry.get('etag') != normalize_etag(etag)
+    return remote_mtime > local_mtime + MTIME_TOLERANCE
+
+async def bucket_etags_are_md5(s3):
+    """
+    Check if the bucket's default encryption leaves ETags as MD5 checksums.
+    
+    Objects written under an SSE-KMS default have ETags that aren't their
+    MD5, and listings don't say how each object is encrypted.
+    
+    Args:
+        s3: S3 client
+        
+    Returns:
+        bool: False if the bucket encrypts new objects with KMS keys by default
+    """
+    try:
+        response = await s3.get_bucket_encryption(Bucket=get_bucket_name())
+    except ClientError:
+        # No default encryption configured, or no permission to read it
+        return True
+    rules = response.get('ServerSideEncryptionConfiguration', {}).get('Rules', [])
+    return not any(rule.get('ApplyServerSideEncryptionByDefault', {}).get('SSEAlgorithm') in NON_MD5_ENCRYPTION
+                   for rule in rules)
+
+async def diff_trees(s3, local_dir, folder_prefix, direction='up', object_filter=None, index=None, checksum=False):
+    """
+    Merge a local tree and an S3 listing into the actions that make the destination match the source.
+    
+    Args:
+        s3: S3 client
+        local_dir (str): Local directory
+        folder_prefix (str): S3 prefix, with a trailing slash
+        direction (str): 'up' (S3 follows the local folder) or 'down' (the local folder follows S3)
+        object_filter (ObjectFilter): Optional filter; files that don't match are ignored on both sides
+        index (DownloadIndex): Optional index of earlier downloads into the local folder
+        checksum (bool): Compare MD5 checksums instead of modification times
+        
+    Yields:
+        tuple: (action, relative key, local entry, remote entry), where action is 'new' or
+               'changed' for files to transfer and 'deleted' for files only in the destination.
+               Entries are as yielded by the local scan and the listing, or None.
+    """
+    loop = asyncio.get_running_loop()
+    if checksum and not await bucket_etags_are_md5(s3):
+        print("The bucket encrypts objects with KMS keys, so their ETags aren't checksums; "
+              "comparing modification times instead")
+        checksum = False
+    
+    local_files = _read_ahead(_local_batches(local_dir, object_filter))
+    remote_files = _read_ahead(_remote_batches(s3, folder_prefix, object_filter))
+    
+    try:
+        local = await _next(local_files)
+        remote = await _next(remote_files)
+        while local or remote:
+            if remote is None or (local and local[0] < remote[0]):
+                yield ('new' if direction == 'up' else 'deleted'), local[0], local, None
+                local = await _next(local_files)
+            elif local is None or remote[0] < local[0]:
+                yield ('new' if direction == 'down' else 'deleted'), remote[0], None, remote
+                remote = await _next(remote_files)
+            else:
+                local_path = _local_path(local_dir, local[0])
+                if checksum:
+                    changed = await loop.run_in_executor(None, is_changed, direction, local_path, local, remote,
+                                                         index, True)
+                else:
+                    changed = is_changed(direction, local_path, local, remote, index)
+                if changed:
+                    yield 'changed', local[0], local, remote
+                local = await _next(local_files)
+                remote = await _next(remote_files)
+    finally:
+        await local_files.aclose()
+        await remote_files.aclose()
+
+def _entry_size(local, remote, direction):
+    """Bytes an action transfers: the size of the source copy."""
+    source = local if direction == 'up' else remote
+    return source[1] if source else 0
+
+def _remove_local(local_dir, rel_key, index):
+    """Delete a local file, forget it in the index and remove directories left empty."""
+    path = _local_path(local_dir, rel_key)
+    os.remove(path)
+    index.forget(rel_key)
+    
+    root = os.path.abspath(local_dir)
+    directory = os.path.dirname(os.path.abspath(path))
+    while directory != root and directory.startswith(root):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+async def mirror_folder(local_dir, s3_folder, direction='up', delete=False, dry_run=False, max_concurrent=10,
+                        object_filter=None, checksum=False):
+    """
+    Make an S3 folder match a local folder (up) or a local folder match an S3 folder (down).
+    
+    Only new and changed files are transferred. Files that exist only in
+    the destination are deleted when delete is set, and left alone otherwise.
+    
+    Args:
+        local_dir (str): Local directory
+        s3_folder (str): The folder name in the S3 bucket
+        direction (str): 'up' to upload local changes, 'down' to download remote changes
+        delete (bool): Delete files that exist only in the destination
+        dry_run (bool): Print the plan and the bytes it would transfer without changing anything
+        max_concurrent (int): Maximum concurrent transfers
+        object_filter (str or ObjectFilter): Optional filter expression; files that don't match
+                                             are neither transferred nor deleted
+        checksum (bool): Compare files by MD5 checksum instead of modification time
+        
+    Returns:
+        dict: Counts of 'new', 'changed', 'deleted', 'kept' (destination-only files not deleted)
+              and 'failed' files, and the 'bytes' transferred (or to transfer, for a dry run)
+    """
+    object_filter = parse_filter(object_filter)
+    summary = {'new': 0, 'changed': 0, 'deleted': 0, 'kept': 0, 'failed': 0, 'bytes': 0}
+    
+    if direction not in MIRROR_DIRECTIONS:
+        print(f"Error: Unknown mirror direction: {direction} (use 'up' or 'down')")
+        return summary
+    if direction == 'up' and not os.path.isdir(local_dir):
+        print(f"Error: Path does not exist or is not a directory: {local_dir}")
+        return summary
+    
+    s3_folder = s3_folder.strip('/')
+    folder_prefix = f"{s3_folder}/"
+    source, destination = (local_dir, f"s3://{get_bucket_name()}/{folder_prefix}") if direction == 'up' \
+        else (f"s3://{get_bucket_name()}/{folder_prefix}", local_dir)
+    
+    session = get_s3_session()
+    index = DownloadIndex(local_dir) if direction == 'down' else None
+    
+    try:
+        async with get_s3_client(session, max_concurrent * 2) as s3:
+            actions = diff_trees(s3, local_dir, folder_prefix, direction, object_filter, index, checksum)
+            
+            print(f"Comparing {source} with {destination}" + (" (dry run)" if dry_run else ""))
+            if dry_run:
+                async for action, rel_key, local, remote in actions:
+                    if action == 'deleted' and not delete:
+                        summary['kept'] += 1
+                        continue
+                    summary[action] += 1
+                    size = _entry_size(local, remote, direction)
+                    if action != 'deleted':
+                        summary['bytes'] += size
+                    print(f"{ACTION_SYMBOLS[action]} {rel_key} ({format_bytes(size)})")
+            elif direction == 'up':
+                changed_folders = set()
+                changed_keys = []
+                await _mirror_up(session, s3, actions, local_dir, folder_prefix, delete, max_concurrent, summary,
+                                 changed_folders, changed_keys)
+                if changed_folders and is_folder_manifest_enabled():
+                    # Too many changes to patch into the manifest: the folder is listed instead
+                    await update_folder_manifests(s3, s3_folder, changed_folders,
+                                                  changed_keys=changed_keys if len(changed_keys) <= MAX_PATCHED_KEYS
+                                                  else None)
+            else:
+                os.makedirs(local_dir, exist_ok=True)
+                try:
+                    await _mirror_down(s3, actions, local_dir, folder_prefix, delete, max_concurrent, index, summary)
+                finally:
+                    index.save()
+    except NoCredentialsError:
+        print("Credentials not available")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\nError mirroring {source} to {destination}: {str(e)}")
+        return summary
+    
+    transfer = 'upload' if direction == 'up' else 'download'
+    if dry_run:
+        print(f"\nPlan: {summary['new']} new, {summary['changed']} changed, {summary['deleted']} to delete; "
+              f"{format_bytes(summary['bytes'])} to {transfer}")
+    else:
+        print(f"\nMirrored {source} to {destination}: {summary['new']} new, {summary['changed']} changed, "
+              f"{summary['deleted']} deleted ({format_bytes(summary['bytes'])} {transfer}ed)")
+        if summary['failed']:
+            print(f"{summary['failed']} files failed")
+    if summary['kept']:
+        print(f"{summary['kept']} files only in the destination were kept (use --delete to remove them)")
+    return summary
+
+async def _mirror_up(session, s3, actions, local_dir, folder_prefix, delete, max_concurrent, summary,
+                     changed_folders=None, changed_keys=None):
+    """
+    Upload new and changed files and batch-delete remote-only objects, noting the folders changed.
+    
+    Up to MAX_PATCHED_KEYS + 1 of the keys written or deleted are noted in changed_keys.
+    """
+    def note_change(key):
+        if changed_folders is not None:
+            changed_folders.add(os.path.dirname(key))
+        if changed_keys is not None and len(changed_keys) <= MAX_PATCHED_KEYS:
+            changed_keys.append(key)
+    
+    progress = None
+    pending_deletes = []
+    delete_tasks = []
+    sizes = {}
+    
+    async def delete_keys(keys):
+        response = await s3.delete_objects(Bucket=get_bucket_name(),
+                                           Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+        errors = response.get('Errors', [])
+        for error in errors:
+            print(f"\nError deleting {error.get('Key')}: {error.get('Message')}")
+        failed_keys = {error.get('Key') for error in errors}
+        record_deletes([key for key in keys if key not in failed_keys])
+        summary['deleted'] += len(keys) - len(errors)
+        summary['failed'] += len(errors)
+    
+    async def items():
+        nonlocal progress
+        count = 0
+        async for action, rel_key, local, remote in actions:
+            if action == 'deleted':
+                if not delete:
+                    summary['kept'] += 1
+                    continue
+                pending_deletes.append(folder_prefix + rel_key)
+                note_change(folder_prefix + rel_key)
+                if len(pending_deletes) >= DELETE_BATCH_SIZE:
+                    delete_tasks.append(asyncio.ensure_future(delete_keys(pending_deletes[:])))
+                    pending_deletes.clear()
+                continue
+            
+            if progress is None:
+                progress = ProgressBar(0, prefix='Mirroring:', suffix='Complete', growing=True)
+            progress.add_total(1)
+            sizes[count] = (action, local[1])
+            count += 1
+            note_change(folder_prefix + rel_key)
+            yield _local_path(local_dir, rel_key), folder_prefix + rel_key, None
+    
+    def on_result(index, result):
+        action, size = sizes.pop(index)
+        if result[0]:
+            summary[action] += 1
+            summary['bytes'] += size
+        else:
+            summary['failed'] += 1
+        progress.update(1)
+    
+    try:
+        await upload_items(session, items(), max_concurrent, s3=s3, on_result=on_result, show_progress=False)
+        if pending_deletes:
+            delete_tasks.append(asyncio.ensure_future(delete_keys(pending_deletes)))
+        await asyncio.gather(*delete_tasks)
+    finally:
+        for task in delete_tasks:
+            task.cancel()
+        if progress:
+            progress.add_total(0, done=True)
+
+async def _mirror_down(s3, actions, local_dir, folder_prefix, delete, max_concurrent, index, summary):
+    """Download new and changed files and delete local-only files as the diff streams in."""
+    loop = asyncio.get_running_loop()
+    committer = FileCommitter()
+    range_semaphore = asyncio.Semaphore(max_concurrent)
+    download_queue = asyncio.Queue(maxsize=max_concurrent * 2)
+    created_dirs = set()
+    progress = None
+    
+    async def download(action, rel_key, remote):
+        _, size, etag, last_modified = remote
+        local_path = _local_path(local_dir, rel_key)
+        directory = os.path.dirname(local_path)
+        if directory not in created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            created_dirs.add(directory)
+        
+        def on_complete(md5):
+            # Counted once the file is in place, which for batched commits is after fetch_object returns
+            summary[action] += 1
+            summary['bytes'] += size
+            if last_modified:
+                # Keep S3's time so later mirrors in either direction see the copies as equal
+                timestamp = last_modified.timestamp()
+                os.utime(local_path, (timestamp, timestamp))
+            index.record(rel_key, local_path, etag, md5)
+        
+        received = 0
+        started = time.monotonic()
+        
+        def on_bytes(nbytes):
+            nonlocal received
+            received += nbytes
+            progress.add_bytes(nbytes)
+        
+        try:
+            await fetch_object(s3, folder_prefix + rel_key, local_path, size, etag, max_concurrent, range_semaphore,
+                               committer=committer, on_complete=on_complete, on_bytes=on_bytes)
+            progress.finish_file(rel_key, size, received, time.monotonic() - started)
+        except Exception as e:
+            print(f"\nError downloading {rel_key}: {str(e)}")
+            summary['failed'] += 1
+            progress.finish_file(rel_key, size, received, time.monotonic() - started, success=False)
+    
+    async def worker():
+        while True:
+            item = await download_queue.get()
+            if item is None:
+                return
+            await download(*item)
+    
+    workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrent)]
+    try:
+        async for action, rel_key, local, remote in actions:
+            if action == 'deleted':
+                if not delete:
+                    summary['kept'] += 1
+                    continue
+                try:
+                    await loop.run_in_executor(None, _remove_local, local_dir, rel_key, index)
+                    summary['deleted'] += 1
+                except OSError as e:
+                    print(f"\nError deleting {rel_key}: {str(e)}")
+                    summary['failed'] += 1
+                continue
+            
+            if progress is None:
+                progress = TransferProgress(prefix='Mirroring:', suffix='Complete', growing=True)
+            progress.add_total(1, nbytes=remote[1])
+            await download_queue.put((action, rel_key, remote))
+        
+        for _ in workers:
+            await download_queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        summary['failed'] += len(await committer.close())
+        if progress:
+            progress.add_total(0, done=True)
+            if progress.transferred:
+                progress.print_summary()
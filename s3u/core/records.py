@@ -0,0 +1,109 @@
+"""
+Compact records for listed objects.
+"""
+
+import os
+from datetime import datetime
+from collections.abc import Mapping
+
+class ObjectRecord(Mapping):
+    """
+    One listed object, stored compactly.
+    
+    Only the key, size and modification time are kept (plus references to
+    the listing's shared base URL and folder prefix); the URL, filename,
+    type and subfolder are derived when they are read. Records can be read
+    like the metadata dicts listings used to return (record['url']), and
+    dict(record) gives a plain dict for output.
+    """
+    __slots__ = ('key', 'size', 'modified', 'base_url', 'folder_prefix')
+    
+    FIELDS = ('url', 'filename', 's3_path', 'size', 'last_modified', 'type')
+    
+    def __init__(self, key, size, modified, base_url, folder_prefix=None):
+        """
+        Create a record.
+        
+        Args:
+            key (str): S3 object key
+            size (int): Object size in bytes
+            modified (datetime): Last modification time
+            base_url (str): CloudFront URL the key is appended to
+            folder_prefix (str): Folder prefix of a recursive listing, to report the subfolder relative to
+        """
+        self.key = key
+        self.size = size
+        self.modified = modified
+        self.base_url = base_url
+        self.folder_prefix = folder_prefix
+    
+    @classmethod
+    def from_listing(cls, obj, base_url, folder_prefix=None):
+        """
+        Create a record from a list_objects_v2 entry.
+        
+        Args:
+            obj (dict): Listing entry with Key, Size and LastModified
+            base_url (str): CloudFront URL the key is appended to
+            folder_prefix (str): Folder prefix of a recursive listing (None to leave out the subfolder)
+            
+        Returns:
+            ObjectRecord: The record
+        """
+        return cls(obj['Key'], obj['Size'], obj['LastModified'], base_url, folder_prefix)
+    
+    @classmethod
+    def from_upload(cls, data, base_url):
+        """
+        Create a record from an upload result (see upload_fileobj).
+        
+        Args:
+            data (dict): Upload result with key, size and timestamp
+            base_url (str): CloudFront URL the key is appended to
+            
+        Returns:
+            ObjectRecord: The record
+        """
+        return cls(data['key'], data['size'], datetime.fromisoformat(data['timestamp']), base_url)
+    
+    @property
+    def url(self):
+        return f"{self.base_url}/{self.key}"
+    
+    @property
+    def filename(self):
+        return os.path.basename(self.key)
+    
+    @property
+    def s3_path(self):
+        return self.key
+    
+    @property
+    def last_modified(self):
+        return self.modified.isoformat() if self.modified else ''
+    
+    @property
+    def type(self):
+        return os.path.splitext(self.key)[1].lstrip('.').lower() if '.' in self.key else ''
+    
+    @property
+    def subfolder(self):
+        relative = self.key[len(self.folder_prefix):]
+        return os.path.dirname(relative) if '/' in relative else ''
+    
+    def keys(self):
+        return self.FIELDS + ('subfolder',) if self.folder_prefix is not None else self.FIELDS
+    
+    def __getitem__(self, name):
+        if name not in self.keys():
+            raise KeyError(name)
+        return getattr(self, name)
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    def __len__(self):
+        return len(self.keys())
+    
+    def __repr__(self):
+        return f"ObjectRecord({self.key!r}, {self.size})"
@@ -5,11 +5,15 @@ Core S3 operations for the s3u utility.
 import os
 import sys
 import aioboto3
+from aiobotocore.config import AioConfig
 from botocore.exceptions import NoCredentialsError
 
 # Import config functions
 from ..config import load_config
 
+# Most keys a single ListObjectsV2 request can return
+MAX_LIST_KEYS = 1000
+
 def get_s3_session():
     """
     Create and return an aioboto3 session with profile from config.
@@ -21,6 +25,43 @@ def get_s3_session():
     profile_name = config.get("aws_profile", "")
     return aioboto3.Session(profile_name=profile_name if profile_name else None)
 
+def get_s3_client(session, max_pool_connections=None):
+    """
+    Create an S3 client context manager sized for concurrent use.
+    
+    A single client can be shared by many concurrent transfers, but its
+    connection pool defaults to 10 connections, so callers running more
+    transfers than that should pass their concurrency here.
+    
+    Args:
+        session (aioboto3.Session): The boto3 session
+        max_pool_connections (int, optional): Size of the connection pool
+        
+    Returns:
+        An async context manager yielding an S3 client
+    """
+    if max_pool_connections and max_pool_connections > 10:
+        return session.client('s3', config=AioConfig(max_pool_connections=max_pool_connections))
+    return session.client('s3')
+
+def get_list_page_size(limit=None):
+    """
+    Get the page size for a listing that needs at most limit objects.
+    
+    S3 returns keys in lexicographic order, so the first limit keys arrive
+    on the first pages. Asking for just that many (plus one for the folder
+    marker) lets a small preview of a huge folder finish in one request.
+    
+    Args:
+        limit (int): Optional number of objects needed
+        
+    Returns:
+        int: Value for PaginationConfig's PageSize (the request's MaxKeys)
+    """
+    if limit and limit > 0:
+        return min(MAX_LIST_KEYS, limit + 1)
+    return MAX_LIST_KEYS
+
 def get_bucket_name():
     """
     Get the configured bucket name.
@@ -98,6 +139,9 @@ async def ensure_s3_folder_exists(session, s3_folder):
     async with session.client('s3') as s3:
         try:
             await s3.put_object(Bucket=bucket_name, Key=(s3_folder + '/'))
+            # Imported here since the index module builds on this one
+            from .bucket_index import record_upload
+            record_upload(s3_folder + '/', 0)
             print(f"Ensured S3 folder exists: s3://{bucket_name}/{s3_folder}/")
             return True
         except NoCredentialsError:
@@ -0,0 +1,138 @@
+"""
+Search the keys of the whole bucket.
+
+Queries are answered from the local listing index (see bucket_index.py)
+and its trigram index of the keys, so a search takes milliseconds instead
+of listing folder after folder. The index lists the whole bucket the first
+time and is refreshed once its listing is older than 'index_max_age'; s3u's
+own uploads and deletes update it in between when 'use_index' is on.
+"""
+
+import os
+import re
+import sys
+import fnmatch
+from botocore.exceptions import NoCredentialsError
+
+from .s3_core import get_s3_session, get_s3_client, get_cloudfront_url
+from .formatter import write_results, describe_results
+from .filters import parse_filter
+from .listing import LIST_CONCURRENCY
+from .records import ObjectRecord
+from .bucket_index import get_fresh_index, get_index_path
+from .folder_manifest import is_manifest_key
+
+# Characters that make a query a glob pattern
+GLOB_CHARS = '*?['
+
+# Matches printed before the rest are summarized
+MAX_PRINTED_MATCHES = 20
+
+def compile_query(query):
+    """
+    Turn a search query into index lookup terms and a key test.
+    
+    Plain queries match keys containing them. Queries with *, ? or [...]
+    are glob patterns, matched against the filename, or against the whole
+    key if the pattern contains a '/'. Matching ignores case.
+    
+    Args:
+        query (str): Substring or glob pattern, e.g. 'hero_banner' or 'hero_*.jpg'
+        
+    Returns:
+        tuple: (terms the keys must contain, function taking a key and returning whether it matches)
+    """
+    query = query.lower()
+    if not any(c in query for c in GLOB_CHARS):
+        return [query], lambda key: query in key.lower()
+    
+    pattern = re.compile(fnmatch.translate(query))
+    whole_key = '/' in query
+    
+    def matches(key):
+        return pattern.match((key if whole_key else os.path.basename(key)).lower()) is not None
+    
+    # The literal parts of the pattern appear in every matching key
+    terms = [part for part in re.split(r'\*|\?|\[[^\]]*\]', query) if part]
+    return terms, matches
+
+async def search_objects(query, limit=None, object_filter=None, refresh=False):
+    """
+    Find the objects in the bucket whose keys match a query.
+    
+    Args:
+        query (str): Substring or glob pattern (see compile_query)
+        limit (int): Optional maximum number of results
+        object_filter (str or ObjectFilter): Optional filter expression (see filters.py)
+        refresh (bool): Refresh the index from S3 even if it's still fresh
+        
+    Returns:
+        list: ObjectRecords of the matching objects in key order, or None if the index can't be opened
+    """
+    object_filter = parse_filter(object_filter)
+    terms, matches = compile_query(query)
+    limit = limit if limit and limit > 0 else None
+    
+    async with get_s3_client(get_s3_session(), LIST_CONCURRENCY) as s3:
+        index = await get_fresh_index(s3, '', refresh, required=True)
+    if index is None:
+        return None
+    
+    base_url = get_cloudfront_url()
+    records = []
+    for obj in index.iter_candidates(terms):
+        if obj['Key'].endswith('/') or is_manifest_key(obj['Key']) or not matches(obj['Key']):
+            continue
+        if object_filter is None or object_filter(obj):
+            records.append(ObjectRecord.from_listing(obj, base_url))
+            if limit and len(records) >= limit:
+                break
+    return records
+
+async def search_bucket(query, limit=None, output_format='array', object_filter=None, refresh=False,
+                        output_file=None):
+    """
+    Search the bucket, print the matching keys and copy their URLs to the clipboard.
+    
+    Args:
+        query (str): Substring or glob pattern (see compile_query)
+        limit (int): Optional maximum number of results
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
+        object_filter (str or ObjectFilter): Optional filter expression (see filters.py)
+        refresh (bool): Refresh the index from S3 even if it's still fresh
+        output_file (str or file): Optional file path, '-' for stdout or open text file to write the output to
+                                   instead of the clipboard
+        
+    Returns:
+        list: List of CloudFront URLs, or ObjectRecords with metadata for the matching objects
+    """
+    try:
+        records = await search_objects(query, limit, object_filter, refresh)
+    except NoCredentialsError:
+        print("Credentials not available")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error searching for {query}: {str(e)}")
+        return []
+    
+    if records is None:
+        print(f"Error: Could not open the search index {get_index_path()}")
+        return []
+    
+    if not records:
+        print(f"No objects found matching: {query}")
+        return []
+    
+    print(f"Found {len(records)} objects matching: {query}")
+    for record in records[:MAX_PRINTED_MATCHES]:
+        print(f"  {record.key}")
+    if len(records) > MAX_PRINTED_MATCHES:
+        print(f"  ... and {len(records) - MAX_PRINTED_MATCHES} more")
+    
+    urls = [record.url for record in records]
+    location = write_results(urls, records, output_format, output_file, 'search')
+    message = describe_results(location, f"{output_format} of {len(records)} URLs", output_file)
+    if message:
+        print(f"\n{message}")
+    
+    return urls if output_format == 'array' else records
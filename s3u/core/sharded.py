@@ -0,0 +1,185 @@
+"""
+Multi-process upload engine for hosts with many cores.
+
+A single event loop becomes CPU-bound on request signing, hashing and
+response parsing at high concurrency. This engine runs several worker
+processes, each with its own event loop and S3 client pool, that pull
+upload items from a shared queue and stream their results back to the
+parent over pipes.
+"""
+
+import os
+import queue
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+
+from .s3_core import get_s3_session
+from ..utils.progress import ProgressBar
+
+# Seconds to wait on a full task queue before checking that workers are still alive
+QUEUE_PUT_TIMEOUT = 1.0
+
+def default_process_count():
+    """Return the default number of upload processes for this host."""
+    return os.cpu_count() or 1
+
+def _worker_main(task_queue, conn, max_concurrent):
+    """
+    Entry point of a worker process: upload items from the task queue until told to stop.
+
+    Args:
+        task_queue: Shared multiprocessing queue of (index, item) entries, None to stop
+        conn: Pipe connection used to send results back to the parent
+        max_concurrent (int): Maximum concurrent uploads in this process
+    """
+    # Imported here because the uploader imports this module
+    from .uploader import upload_items
+    
+    async def run():
+        loop = asyncio.get_running_loop()
+        session = get_s3_session()
+        # Map this worker's item positions back to the parent's indexes
+        parent_indexes = {}
+
+        async def items():
+            local_index = 0
+            while True:
+                entry = await loop.run_in_executor(None, task_queue.get)
+                if entry is None:
+                    return
+                index, item = entry
+                parent_indexes[local_index] = index
+                local_index += 1
+                yield item
+
+        def send_result(local_index, result):
+            conn.send(('result', parent_indexes.pop(local_index), result))
+
+        await upload_items(session, items(), max_concurrent, on_result=send_result, show_progress=False)
+
+    try:
+        asyncio.run(run())
+        conn.send(('done', None, None))
+    except Exception as e:
+        conn.send(('error', None, str(e)))
+    finally:
+        conn.close()
+
+async def upload_items_sharded(items, processes=None, max_concurrent=10, on_result=None):
+    """
+    Upload items across several worker processes.
+
+    Only local file paths can be sharded; open file objects cannot be sent
+    to another process. With on_result set, results are handed to it as
+    they arrive and not kept, as in upload_items.
+
+    Args:
+        items: Iterable or async iterable of (file_path, s3_key, extra_args) tuples
+        processes (int): Number of worker processes (defaults to the CPU count)
+        max_concurrent (int): Maximum concurrent uploads in each worker process
+        on_result (callable): Optional function called with (index, result) as each upload finishes
+
+    Returns:
+        list: (success, data) results in the same order as the items, or the number of items
+              when on_result is given
+    """
+    processes = max(1, processes or default_process_count())
+    loop = asyncio.get_running_loop()
+
+    # Spawn avoids forking a process that already has a running event loop
+    context = multiprocessing.get_context('spawn')
+    task_queue = context.Queue(maxsize=processes * max_concurrent * 2)
+
+    workers = []
+    connections = []
+    for _ in range(processes):
+        reader, writer = context.Pipe(duplex=False)
+        worker = context.Process(target=_worker_main, args=(task_queue, writer, max_concurrent), daemon=True)
+        worker.start()
+        writer.close()
+        workers.append(worker)
+        connections.append(reader)
+
+    print(f"Uploading with {processes} processes x {max_concurrent} concurrent uploads")
+    total = len(items) if hasattr(items, '__len__') else None
+    progress = ProgressBar(total, prefix='Uploading:', suffix='Complete') if total else None
+
+    results = {}
+    # Indexes submitted but not yet reported, so items lost with a crashed worker still fail
+    pending = set()
+    submitted = 0
+
+    def report(index, result):
+        pending.discard(index)
+        if on_result:
+            on_result(index, result)
+        else:
+            results[index] = result
+
+    def put(entry):
+        # Don't block forever if every worker has died
+        while True:
+            try:
+                task_queue.put(entry, timeout=QUEUE_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                if not any(worker.is_alive() for worker in workers):
+                    return False
+
+    async def submit():
+        nonlocal submitted
+        if hasattr(items, '__aiter__'):
+            async for item in items:
+                pending.add(submitted)
+                if not await loop.run_in_executor(None, put, (submitted, item)):
+                    pending.discard(submitted)
+                    return
+                submitted += 1
+        else:
+            for item in items:
+                pending.add(submitted)
+                if not await loop.run_in_executor(None, put, (submitted, item)):
+                    pending.discard(submitted)
+                    return
+                submitted += 1
+        for _ in workers:
+            await loop.run_in_executor(None, put, None)
+
+    async def collect():
+        open_connections = list(connections)
+        while open_connections:
+            ready = await loop.run_in_executor(None, multiprocessing.connection.wait, open_connections)
+            for conn in ready:
+                try:
+                    kind, index, payload = conn.recv()
+                except EOFError:
+                    open_connections.remove(conn)
+                    continue
+
+                if kind == 'result':
+                    report(index, payload)
+                    if progress:
+                        progress.update(1)
+                elif kind == 'error':
+                    print(f"\nUpload worker failed: {payload}")
+                    open_connections.remove(conn)
+                else:
+                    open_connections.remove(conn)
+
+    try:
+        await asyncio.gather(submit(), collect())
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        for conn in connections:
+            conn.close()
+
+    # Items lost with a crashed worker count as failures
+    for index in sorted(pending):
+        report(index, (False, None))
+    if on_result:
+        return submitted
+    return [results[index] for index in range(submitted)]
@@ -4,107 +4,58 @@ File upload functionality for S3.
 
 import os
 import sys
+import csv
 import asyncio
 import pyperclip
 from datetime import datetime
 from botocore.exceptions import NoCredentialsError
 
-from .s3_core import get_s3_session, get_bucket_name, get_cloudfront_url, ensure_s3_folder_exists
-from .formatter import format_output
+from .s3_core import (get_s3_session, get_s3_client, get_bucket_name, get_cloudfront_url,
+                      ensure_s3_folder_exists, format_s3_path)
+from .formatter import write_results, describe_results
+from .archive import is_archive, iter_archive_items
+from .sharded import upload_items_sharded
+from .records import ObjectRecord
+from .bucket_index import record_upload
+from .folder_manifest import is_folder_manifest_enabled, update_folder_manifests
 
-# Remove the circular import between browser.py and uploader.py
-# This function will be used to get existing files
+# Define common extension groups for easy selection
+EXTENSION_GROUPS = {
+    "images": ["jpg", "jpeg", "png", "gif", "webp", "svg"],
+    "videos": ["mp4", "mov", "avi", "webm", "mkv"],
+    "documents": ["pdf", "doc", "docx", "txt", "md"],
+}
 
-async def list_s3_folder_objects_internal(s3_folder, return_urls_only=False, limit=None, output_format='array', recursive=False):
+async def list_s3_folder_objects_internal(s3_folder, return_urls_only=False, limit=None, output_format='array', recursive=False,
+                                          refresh=False):
     """
-    List objects in an S3 folder and return their CloudFront URLs.
-    This is an internal version to avoid circular imports.
-    For full functionality, use the version in browser.py.
+    List objects in an S3 folder without printing or copying anything.
+    Used to add the existing files to upload results.
     
     Args:
         s3_folder (str): The folder name in the S3 bucket to list
-        return_urls_only (bool): If True, just return the URLs without printing or clipboard copy
+        return_urls_only (bool): If True, just return the URLs
         limit (int): Optional limit on the number of URLs to return
-        output_format (str): Format for output: 'array', 'json', 'xml', 'html', or 'csv'
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
         recursive (bool): Whether to list objects recursively including subfolders
+        refresh (bool): Refresh the local listing index first (if it's turned on)
         
     Returns:
-        list: List of CloudFront URLs or objects with metadata for items in the folder
+        list: List of CloudFront URLs, or ObjectRecords with metadata for items in the folder
     """
-    session = get_s3_session()
-    urls = []
-    objects = []
+    # Imported here since browser.py imports this module (through filters.py)
+    from .browser import iter_objects
     
     try:
-        async with session.client('s3') as s3:
-            paginator = s3.get_paginator('list_objects_v2')
-            
-            # Add trailing slash if not present to ensure we're listing folder contents
-            folder_prefix = s3_folder if s3_folder.endswith('/') else f"{s3_folder}/"
-            
-            if recursive:
-                # List all objects recursively (no delimiter)
-                async for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=folder_prefix):
-                    if 'Contents' in page:
-                        for obj in page['Contents']:
-                            # Skip the folder itself and any subfolder markers
-                            if obj['Key'] != folder_prefix and not obj['Key'].endswith('/'):
-                                url = f"{get_cloudfront_url()}/{obj['Key']}"
-                                urls.append(url)
-                                
-                                # Collect metadata for formats that need it
-                                if output_format != 'array':
-                                    obj_meta = {
-                                        'url': url,
-                                        'filename': os.path.basename(obj['Key']),
-                                        's3_path': obj['Key'],
-                                        'size': obj['Size'],
-                                        'last_modified': obj['LastModified'].isoformat(),
-                                        'type': os.path.splitext(obj['Key'])[1].lstrip('.').lower() if '.' in obj['Key'] else '',
-                                        'subfolder': os.path.dirname(obj['Key'].replace(folder_prefix, '')) if '/' in obj['Key'].replace(folder_prefix, '') else ''
-                                    }
-                                    objects.append(obj_meta)
-            else:
-                # List only objects in the specific folder (using delimiter)
-                async for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=folder_prefix, Delimiter='/'):
-                    if 'Contents' in page:
-                        for obj in page['Contents']:
-                            # Skip the folder itself (which appears as a key)
-                            if obj['Key'] != folder_prefix:
-                                url = f"{get_cloudfront_url()}/{obj['Key']}"
-                                urls.append(url)
-                                
-                                # Collect metadata for formats that need it
-                                if output_format != 'array':
-                                    obj_meta = {
-                                        'url': url,
-                                        'filename': os.path.basename(obj['Key']),
-                                        's3_path': obj['Key'],
-                                        'size': obj['Size'],
-                                        'last_modified': obj['LastModified'].isoformat(),
-                                        'type': os.path.splitext(obj['Key'])[1].lstrip('.').lower() if '.' in obj['Key'] else ''
-                                    }
-                                    objects.append(obj_meta)
-            
-            # Sort the URLs alphabetically for consistent results when limiting
-            urls.sort()
-            if objects:
-                objects.sort(key=lambda x: x['s3_path'])
-            
-            # Apply limit if specified
-            if limit and limit > 0:
-                if limit < len(urls):
-                    urls = urls[:limit]
-                if objects and limit < len(objects):
-                    objects = objects[:limit]
-            
-            return urls if output_format == 'array' or return_urls_only else objects
+        records = [record async for record in iter_objects(s3_folder, recursive, limit=limit, refresh=refresh)]
     except NoCredentialsError:
         print("Credentials not available")
         sys.exit(1)
     except Exception as e:
         print(f"Error listing objects in folder {s3_folder}: {str(e)}")
         return []
+    
+    return [record.url for record in records] if output_format == 'array' or return_urls_only else records
 
 def should_process_file(filename, extensions):
     """
@@ -144,114 +95,241 @@ def should_process_file(filename, extensions):
     
     return False
 
-async def upload_file(session, file_path, s3_folder):
+def _make_progress_callback(file_name, file_size):
     """
-    Upload a single file to S3.
+    Build a boto3 transfer callback that prints upload progress for one file.
     
     Args:
-        session (aioboto3.Session): aioboto3 session
-        file_path (str): Path to the file to upload
-        s3_folder (str): Destination folder in S3
+        file_name (str): Name shown in the progress line
+        file_size (int): Total size of the upload in bytes
         
     Returns:
-        tuple: (success, data) where data contains URL and metadata if successful
+        callable: Callback accepting the number of bytes transferred
     """
-    try:
-        # Get file properties
-        file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-        file_type = get_mime_type(file_path)
-        
-        # Generate S3 key with folder prefix
-        s3_key = f"{s3_folder}/{file_name}" if s3_folder else file_name
-        
-        # Get file timestamp
-        timestamp = datetime.fromtimestamp(os.path.getmtime(file_path))
+    file_progress = {
+        'uploaded': 0,
+        'total': file_size,
+        'start_time': None
+    }
+    
+    def progress_callback(bytes_transferred):
+        if file_progress['start_time'] is None:
+            file_progress['start_time'] = datetime.now()
         
-        # Prepare progress callback
-        file_progress = {
-            'uploaded': 0,
-            'total': file_size,
-            'start_time': None
-        }
+        file_progress['uploaded'] = bytes_transferred
+        percent = (bytes_transferred / file_size) * 100 if file_size else 100.0
         
-        def progress_callback(bytes_transferred):
-            if file_progress['start_time'] is None:
-                file_progress['start_time'] = datetime.now()
+        # Calculate ETA
+        if bytes_transferred > 0:
+            elapsed_time = (datetime.now() - file_progress['start_time']).total_seconds()
+            upload_speed = bytes_transferred / elapsed_time if elapsed_time > 0 else 0
+            remaining_bytes = file_size - bytes_transferred
+            eta_seconds = remaining_bytes / upload_speed if upload_speed > 0 else 0
             
-            file_progress['uploaded'] = bytes_transferred
-            percent = (bytes_transferred / file_size) * 100
+            # Format ETA
+            eta = ""
+            if eta_seconds < 60:
+                eta = f"{eta_seconds:.0f}s"
+            else:
+                eta = f"{eta_seconds/60:.1f}m"
             
-            # Calculate ETA
-            if bytes_transferred > 0:
-                elapsed_time = (datetime.now() - file_progress['start_time']).total_seconds()
-                upload_speed = bytes_transferred / elapsed_time if elapsed_time > 0 else 0
-                remaining_bytes = file_size - bytes_transferred
-                eta_seconds = remaining_bytes / upload_speed if upload_speed > 0 else 0
-                
-                # Format ETA
-                eta = ""
-                if eta_seconds < 60:
-                    eta = f"{eta_seconds:.0f}s"
-                else:
-                    eta = f"{eta_seconds/60:.1f}m"
-                
-                # Format speed
-                speed = ""
-                if upload_speed < 1024:
-                    speed = f"{upload_speed:.2f} B/s"
-                elif upload_speed < 1024 * 1024:
-                    speed = f"{upload_speed/1024:.2f} KB/s"
-                else:
-                    speed = f"{upload_speed/(1024*1024):.2f} MB/s"
-                
-                sys.stdout.write(f"\rUploading {file_name}: {percent:.1f}% | {speed} | ETA: {eta}")
+            # Format speed
+            speed = ""
+            if upload_speed < 1024:
+                speed = f"{upload_speed:.2f} B/s"
+            elif upload_speed < 1024 * 1024:
+                speed = f"{upload_speed/1024:.2f} KB/s"
             else:
-                sys.stdout.write(f"\rUploading {file_name}: {percent:.1f}%")
+                speed = f"{upload_speed/(1024*1024):.2f} MB/s"
             
-            sys.stdout.flush()
+            sys.stdout.write(f"\rUploading {file_name}: {percent:.1f}% | {speed} | ETA: {eta}")
+        else:
+            sys.stdout.write(f"\rUploading {file_name}: {percent:.1f}%")
         
-        # Use the async context manager to get the client
-        async with session.client('s3') as s3:
-            # Perform the upload with progress callback, without ACL setting
-            with open(file_path, 'rb') as f:
-                await s3.upload_fileobj(
-                    f, 
-                    get_bucket_name(), 
-                    s3_key,
-                    Callback=progress_callback,
-                    ExtraArgs={
-                        'ContentType': file_type
-                        # Removed 'ACL': 'public-read' to work with limited permissions
-                    }
-                )
+        sys.stdout.flush()
+    
+    return progress_callback
+
+async def upload_fileobj(session, fileobj, s3_key, file_size, content_type=None, extra_args=None,
+                         timestamp=None, s3=None, show_progress=True):
+    """
+    Upload an open file-like object to S3 under an explicit key.
+    
+    Args:
+        session (aioboto3.Session): aioboto3 session
+        fileobj: Readable binary file-like object
+        s3_key (str): Full S3 key to upload to
+        file_size (int): Size of the data in bytes (used for progress)
+        content_type (str): Optional Content-Type, guessed from the key if omitted
+        extra_args (dict): Optional extra S3 arguments (e.g. CacheControl, Metadata)
+        timestamp (datetime): Optional modification time to report in the metadata
+        s3: Optional shared S3 client; a new client is opened if not provided
+        show_progress (bool): Whether to print a progress line for the upload
+        
+    Returns:
+        tuple: (success, data) where data contains URL and metadata if successful
+    """
+    file_name = os.path.basename(s3_key)
+    file_type = content_type or get_mime_type(s3_key)
+    
+    upload_args = {'ContentType': file_type}
+    if extra_args:
+        upload_args.update(extra_args)
+    
+    try:
+        progress_callback = _make_progress_callback(file_name, file_size) if show_progress else None
+        
+        # Perform the upload with progress callback, without ACL setting
+        if s3 is not None:
+            await s3.upload_fileobj(fileobj, get_bucket_name(), s3_key,
+                                    Callback=progress_callback, ExtraArgs=upload_args)
+        else:
+            async with session.client('s3') as client:
+                await client.upload_fileobj(fileobj, get_bucket_name(), s3_key,
+                                            Callback=progress_callback, ExtraArgs=upload_args)
         
         # Print newline after progress
-        print()
+        if show_progress:
+            print()
         
-        # Generate CloudFront URL for the file
-        cloudfront_url = f"{get_cloudfront_url()}/{s3_key}"
+        record_upload(s3_key, file_size)
         
         # Return success with URL and metadata
         return True, {
-            'url': cloudfront_url,
+            'url': f"{get_cloudfront_url()}/{s3_key}",
             'key': s3_key,
             'size': file_size,
             'type': file_type,
-            'timestamp': timestamp.isoformat(),
+            'timestamp': (timestamp or datetime.now()).isoformat(),
             'bucket': get_bucket_name()
         }
+    except NoCredentialsError:
+        print("Error: AWS credentials not found")
+        return False, None
+    except Exception as e:
+        print(f"Error uploading {s3_key}: {str(e)}")
+        return False, None
+
+async def upload_file(session, file_path, s3_folder, s3_key=None, extra_args=None, s3=None, show_progress=True):
+    """
+    Upload a single file to S3.
     
+    Args:
+        session (aioboto3.Session): aioboto3 session
+        file_path (str): Path to the file to upload
+        s3_folder (str): Destination folder in S3
+        s3_key (str): Optional full S3 key, overriding folder + filename
+        extra_args (dict): Optional extra S3 arguments (e.g. ContentType, CacheControl)
+        s3: Optional shared S3 client; a new client is opened if not provided
+        show_progress (bool): Whether to print a progress line for the upload
+        
+    Returns:
+        tuple: (success, data) where data contains URL and metadata if successful
+    """
+    try:
+        # Get file properties
+        file_size = os.path.getsize(file_path)
+        timestamp = datetime.fromtimestamp(os.path.getmtime(file_path))
+        
+        # Generate S3 key with folder prefix
+        if s3_key is None:
+            file_name = os.path.basename(file_path)
+            s3_key = f"{s3_folder}/{file_name}" if s3_folder else file_name
+        
+        extra_args = dict(extra_args) if extra_args else {}
+        content_type = extra_args.pop('ContentType', None) or get_mime_type(file_path)
+        
+        with open(file_path, 'rb') as f:
+            return await upload_fileobj(session, f, s3_key, file_size, content_type=content_type,
+                                        extra_args=extra_args, timestamp=timestamp, s3=s3,
+                                        show_progress=show_progress)
     except FileNotFoundError:
         print(f"Error: File not found: {file_path}")
         return False, None
-    except NoCredentialsError:
-        print("Error: AWS credentials not found")
-        return False, None
     except Exception as e:
         print(f"Error uploading {file_path}: {str(e)}")
         return False, None
+
+async def upload_items(session, items, max_concurrent=10, s3=None, on_result=None, show_progress=True):
+    """
+    Upload a stream of files through a bounded pool of workers sharing one client.
+    
+    Items are pulled from the iterable only as workers become free, so a
+    generator over a very large manifest is never materialized in memory.
+    The source of an item is either a local path or an open binary file
+    object, which is closed once it has been uploaded. With on_result set,
+    results are handed to it and not kept, so memory stays constant however
+    many items there are.
+    
+    Args:
+        session (aioboto3.Session): aioboto3 session
+        items: Iterable or async iterable of (source, s3_key, extra_args) tuples
+        max_concurrent (int): Maximum concurrent uploads
+        s3: Optional shared S3 client; a pooled client is opened if not provided
+        on_result (callable): Optional callback called with (index, result) as each upload finishes
+        show_progress (bool): Whether to print a progress line for each upload
+        
+    Returns:
+        list: (success, data) results in the same order as the items, or the number of items
+              when on_result is given
+    """
+    queue = asyncio.Queue(maxsize=max_concurrent * 2)
+    results = {}
+    
+    async def worker(s3):
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            index, (source, s3_key, extra_args) = entry
+            if hasattr(source, 'read'):
+                with source:
+                    file_size = source.seek(0, os.SEEK_END)
+                    source.seek(0)
+                    result = await upload_fileobj(session, source, s3_key, file_size,
+                                                  extra_args=extra_args, s3=s3,
+                                                  show_progress=show_progress)
+            else:
+                result = await upload_file(session, source, None, s3_key=s3_key,
+                                           extra_args=extra_args, s3=s3,
+                                           show_progress=show_progress)
+            if on_result:
+                on_result(index, result)
+            else:
+                results[index] = result
+    
+    async def run(s3):
+        workers = [asyncio.create_task(worker(s3)) for _ in range(max_concurrent)]
+        try:
+            count = 0
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await queue.put((count, item))
+                    count += 1
+            else:
+                for item in items:
+                    await queue.put((count, item))
+                    count += 1
+            
+            # One sentinel per worker to shut the pool down
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            return count
+        finally:
+            for task in workers:
+                task.cancel()
+    
+    if s3 is not None:
+        total = await run(s3)
+    else:
+        async with get_s3_client(session, max_concurrent) as client:
+            total = await run(client)
     
+    if on_result:
+        return total
+    return [results[i] for i in range(total)]
+
 def get_mime_type(file_path):
     """
     Get the MIME type of a file based on its extension.
@@ -288,10 +366,135 @@ def get_mime_type(file_path):
     # Return the mapped MIME type or a default
     return extension_map.get(ext, 'application/octet-stream')
 
+def get_renamed_filename(filename, index, digits, rename_prefix, rename_mode='replace'):
+    """
+    Compute the new name for a file under a rename prefix.
+    
+    Args:
+        filename (str): The original filename
+        index (int): 1-based position of the file in its group
+        digits (int): Number of digits to pad the index to
+        rename_prefix (str): Prefix for renamed files
+        rename_mode (str): Rename mode - 'replace', 'prepend', or 'append'
+        
+    Returns:
+        str: The new filename
+    """
+    name, ext = os.path.splitext(filename)
+    index_str = f"{index:0{digits}d}"
+    
+    # Apply the rename based on the mode
+    if rename_mode == 'prepend':
+        return f"{rename_prefix}_{name}{ext}"
+    elif rename_mode == 'append':
+        return f"{name}_{rename_prefix}{ext}"
+    else:
+        # Default to replace mode if invalid mode is specified
+        return f"{rename_prefix}_{index_str}{ext}"
+
+def plan_renames(file_paths, rename_prefix=None, rename_mode='replace'):
+    """
+    Compute new filenames for a group of files without touching the disk.
+    
+    Files are numbered in filename order, so the same inputs always produce
+    the same names and a retried upload targets the same keys.
+    
+    Args:
+        file_paths (list): Paths of the files in the group
+        rename_prefix (str): Optional prefix for renamed files
+        rename_mode (str): Rename mode - 'replace', 'prepend', or 'append'
+        
+    Returns:
+        list: (file_path, new_name) tuples in filename order
+    """
+    ordered = sorted(file_paths, key=lambda path: (os.path.basename(path), path))
+    
+    if not rename_prefix:
+        return [(path, os.path.basename(path)) for path in ordered]
+    
+    # Calculate number of digits needed based on total files, capped at 4
+    digits = min(max(len(str(len(ordered))), 1), 4)
+    
+    return [
+        (path, get_renamed_filename(os.path.basename(path), i, digits, rename_prefix, rename_mode))
+        for i, path in enumerate(ordered, start=1)
+    ]
+
+def build_rename_plan(s3_folder, source_dir='.', extensions=None, rename_prefix=None, rename_mode='replace',
+                      specific_files=None, subfolder_mode='ignore'):
+    """
+    Map local files to the S3 keys they will be uploaded to.
+    
+    Renaming only changes the target keys; the local files are left as they are.
+    In 'preserve' mode each subfolder is numbered separately, in 'pool' mode
+    all files are numbered together.
+    
+    Args:
+        s3_folder (str): The folder name in the S3 bucket to upload to
+        source_dir (str): Directory containing files to upload
+        extensions (list): File extensions to include
+        rename_prefix (str): Optional prefix for renamed files
+        rename_mode (str): Rename mode - 'replace', 'prepend', or 'append'
+        specific_files (list): Optional list of specific files to upload
+        subfolder_mode (str): How to handle subfolders: 'ignore', 'pool', or 'preserve'
+        
+    Returns:
+        list: (local_path, s3_key) tuples
+    """
+    # Group files by the S3 folder they will be uploaded to
+    groups = {}
+    
+    if specific_files:
+        groups[s3_folder] = list(specific_files)
+    elif subfolder_mode == 'pool':
+        groups[s3_folder] = [
+            os.path.join(root, file)
+            for root, _, files in os.walk(source_dir)
+            for file in files if should_process_file(file, extensions)
+        ]
+    elif subfolder_mode == 'preserve':
+        for root, _, files in os.walk(source_dir):
+            subfolder_files = [os.path.join(root, f) for f in files if should_process_file(f, extensions)]
+            if subfolder_files:
+                rel_path = os.path.relpath(root, source_dir)
+                target_folder = s3_folder if rel_path == '.' else format_s3_path(s3_folder, rel_path.replace(os.sep, '/'))
+                groups[target_folder] = subfolder_files
+    else:
+        groups[s3_folder] = [
+            os.path.join(source_dir, f) for f in os.listdir(source_dir)
+            if os.path.isfile(os.path.join(source_dir, f)) and should_process_file(f, extensions)
+        ]
+    
+    plan = []
+    for target_folder in sorted(groups):
+        for file_path, new_name in plan_renames(groups[target_folder], rename_prefix, rename_mode):
+            plan.append((file_path, format_s3_path(target_folder, new_name)))
+    
+    return plan
+
+def write_rename_map(plan, map_path):
+    """
+    Write a rename plan to a CSV file mapping local paths to S3 keys and URLs.
+    
+    Args:
+        plan (list): (local_path, s3_key) tuples
+        map_path (str): Path of the CSV file to write
+    """
+    base_url = get_cloudfront_url()
+    with open(map_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['local_path', 's3_key', 'url'])
+        for local_path, s3_key in plan:
+            writer.writerow([local_path, s3_key, f"{base_url}/{s3_key}"])
+    print(f"Wrote rename map for {len(plan)} files to {map_path}")
+
 def rename_files(directory, extensions, rename_prefix=None, rename_mode='replace', specific_files=None):
     """
     Rename files with a common prefix and sequential numbering.
     
+    This renames the files on disk. Uploads use build_rename_plan() instead,
+    which applies the same naming to the S3 keys only.
+    
     Args:
         directory (str): The directory containing files
         extensions (list): List of extensions to include
@@ -304,188 +507,186 @@ def rename_files(directory, extensions, rename_prefix=None, rename_mode='replace
     """
     if specific_files:
         # Use the specific files provided instead of searching the directory
-        files = [os.path.basename(f) for f in specific_files]
-        file_paths = specific_files
+        file_paths = list(specific_files)
     else:
         # Use files from the directory filtered by extension
-        files = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f)) and should_process_file(f, extensions)]
-        file_paths = [os.path.join(directory, f) for f in files]
+        file_paths = [os.path.join(directory, f) for f in os.listdir(directory)
+                      if os.path.isfile(os.path.join(directory, f)) and should_process_file(f, extensions)]
     
-    if not files:
+    if not file_paths:
         print(f"WARNING: No matching files found in directory with extensions: {extensions}")
         if not specific_files:
             print(f"Files in directory: {os.listdir(directory)}")
         return [], {}
-        
-    files.sort()
-    file_paths.sort()
-    print(f"Found {len(files)} matching files to upload")
+    
+    print(f"Found {len(file_paths)} matching files to upload")
     
     renamed_files = []
     original_to_new = {}
     
-    if rename_prefix:
-        # Calculate number of digits needed based on total files
-        num_files = len(files)
-        if num_files <= 9:
-            digits = 1
-        elif num_files <= 99:
-            digits = 2
-        elif num_files <= 999:
-            digits = 3
-        else:  # Cap at 4 digits
-            digits = 4
-            
-        # Format string for the index with leading zeros
-        format_str = f"{{0:0{digits}d}}"
-        
-        for i, (filename, filepath) in enumerate(zip(files, file_paths), start=1):
-            name, ext = os.path.splitext(filename)
-            index_str = format_str.format(i)
-            
-            # Apply the rename based on the mode
-            if rename_mode == 'replace':
-                new_name = f"{rename_prefix}_{index_str}{ext}"
-            elif rename_mode == 'prepend':
-                new_name = f"{rename_prefix}_{name}{ext}"
-            elif rename_mode == 'append':
-                new_name = f"{name}_{rename_prefix}{ext}"
-            else:
-                # Default to replace mode if invalid mode is specified
-                new_name = f"{rename_prefix}_{index_str}{ext}"
-            
+    for filepath, new_name in plan_renames(file_paths, rename_prefix, rename_mode):
+        filename = os.path.basename(filepath)
+        original_to_new[filename] = new_name
+        if rename_prefix:
             new_path = os.path.join(directory, new_name)
             os.rename(filepath, new_path)
             renamed_files.append(new_path)
-            original_to_new[filename] = new_name
             print(f"Renamed: {filepath} -> {new_path}")
-    else:
-        # Keep original filenames
-        renamed_files = file_paths
-        for f in files:
-            original_to_new[f] = f
+        else:
+            renamed_files.append(filepath)
+    
+    if not rename_prefix:
         print("Using original filenames")
     
     return renamed_files, original_to_new
 
+def copy_upload_results(urls, objects, output_format='array', only_first=False, output_file=None):
+    """
+    Copy the URLs of uploaded files to the clipboard (or write them to a file) in the requested format.
+    
+    Args:
+        urls (list): List of CloudFront URLs
+        objects (list): List of objects with metadata
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
+        only_first (bool): Only copy the first URL to clipboard
+        output_file (str or file): Optional file path, '-' for stdout or open text file to write to instead
+    """
+    if not urls:
+        return
+    
+    if only_first and output_format == 'array' and output_file is None:
+        pyperclip.copy(urls[0])
+        print(f"\nCopied first URL to clipboard: {urls[0]}")
+    else:
+        # Upload results are output with the same fields as listed objects
+        base_url = get_cloudfront_url()
+        objects = [obj if 's3_path' in obj else ObjectRecord.from_upload(obj, base_url) for obj in objects]
+        if only_first:
+            urls, objects = urls[:1], objects[:1]
+        name = os.path.dirname(objects[0]['s3_path']) if objects else 's3u'
+        location = write_results(urls, objects, output_format, output_file, name)
+        message = describe_results(location, f"{output_format} format data", output_file)
+        if message:
+            print(f"\n{message}")
+
+async def _upload_local_files(session, s3_folder, extensions, rename_prefix, rename_mode,
+                              max_concurrent, source_dir, specific_files, subfolder_mode, rename_map=None,
+                              processes=1, local_paths=None):
+    """
+    Upload files from a local directory tree under their planned S3 keys.
+    
+    Args:
+        local_paths (dict): Optional dict to fill with S3 key -> local path of the planned files
+    
+    Returns:
+        list: (success, data) upload results, or None if there was nothing to upload
+    """
+    upload_plan = build_rename_plan(s3_folder, source_dir, extensions, rename_prefix, rename_mode,
+                                    specific_files, subfolder_mode)
+    
+    if not upload_plan:
+        print(f"WARNING: No matching files found in directory with extensions: {extensions}")
+        print("No files to upload.")
+        return None
+    
+    print(f"Found {len(upload_plan)} matching files to upload")
+    if rename_prefix:
+        print(f"Uploading under new names with prefix '{rename_prefix}' ({rename_mode} mode); local files are not renamed")
+        
+        # Two files planned to the same key would overwrite each other
+        keys = [s3_key for _, s3_key in upload_plan]
+        if len(set(keys)) != len(keys):
+            print("WARNING: Some files map to the same S3 key and will overwrite each other")
+    else:
+        print("Using original filenames")
+    
+    if rename_map:
+        write_rename_map(upload_plan, rename_map)
+    
+    if local_paths is not None:
+        local_paths.update((s3_key, path) for path, s3_key in upload_plan)
+    
+    # Ensure each subfolder exists in S3 once, rather than once per file
+    target_folders = {os.path.dirname(s3_key) for _, s3_key in upload_plan} - {s3_folder}
+    for target_folder in sorted(target_folders):
+        await ensure_s3_folder_exists(session, target_folder)
+    
+    # Progress tracking
+    total_files = len(upload_plan)
+    print(f"Starting upload of {total_files} files...")
+    
+    # Wait for all uploads to complete
+    items = [(path, s3_key, None) for path, s3_key in upload_plan]
+    if processes and processes > 1:
+        return await upload_items_sharded(items, processes, max_concurrent)
+    return await upload_items(session, items, max_concurrent)
+
+async def _ensure_item_folders(session, items, s3_folder):
+    """
+    Pass upload items through, creating each new subfolder in S3 the first time it is seen.
+    """
+    seen_folders = {s3_folder}
+    async for item in items:
+        target_folder = os.path.dirname(item[1])
+        if target_folder not in seen_folders:
+            seen_folders.add(target_folder)
+            await ensure_s3_folder_exists(session, target_folder)
+        yield item
+
 async def upload_files(s3_folder, extensions=None, rename_prefix=None, rename_mode='replace',
                       only_first=False, max_concurrent=10, source_dir='.', specific_files=None, 
-                      include_existing=True, output_format='array', subfolder_mode='ignore'):
+                      include_existing=True, output_format='array', subfolder_mode='ignore', rename_map=None,
+                      processes=1, output_file=None):
     """
     Upload files from the specified directory to S3.
     
     Args:
         s3_folder (str): The folder name in the S3 bucket to upload to
         extensions (list): File extensions to include (e.g., ['jpg', 'png'])
-        rename_prefix (str): Prefix for renaming files before upload
+        rename_prefix (str): Prefix for the uploaded file names (local files are not renamed)
         rename_mode (str): How to apply the rename prefix ('replace', 'prepend', 'append')
         only_first (bool): Only copy the first URL to clipboard
         max_concurrent (int): Maximum concurrent uploads
-        source_dir (str): Directory containing files to upload
+        source_dir (str): Directory containing files to upload, or a zip/tar archive
         specific_files (list): Optional list of specific files to upload
         include_existing (bool): Whether to include existing files in the CDN links
-        output_format (str): Format for output: 'array', 'json', 'xml', 'html', or 'csv'
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
         subfolder_mode (str): How to handle subfolders: 'ignore', 'pool', or 'preserve'
+        rename_map (str): Optional path of a CSV file to write the local path to S3 key mapping to
+        processes (int): Number of worker processes to shard uploads across (max_concurrent each)
+        output_file (str or file): Optional file path or '-' for stdout to write the results to instead of the clipboard
     
     Returns:
         list: List of CloudFront URLs for uploaded files
     """
     session = get_s3_session()
+    local_paths = {}
     
     # Ensure S3 folder exists
     await ensure_s3_folder_exists(session, s3_folder)
     
-    # Handle files based on subfolder mode
-    if subfolder_mode == 'ignore' or specific_files:
-        # Use the existing logic for specific_files or just the main directory
-        renamed_files, original_to_new = rename_files(source_dir, extensions, rename_prefix, rename_mode, specific_files)
-    else:
-        # We need to handle subfolders
-        all_files = []
+    # Archives are streamed member by member instead of being walked on disk
+    if not specific_files and is_archive(source_dir):
+        if rename_prefix:
+            print("Note: rename prefix is not applied to archive members")
+        print(f"Uploading members of archive: {source_dir}")
         
-        if subfolder_mode == 'pool':
-            # Pool all files from subfolders into one list
-            for root, _, files in os.walk(source_dir):
-                for file in files:
-                    if should_process_file(file, extensions):
-                        all_files.append(os.path.join(root, file))
-            
-            # Rename all files together
-            renamed_files, original_to_new = rename_files(
-                source_dir, 
-                extensions, 
-                rename_prefix, 
-                rename_mode, 
-                specific_files=all_files
-            )
-        elif subfolder_mode == 'preserve':
-            # Preserve the subfolder structure
-            renamed_files = []
-            original_to_new = {}
-            
-            for root, _, files in os.walk(source_dir):
-                subfolder_files = [os.path.join(root, f) for f in files if should_process_file(f, extensions)]
-                
-                if subfolder_files:
-                    # Get relative path for the subfolder
-                    rel_path = os.path.relpath(root, source_dir)
-                    
-                    # Skip the main directory
-                    if rel_path == '.':
-                        subfolder_renamed, subfolder_map = rename_files(
-                            root, 
-                            extensions, 
-                            rename_prefix, 
-                            rename_mode
-                        )
-                    else:
-                        # For subfolders, use the subfolder path for uploads
-                        subfolder_renamed, subfolder_map = rename_files(
-                            root, 
-                            extensions, 
-                            rename_prefix, 
-                            rename_mode
-                        )
-                    
-                    renamed_files.extend(subfolder_renamed)
-                    original_to_new.update(subfolder_map)
-    
-    if not renamed_files:
-        print("No files to upload.")
-        return []
-    
-    # Create a semaphore to limit concurrent uploads
-    semaphore = asyncio.Semaphore(max_concurrent)
-    
-    async def upload_with_semaphore(file):
-        async with semaphore:
-            # Determine the S3 subfolder based on the file's location
-            if subfolder_mode == 'preserve' and not specific_files:
-                rel_path = os.path.relpath(os.path.dirname(file), source_dir)
-                
-                if rel_path == '.':
-                    # File is in the main directory
-                    target_folder = s3_folder
-                else:
-                    # File is in a subfolder
-                    target_folder = f"{s3_folder}/{rel_path}"
-                    # Ensure the subfolder exists in S3
-                    await ensure_s3_folder_exists(session, target_folder)
-            else:
-                # For 'ignore' or 'pool' modes, use the main folder
-                target_folder = s3_folder
-            
-            return await upload_file(session, file, target_folder)
-    
-    # Create tasks for all file uploads
-    tasks = [upload_with_semaphore(file) for file in renamed_files]
-    
-    # Progress tracking
-    total_files = len(tasks)
-    print(f"Starting upload of {total_files} files...")
-    
-    # Wait for all uploads to complete
-    results = await asyncio.gather(*tasks)
+        archive_items = iter_archive_items(
+            source_dir,
+            s3_folder,
+            subfolder_mode,
+            should_include=lambda name: should_process_file(name, extensions),
+            max_buffered=max_concurrent
+        )
+        results = await upload_items(session, _ensure_item_folders(session, archive_items, s3_folder), max_concurrent)
+        total_files = len(results)
+    else:
+        results = await _upload_local_files(session, s3_folder, extensions, rename_prefix, rename_mode,
+                                            max_concurrent, source_dir, specific_files, subfolder_mode,
+                                            rename_map, processes, local_paths)
+        if results is None:
+            return []
+        total_files = len(results)
     
     # Extract successful upload URLs and metadata
     uploaded_urls = []
@@ -498,6 +699,18 @@ async def upload_files(s3_folder, extensions=None, rename_prefix=None, rename_mo
     
     print(f"\nCompleted {len(uploaded_urls)} of {total_files} uploads")
     
+    # Describe the folder in its manifest, so browsing it reads one object instead of listing it
+    if is_folder_manifest_enabled():
+        try:
+            async with get_s3_client(session) as s3:
+                count = await update_folder_manifests(s3, s3_folder,
+                                                      {os.path.dirname(data['key']) for data in uploaded_objects},
+                                                      local_paths, [data['key'] for data in uploaded_objects])
+            if count is not None:
+                print(f"Updated folder manifest ({count} files)")
+        except Exception as e:
+            print(f"Error updating folder manifest: {str(e)}")
+    
     # Get existing files if needed
     if include_existing:
         print("Including existing files in the CDN links...")
@@ -526,14 +739,6 @@ async def upload_files(s3_folder, extensions=None, rename_prefix=None, rename_mo
         all_objects = uploaded_objects
         print(f"Including only newly uploaded files ({len(all_urls)})")
     
-    # Copy to clipboard
-    if all_urls:
-        if only_first and output_format == 'array':
-            pyperclip.copy(all_urls[0])
-            print(f"\nCopied first URL to clipboard: {all_urls[0]}")
-        else:
-            clipboard_content = format_output(all_urls, all_objects, output_format)
-            pyperclip.copy(clipboard_content)
-            print(f"\nCopied {output_format} format data to clipboard")
+    copy_upload_results(all_urls, all_objects, output_format, only_first, output_file)
     
     return all_urls
\ No newline at end of file
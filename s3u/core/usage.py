@@ -0,0 +1,220 @@
+"""
+Storage usage of folders (du).
+
+Usage is added up from one recursive listing of the folder: each listed
+object counts towards the folder itself and each subfolder it is in, down
+to the requested depth. The listing is split across concurrent requests
+(see listing.py), or read from the local listing index when it's on, so
+running du again within 'index_max_age' doesn't list S3 at all.
+"""
+
+import os
+import sys
+import heapq
+from botocore.exceptions import NoCredentialsError
+
+from .s3_core import get_s3_session, get_s3_client
+from .filters import parse_filter
+from .listing import LIST_CONCURRENCY
+from .bucket_index import iter_listing
+from .folder_manifest import is_manifest_key
+from ..utils.progress import format_bytes
+
+# Largest objects kept for each folder
+DEFAULT_TOP = 10
+
+# Extensions shown in the report before the rest are summarized
+MAX_PRINTED_EXTENSIONS = 10
+
+class FolderUsage:
+    """
+    Total size, object count, largest objects and extension breakdown of one folder.
+    """
+    __slots__ = ('folder', 'bytes', 'count', 'top', '_largest', '_extensions')
+    
+    def __init__(self, folder, top=DEFAULT_TOP):
+        """
+        Start an empty total.
+        
+        Args:
+            folder (str): Folder path ('' for the whole bucket)
+            top (int): Number of largest objects to keep
+        """
+        self.folder = folder
+        self.bytes = 0
+        self.count = 0
+        self.top = top
+        # Min-heap of (size, key), so the smallest of the largest is replaced first
+        self._largest = []
+        # Extension -> [object count, bytes]
+        self._extensions = {}
+    
+    def add(self, key, size, extension):
+        """Count an object in the folder."""
+        self.bytes += size
+        self.count += 1
+        
+        if len(self._largest) < self.top:
+            heapq.heappush(self._largest, (size, key))
+        elif size > self._largest[0][0]:
+            heapq.heapreplace(self._largest, (size, key))
+        
+        totals = self._extensions.get(extension)
+        if totals is None:
+            self._extensions[extension] = [1, size]
+        else:
+            totals[0] += 1
+            totals[1] += size
+    
+    @property
+    def largest(self):
+        """list: (key, size) of the largest objects, largest first."""
+        return [(key, size) for size, key in sorted(self._largest, reverse=True)]
+    
+    @property
+    def extensions(self):
+        """list: (extension, object count, bytes) tuples, most bytes first ('' for no extension)."""
+        return sorted(((ext, count, size) for ext, (count, size) in self._extensions.items()),
+                      key=lambda item: item[2], reverse=True)
+    
+    def to_dict(self):
+        """Get the totals as a plain dict (e.g. for JSON output)."""
+        return {
+            'folder': self.folder,
+            'bytes': self.bytes,
+            'count': self.count,
+            'largest': [{'key': key, 'size': size} for key, size in self.largest],
+            'extensions': [{'extension': ext, 'count': count, 'bytes': size}
+                           for ext, count, size in self.extensions]
+        }
+    
+    def __repr__(self):
+        return f"FolderUsage({self.folder!r}, {self.count} objects, {self.bytes} bytes)"
+
+def add_page_usage(usage, contents, prefix, depth, top=DEFAULT_TOP, object_filter=None):
+    """
+    Add a listing page's objects to the folder totals.
+    
+    Args:
+        usage (dict): Folder path -> FolderUsage, updated in place (must contain the listed folder)
+        contents (list): list_objects_v2 'Contents' entries
+        prefix (str): Prefix that was listed ('' or ending in '/')
+        depth (int): Levels of subfolders to total separately
+        top (int): Number of largest objects to keep per folder
+        object_filter (ObjectFilter): Optional filter objects must match to be counted
+    """
+    root = usage[prefix.rstrip('/')]
+    for obj in contents:
+        key = obj['Key']
+        # Folder markers take no space worth reporting, and folder manifests are s3u's own
+        if key.endswith('/') or is_manifest_key(key) or (object_filter is not None and not object_filter(obj)):
+            continue
+        
+        size = obj.get('Size', 0)
+        extension = os.path.splitext(key)[1].lstrip('.').lower() if '.' in os.path.basename(key) else ''
+        root.add(key, size, extension)
+        
+        # Count it in each enclosing subfolder down to the depth
+        parts = key[len(prefix):].split('/')[:-1]
+        for level in range(1, min(depth, len(parts)) + 1):
+            folder = prefix + '/'.join(parts[:level])
+            folder_usage = usage.get(folder)
+            if folder_usage is None:
+                folder_usage = usage[folder] = FolderUsage(folder, top)
+            folder_usage.add(key, size, extension)
+
+async def folder_usage(s3_folder='', depth=1, top=DEFAULT_TOP, object_filter=None, refresh=False):
+    """
+    Add up the storage used by a folder and its subfolders in one listing pass.
+    
+    Args:
+        s3_folder (str): Folder to total ('' for the whole bucket)
+        depth (int): Levels of subfolders to total separately (0 for just the folder)
+        top (int): Number of largest objects to keep per folder
+        object_filter (str or ObjectFilter): Optional filter expression (see filters.py)
+        refresh (bool): Refresh the local listing index first (if it's turned on)
+        
+    Returns:
+        list: FolderUsage of the folder itself, followed by its subfolders in path order
+    """
+    object_filter = parse_filter(object_filter)
+    prefix = s3_folder.strip('/') + '/' if s3_folder.strip('/') else ''
+    usage = {prefix.rstrip('/'): FolderUsage(prefix.rstrip('/'), top)}
+    
+    async with get_s3_client(get_s3_session(), LIST_CONCURRENCY) as s3:
+        async for contents in iter_listing(s3, prefix, refresh=refresh):
+            add_page_usage(usage, contents, prefix, depth, top, object_filter)
+    
+    root = usage.pop(prefix.rstrip('/'))
+    return [root] + [usage[folder] for folder in sorted(usage)]
+
+def print_usage(usages):
+    """
+    Print a du report: subfolder totals (largest first under each parent), largest objects and extensions.
+    
+    Args:
+        usages (list): FolderUsage list as returned by folder_usage
+    """
+    root, subfolders = usages[0], usages[1:]
+    print(f"Usage of {root.folder or 'bucket'}: {root.count} objects, {format_bytes(root.bytes)}")
+    if not root.count:
+        return
+    
+    if subfolders:
+        # Group the subfolders under their parent folders
+        prefix = root.folder + '/' if root.folder else ''
+        children = {}
+        for usage in subfolders:
+            nested = '/' in usage.folder[len(prefix):]
+            children.setdefault(usage.folder.rsplit('/', 1)[0] if nested else root.folder, []).append(usage)
+        
+        print("-" * 64)
+        print(f"{'Folder':<40} {'Objects':>10} {'Size':>12}")
+        print("-" * 64)
+        
+        def print_children(parent, level):
+            for usage in sorted(children.get(parent, []), key=lambda item: item.bytes, reverse=True):
+                name = usage.folder[len(parent) + 1:] if parent else usage.folder
+                print(f"{'  ' * level + name:<40} {usage.count:>10} {format_bytes(usage.bytes):>12}")
+                print_children(usage.folder, level + 1)
+        
+        print_children(root.folder, 0)
+        print("-" * 64)
+    
+    print("\nLargest objects:")
+    for key, size in root.largest:
+        print(f"  {format_bytes(size):>10}  {key}")
+    
+    print("\nBy extension:")
+    extensions = root.extensions
+    for ext, count, size in extensions[:MAX_PRINTED_EXTENSIONS]:
+        share = size / root.bytes * 100 if root.bytes else 0
+        print(f"  {ext or '(none)':<12} {count:>10} objects {format_bytes(size):>12} {share:5.1f}%")
+    if len(extensions) > MAX_PRINTED_EXTENSIONS:
+        print(f"  ... and {len(extensions) - MAX_PRINTED_EXTENSIONS} more")
+
+async def disk_usage(s3_folder='', depth=1, top=DEFAULT_TOP, object_filter=None, refresh=False):
+    """
+    Total a folder's storage and print the report.
+    
+    Args:
+        s3_folder (str): Folder to total ('' for the whole bucket)
+        depth (int): Levels of subfolders to total separately
+        top (int): Number of largest objects to show
+        object_filter (str or ObjectFilter): Optional filter expression (see filters.py)
+        refresh (bool): Refresh the local listing index first (if it's turned on)
+        
+    Returns:
+        list: FolderUsage of the folder itself, followed by its subfolders
+    """
+    try:
+        usages = await folder_usage(s3_folder, depth, top, object_filter, refresh)
+    except NoCredentialsError:
+        print("Credentials not available")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error totaling folder {s3_folder or 'bucket'}: {str(e)}")
+        return []
+    
+    print_usage(usages)
+    return usages
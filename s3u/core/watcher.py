@@ -0,0 +1,323 @@
+"""
+Watch mode: continuously upload new and changed files from a local folder.
+"""
+
+import os
+import time
+import asyncio
+import concurrent.futures
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+from .s3_core import get_s3_session, get_s3_client, ensure_s3_folder_exists, format_s3_path
+from .uploader import should_process_file, upload_items, copy_upload_results
+from .folder_manifest import is_folder_manifest_enabled, update_folder_manifests
+from ..optimizer import get_size_settings, build_process_job, process_file
+
+# Seconds a file's size and modification time must stay unchanged before it is uploaded
+DEFAULT_SETTLE_TIME = 2.0
+
+# Seconds between directory scans when inotify is not available
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Maximum number of files handed to the upload engine at once
+DEFAULT_BATCH_SIZE = 100
+
+# Uploads of an unchanged file tried before it is given up on
+MAX_UPLOAD_ATTEMPTS = 3
+
+def _file_signature(path):
+    """Return (size, mtime) for a file, or None if it no longer exists."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+def _scan_files(source_dir, extensions, subfolder_mode, excluded_dir):
+    """
+    List the files in the watched folder that should be uploaded.
+
+    Args:
+        source_dir (str): The watched directory (absolute)
+        extensions (list): File extensions to include
+        subfolder_mode (str): 'ignore' only scans the top-level directory
+        excluded_dir (str): Directory to skip (where optimized files are written)
+
+    Returns:
+        set: Absolute paths of matching files
+    """
+    found = set()
+
+    if subfolder_mode == 'ignore':
+        with os.scandir(source_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and should_process_file(entry.name, extensions):
+                    found.add(entry.path)
+        return found
+
+    for root, dirs, files in os.walk(source_dir):
+        # Never pick up our own optimized output or hidden folders
+        dirs[:] = [d for d in dirs
+                   if not d.startswith('.') and os.path.join(root, d) != excluded_dir]
+        for file in files:
+            if should_process_file(file, extensions):
+                found.add(os.path.join(root, file))
+    return found
+
+class _InotifyWatcher:
+    """
+    Collects changed file paths from inotify events for a directory tree.
+    """
+    def __init__(self, source_dir, recursive, excluded_dir):
+        self.inotify = INotify()
+        self.recursive = recursive
+        self.excluded_dir = excluded_dir
+        self.watch_dirs = {}
+        self.mask = (inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO |
+                     inotify_flags.CREATE | inotify_flags.MODIFY)
+        self._add_tree(source_dir)
+
+    def _add_tree(self, directory):
+        """Start watching a directory (and its subdirectories when recursive)."""
+        if directory == self.excluded_dir:
+            return
+        self.watch_dirs[self.inotify.add_watch(directory, self.mask)] = directory
+        if self.recursive:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                        self._add_tree(entry.path)
+
+    def read(self, timeout):
+        """
+        Wait up to timeout seconds for events.
+
+        Returns:
+            set: Paths of files that were created or changed
+        """
+        changed = set()
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            directory = self.watch_dirs.get(event.wd)
+            if directory is None or not event.name:
+                continue
+            path = os.path.join(directory, event.name)
+            if event.mask & inotify_flags.ISDIR:
+                if self.recursive and event.mask & (inotify_flags.CREATE | inotify_flags.MOVED_TO):
+                    self._add_tree(path)
+            else:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+def _optimize_batch(paths, optimization_options, source_dir):
+    """
+    Optimize a batch of files with optimizer.process_file.
+
+    Each file is written under the output folder at its path relative to
+    the watched folder, so files with the same name in different
+    subfolders don't overwrite each other.
+
+    Args:
+        paths (list): Files to optimize
+        optimization_options (dict): Options as passed to optimizer.process_directory
+        source_dir (str): The watched directory
+
+    Returns:
+        dict: Map of original path to the path that should be uploaded
+    """
+    output_dir, max_width, quality = get_size_settings(source_dir, optimization_options)
+    os.makedirs(output_dir, exist_ok=True)
+
+    upload_paths = {path: path for path in paths}
+    jobs = []
+    for path in paths:
+        file_output_dir = os.path.normpath(os.path.join(output_dir, os.path.relpath(os.path.dirname(path), source_dir)))
+        job = build_process_job(path, file_output_dir, optimization_options, max_width, quality)
+        if job:
+            os.makedirs(file_output_dir, exist_ok=True)
+            jobs.append(job)
+
+    max_workers = optimization_options.get('max_workers', min(os.cpu_count() or 1, 4))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for success, input_path, output_path in executor.map(process_file, jobs):
+            if success:
+                upload_paths[input_path] = output_path
+            else:
+                print(f"✗ Failed to optimize {os.path.basename(input_path)}, uploading original")
+
+    return upload_paths
+
+async def watch_folder(source_dir, s3_folder, extensions=None, subfolder_mode='ignore', max_concurrent=10,
+                       output_format='array', optimization_options=None, upload_existing=False,
+                       settle_time=DEFAULT_SETTLE_TIME, poll_interval=DEFAULT_POLL_INTERVAL,
+                       batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Watch a folder and upload new and changed files until interrupted.
+
+    Uses inotify when the inotify_simple package is available, otherwise
+    polls the folder. Files are only uploaded once their size and
+    modification time have stopped changing for settle_time seconds.
+
+    Args:
+        source_dir (str): Directory to watch
+        s3_folder (str): The folder name in the S3 bucket to upload to
+        extensions (list): File extensions to include (e.g., ['jpg', 'png'])
+        subfolder_mode (str): How to handle subfolders: 'ignore', 'pool', or 'preserve'
+        max_concurrent (int): Maximum concurrent uploads
+        output_format (str): Format for output: 'array', 'json', 'ndjson', 'xml', 'html', or 'csv'
+        optimization_options (dict): Optional options for optimizing each batch before upload
+        upload_existing (bool): Whether to upload files already present when watching starts
+        settle_time (float): Seconds a file must be unchanged before it is uploaded
+        poll_interval (float): Seconds between scans when polling
+        batch_size (int): Maximum number of files uploaded per batch
+
+    Returns:
+        int: Number of files uploaded
+    """
+    source_dir = os.path.abspath(source_dir)
+    excluded_dir = None
+    if optimization_options:
+        excluded_dir = os.path.join(source_dir, 'optimized')
+
+    session = get_s3_session()
+    await ensure_s3_folder_exists(session, s3_folder)
+
+    # Files that are already uploaded (or present at start), keyed by path
+    uploaded = {}
+    # Files that changed recently: path -> (size, mtime, time of last change)
+    pending = {}
+    # Files whose uploads failed: path -> ((size, mtime) when it failed, failed attempts)
+    failures = {}
+    created_folders = {s3_folder}
+
+    if not upload_existing:
+        for path in _scan_files(source_dir, extensions, subfolder_mode, excluded_dir):
+            uploaded[path] = _file_signature(path)
+
+    watcher = None
+    if INOTIFY_AVAILABLE:
+        watcher = _InotifyWatcher(source_dir, subfolder_mode != 'ignore', excluded_dir)
+        print(f"Watching {source_dir} for changes (inotify)...")
+    else:
+        print(f"Watching {source_dir} for changes (polling every {poll_interval:g}s)...")
+    print("Press Ctrl+C to stop")
+
+    def get_key(path):
+        rel_path = os.path.relpath(path, source_dir).replace(os.sep, '/')
+        if subfolder_mode == 'preserve':
+            return format_s3_path(s3_folder, rel_path)
+        return format_s3_path(s3_folder, os.path.basename(path))
+
+    loop = asyncio.get_running_loop()
+    total_uploaded = 0
+
+    try:
+        async with get_s3_client(session, max_concurrent) as s3:
+            if upload_existing:
+                changed = _scan_files(source_dir, extensions, subfolder_mode, excluded_dir)
+            else:
+                changed = set()
+
+            while True:
+                now = time.monotonic()
+
+                # Track when each candidate file last changed
+                for path in changed | set(pending):
+                    signature = _file_signature(path)
+                    if signature is None or uploaded.get(path) == signature:
+                        pending.pop(path, None)
+                        continue
+                    if not should_process_file(os.path.basename(path), extensions):
+                        continue
+                    previous = pending.get(path)
+                    if previous is None or previous[:2] != signature:
+                        pending[path] = (signature[0], signature[1], now)
+
+                ready = sorted(path for path, (_, _, changed_at) in pending.items()
+                               if now - changed_at >= settle_time)[:batch_size]
+
+                if ready:
+                    for path in ready:
+                        size, mtime, _ = pending.pop(path)
+                        uploaded[path] = (size, mtime)
+
+                    upload_paths = {path: path for path in ready}
+                    if optimization_options:
+                        upload_paths = await loop.run_in_executor(
+                            None, _optimize_batch, ready, optimization_options, source_dir)
+
+                    items = []
+                    for path in ready:
+                        s3_key = get_key(path)
+                        if upload_paths[path] != path:
+                            # Keep the original's location, with the optimized file's name
+                            s3_key = format_s3_path(os.path.dirname(s3_key), os.path.basename(upload_paths[path]))
+                        target_folder = os.path.dirname(s3_key)
+                        if target_folder not in created_folders:
+                            created_folders.add(target_folder)
+                            await ensure_s3_folder_exists(session, target_folder)
+                        items.append((upload_paths[path], s3_key, None))
+
+                    print(f"\nUploading batch of {len(items)} files...")
+                    results = await upload_items(session, items, max_concurrent, s3=s3)
+
+                    uploaded_objects = []
+                    given_up = []
+                    for path, (success, data) in zip(ready, results):
+                        if success and data:
+                            uploaded_objects.append(data)
+                            failures.pop(path, None)
+                            continue
+
+                        # Count attempts while the file stays the same; a changed file starts over
+                        signature = uploaded[path]
+                        previous = failures.get(path)
+                        attempts = previous[1] + 1 if previous and previous[0] == signature else 1
+                        if attempts >= MAX_UPLOAD_ATTEMPTS:
+                            # Leave it until it changes again
+                            failures.pop(path, None)
+                            given_up.append(path)
+                        else:
+                            # Retry failed uploads after the settle time
+                            failures[path] = (signature, attempts)
+                            uploaded.pop(path, None)
+                            pending[path] = (-1, -1, time.monotonic())
+
+                    total_uploaded += len(uploaded_objects)
+                    if uploaded_objects and is_folder_manifest_enabled():
+                        try:
+                            await update_folder_manifests(s3, s3_folder,
+                                                          {os.path.dirname(obj['key']) for obj in uploaded_objects},
+                                                          {s3_key: path for path, s3_key, _ in items},
+                                                          [obj['key'] for obj in uploaded_objects])
+                        except Exception as e:
+                            print(f"Error updating folder manifest: {str(e)}")
+                    print(f"Uploaded {len(uploaded_objects)} of {len(items)} files ({total_uploaded} total)")
+                    if given_up:
+                        print(f"Gave up on {len(given_up)} files after {MAX_UPLOAD_ATTEMPTS} failed uploads "
+                              "(they are retried if they change):")
+                        for path in given_up:
+                            print(f"  {os.path.relpath(path, source_dir)}")
+                    copy_upload_results([obj['url'] for obj in uploaded_objects], uploaded_objects, output_format)
+
+                # Wait for the next round of changes
+                wait = min(poll_interval, settle_time) if pending else poll_interval
+                if watcher:
+                    changed = await loop.run_in_executor(None, watcher.read, wait)
+                else:
+                    await asyncio.sleep(wait)
+                    changed = _scan_files(source_dir, extensions, subfolder_mode, excluded_dir)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print(f"\nStopped watching. Uploaded {total_uploaded} files.")
+    finally:
+        if watcher:
+            watcher.close()
+
+    return total_uploaded
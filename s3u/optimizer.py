@@ -350,36 +350,20 @@ def process_file(file_data):
     
     return (False, input_path, None)
 
-def process_directory(directory, options=None):
+def get_size_settings(directory, options):
     """
-    Optimize images and videos in the given directory with parallel processing.
+    Get the output directory, maximum width and quality for an optimization size.
     
     Args:
         directory (str): Directory containing media to process
-        options (dict): Processing options including:
-            - size (str): Which size to process ('optimized', 'small', or 'tiny')
-            - output_format (str): Image output format ('jpg', 'webp', 'avif')
-            - video_format (str): Video output format ('mp4', 'webm')
-            - optimize_videos (bool): Whether to transcode videos
-            - preset (str): Video encoding preset ('fast', 'medium', 'slow')
-            - max_workers (int): Maximum number of concurrent workers
-    
+        options (dict): Processing options (uses 'size' and 'output_format')
+        
     Returns:
-        tuple: (output_dir, processed_files) - the directory containing optimized media 
-               and the list of processed file paths
+        tuple: (output_dir, max_width, quality)
     """
-    if options is None:
-        options = {}
-    
-    # Set default options
     size = options.get('size', 'optimized')
     output_format = options.get('output_format', 'webp')
-    video_format = options.get('video_format', 'mp4')
-    optimize_videos = options.get('optimize_videos', False)
-    preset = options.get('preset', 'medium')
-    max_workers = options.get('max_workers', min(os.cpu_count() or 1, 4))
     
-    # Determine which size to process and set appropriate parameters
     if size == 'small':
         output_dir = os.path.join(os.path.abspath(directory), 'optimized', 'small')
         max_width = 1080
@@ -398,7 +382,97 @@ def process_directory(directory, options=None):
         output_dir = os.path.join(os.path.abspath(directory), 'optimized')
         max_width = 1920
         quality = 85 if output_format == 'webp' else 2
-        size = 'optimized'  # Normalize the size value
+    
+    return output_dir, max_width, quality
+
+def build_process_job(file_path, output_dir, options, max_width, quality):
+    """
+    Build the process_file() job for a single media file.
+    
+    Args:
+        file_path (str): Path to the media file
+        output_dir (str): Directory to write the optimized file to
+        options (dict): Processing options (see process_directory)
+        max_width (int): Maximum width in pixels
+        quality (int): Quality level for images
+        
+    Returns:
+        tuple: (input_path, output_path, options) or None if the file isn't processed
+    """
+    output_format = options.get('output_format', 'webp')
+    video_format = options.get('video_format', 'mp4')
+    optimize_videos = options.get('optimize_videos', False)
+    preset = options.get('preset', 'medium')
+    
+    image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff')
+    video_extensions = ('.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v')
+    
+    filename = os.path.basename(file_path)
+    file_lower = filename.lower()
+    
+    # Determine output filename and extension
+    base_name = os.path.splitext(filename)[0]
+    
+    if any(file_lower.endswith(ext) for ext in image_extensions):
+        # Use the appropriate extension based on format
+        if output_format == 'webp':
+            output_filename = f"{base_name}.webp"
+        elif output_format == 'avif':
+            output_filename = f"{base_name}.avif"
+        else:
+            output_filename = f"{base_name}.jpg"
+        
+        # Image processing options
+        process_options = {
+            'max_width': max_width,
+            'quality': quality,
+            'output_format': output_format
+        }
+        
+        return (file_path, os.path.join(output_dir, output_filename), process_options)
+    
+    if optimize_videos and any(file_lower.endswith(ext) for ext in video_extensions):
+        # Use the appropriate extension for videos
+        output_filename = f"{base_name}.{video_format}"
+        
+        # Video processing options
+        process_options = {
+            'max_width': max_width,
+            'preset': preset,
+            'video_format': video_format,
+            'optimize_videos': True
+        }
+        
+        return (file_path, os.path.join(output_dir, output_filename), process_options)
+    
+    return None
+
+def process_directory(directory, options=None):
+    """
+    Optimize images and videos in the given directory with parallel processing.
+    
+    Args:
+        directory (str): Directory containing media to process
+        options (dict): Processing options including:
+            - size (str): Which size to process ('optimized', 'small', or 'tiny')
+            - output_format (str): Image output format ('jpg', 'webp', 'avif')
+            - video_format (str): Video output format ('mp4', 'webm')
+            - optimize_videos (bool): Whether to transcode videos
+            - preset (str): Video encoding preset ('fast', 'medium', 'slow')
+            - max_workers (int): Maximum number of concurrent workers
+    
+    Returns:
+        tuple: (output_dir, processed_files) - the directory containing optimized media 
+               and the list of processed file paths
+    """
+    if options is None:
+        options = {}
+    
+    # Set default options
+    max_workers = options.get('max_workers', min(os.cpu_count() or 1, 4))
+    
+    # Determine which size to process and set appropriate parameters
+    output_dir, max_width, quality = get_size_settings(directory, options)
 
     # Create output directory
     try:
@@ -408,56 +482,16 @@ def process_directory(directory, options=None):
         return None, []
     
     # Find media files to process
-    image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff')
-    video_extensions = ('.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v')
-    
     files_to_process = []
     current_dir = os.path.abspath(directory)
     
     for filename in os.listdir(current_dir):
         if not os.path.isfile(os.path.join(current_dir, filename)):
             continue
-            
-        file_lower = filename.lower()
-        file_path = os.path.join(current_dir, filename)
-        
-        # Determine output filename and extension
-        base_name = os.path.splitext(filename)[0]
         
-        if any(file_lower.endswith(ext) for ext in image_extensions):
-            # Use the appropriate extension based on format
-            if output_format == 'webp':
-                output_filename = f"{base_name}.webp"
-            elif output_format == 'avif':
-                output_filename = f"{base_name}.avif"
-            else:
-                output_filename = f"{base_name}.jpg"
-                
-            output_path = os.path.join(output_dir, output_filename)
-            
-            # Image processing options
-            process_options = {
-                'max_width': max_width,
-                'quality': quality,
-                'output_format': output_format
-            }
-            
-            files_to_process.append((file_path, output_path, process_options))
-        
-        elif optimize_videos and any(file_lower.endswith(ext) for ext in video_extensions):
-            # Use the appropriate extension for videos
-            output_filename = f"{base_name}.{video_format}"
-            output_path = os.path.join(output_dir, output_filename)
-            
-            # Video processing options
-            process_options = {
-                'max_width': max_width,
-                'preset': preset,
-                'video_format': video_format,
-                'optimize_videos': True
-            }
-            
-            files_to_process.append((file_path, output_path, process_options))
+        file_data = build_process_job(os.path.join(current_dir, filename), output_dir, options, max_width, quality)
+        if file_data:
+            files_to_process.append(file_data)
     
     if not files_to_process:
         print(f"No media files found in directory to process with current settings")
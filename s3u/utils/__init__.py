@@ -2,10 +2,12 @@
 Utility functions for the S3 Upload Utility
 """
 
-from .progress import ProgressBar
+from .progress import ProgressBar, TransferProgress, format_bytes
 from .aws_helpers import find_cloudfront_for_bucket
 
 __all__ = [
     'ProgressBar',
+    'TransferProgress',
+    'format_bytes',
     'find_cloudfront_for_bucket'
 ]
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Adaptive concurrency limiting for S3 transfers.
+"""
+
+import time
+import asyncio
+from collections import deque
+
+# Error codes S3 returns when it wants clients to slow down
+THROTTLE_ERROR_CODES = ('SlowDown', 'ServiceUnavailable', 'RequestLimitExceeded', 'Throttling', '503')
+
+# Throughput must change by this fraction before the limit is moved
+THROUGHPUT_GAIN = 0.05
+THROUGHPUT_LOSS = 0.2
+
+class AdaptiveLimiter:
+    """
+    A semaphore whose limit tunes itself from observed throughput and throttling.
+    
+    The limit doubles while throughput keeps improving (slow start), then
+    grows by one request at a time while it still helps. It is halved when
+    S3 throttles requests and stepped down when throughput drops, in the
+    style of TCP congestion control (AIMD).
+    
+    Use it like an asyncio.Semaphore (``async with limiter:``) and report
+    transferred bytes with record().
+    """
+    def __init__(self, initial=10, minimum=1, maximum=256, interval=1.0):
+        """
+        Initialize the limiter.
+        
+        Args:
+            initial (int): Starting number of concurrent requests
+            minimum (int): Lowest limit the limiter may settle on
+            maximum (int): Highest limit the limiter may grow to
+            interval (float): Seconds of transfers measured before each adjustment
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.interval = interval
+        self.in_flight = 0
+        self.peak = self.limit
+        self.throttle_count = 0
+        
+        self._waiters = deque()
+        self._slow_start = True
+        self._best_throughput = 0.0
+        self._last_decrease = 0.0
+        self._reset_window()
+    
+    def _reset_window(self):
+        """Start a new throughput measurement window."""
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._saturated = self.in_flight >= self.limit
+    
+    def _wake(self):
+        """Wake as many waiting tasks as there are free slots."""
+        free = self.limit - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+    
+    async def acquire(self):
+        """Wait for a free slot."""
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # We were woken but won't use the slot; pass it on
+                    self._wake()
+                raise
+        
+        self.in_flight += 1
+        if self.in_flight >= self.limit:
+            self._saturated = True
+    
+    def release(self):
+        """Free a slot."""
+        self.in_flight -= 1
+        self._wake()
+    
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+    
+    def record(self, nbytes):
+        """
+        Report a completed transfer and adjust the limit once per interval.
+        
+        Args:
+            nbytes (int): Bytes transferred
+        """
+        self._window_bytes += nbytes or 0
+        
+        elapsed = time.monotonic() - self._window_start
+        if elapsed < self.interval:
+            return
+        
+        throughput = self._window_bytes / elapsed
+        
+        # Only a limit that was actually reached tells us anything about it
+        if self._saturated:
+            if throughput > self._best_throughput * (1 + THROUGHPUT_GAIN):
+                self._best_throughput = throughput
+                step = self.limit if self._slow_start else 1
+                self.limit = min(self.maximum, self.limit + step)
+            elif throughput < self._best_throughput * (1 - THROUGHPUT_LOSS):
+                self._slow_start = False
+                self._best_throughput = throughput
+                self.limit = max(self.minimum, self.limit - max(1, self.limit // 4))
+            else:
+                # More requests stopped helping
+                self._slow_start = False
+        
+        self.peak = max(self.peak, self.limit)
+        self._reset_window()
+        self._wake()
+    
+    def throttled(self):
+        """Halve the limit after S3 throttles a request."""
+        self.throttle_count += 1
+        
+        # One burst of throttling produces many errors; react once per interval
+        now = time.monotonic()
+        if now - self._last_decrease < self.interval:
+            return
+        
+        self._last_decrease = now
+        self._slow_start = False
+        self._best_throughput = 0.0
+        self.limit = max(self.minimum, self.limit // 2)
+        self._reset_window()
+    
+    def _on_needs_retry(self, response=None, **kwargs):
+        """botocore 'needs-retry' hook that spots throttling responses before they are retried."""
+        if not response:
+            return None
+        http_response, parsed = response
+        code = (parsed or {}).get('Error', {}).get('Code')
+        if getattr(http_response, 'status_code', None) == 503 or code in THROTTLE_ERROR_CODES:
+            self.throttled()
+        # Returning None leaves the retry decision to botocore
+        return None
+    
+    def observe_client(self, client):
+        """
+        Watch an S3 client's responses for throttling.
+        
+        Args:
+            client: A botocore or aiobotocore S3 client
+        """
+        client.meta.events.register_first('needs-retry.s3', self._on_needs_retry)
@@ -3,12 +3,39 @@ Progress bar utility for tracking long-running operations.
 """
 
 import time
+import heapq
+
+# Seconds between redraws of a transfer progress bar
+RENDER_INTERVAL = 0.2
+
+# Weight of the newest sample in the moving-average transfer rate
+RATE_SMOOTHING = 0.3
+
+# Number of slowest files listed in a transfer summary
+SLOWEST_COUNT = 5
+
+def format_bytes(nbytes):
+    """
+    Format a byte count in a human-readable way.
+    
+    Args:
+        nbytes (int): Number of bytes
+        
+    Returns:
+        str: The size, e.g. '512 B' or '1.5 MB'
+    """
+    size = float(nbytes)
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            break
+        size /= 1024
+    return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
 
 class ProgressBar:
     """
     A simple progress bar for terminal output.
     """
-    def __init__(self, total, prefix='Progress:', suffix='Complete', length=50, fill='█', print_end="\r"):
+    def __init__(self, total, prefix='Progress:', suffix='Complete', length=50, fill='█', print_end="\r", growing=False):
         """
         Initialize a progress bar.
         
@@ -19,6 +46,7 @@ class ProgressBar:
             length (int): Bar length
             fill (str): Bar fill character
             print_end (str): End character (e.g. "\r", "\n")
+            growing (bool): Whether the total will still grow (see add_total)
         """
         self.total = total
         self.prefix = prefix
@@ -27,6 +55,7 @@ class ProgressBar:
         self.fill = fill
         self.print_end = print_end
         self.current = 0
+        self.growing = growing
         self.start_time = time.time()
         self._update_bar(0)
         
@@ -40,18 +69,31 @@ class ProgressBar:
         self.current += increment
         self._update_bar(self.current)
         
+    def add_total(self, count, done=False):
+        """
+        Grow the total while items are still being discovered.
+        
+        Args:
+            count (int): Number of items to add to the total
+            done (bool): True once no more items will be added
+        """
+        self.total += count
+        self.growing = not done
+        self._update_bar(self.current)
+        
     def _update_bar(self, current):
         """
         Internal method to update the progress bar display.
         """
-        percent = ("{0:.1f}").format(100 * (current / float(self.total)))
-        filled_length = int(self.length * current // self.total)
+        total = max(self.total, 1)
+        percent = ("{0:.1f}").format(100 * (current / float(total)))
+        filled_length = int(self.length * current // total)
         bar = self.fill * filled_length + '-' * (self.length - filled_length)
         
         # Calculate elapsed time and ETA
         elapsed = time.time() - self.start_time
         if current > 0:
-            eta = elapsed * (self.total / current - 1)
+            eta = elapsed * (total / current - 1)
             time_str = f"| {self._format_time(elapsed)} elapsed | ETA: {self._format_time(eta)}"
         else:
             time_str = ""
@@ -60,7 +102,7 @@ class ProgressBar:
         print(f'\r{self.prefix} |{bar}| {percent}% {self.suffix} {time_str}', end=self.print_end)
         
         # Print a new line when complete
-        if current == self.total:
+        if current == self.total and not self.growing:
             print()
             
     def _format_time(self, seconds):
@@ -70,4 +112,139 @@ class ProgressBar:
         elif seconds < 3600:
             return f"{seconds//60}m {seconds%60:.0f}s"
         else:
-            return f"{seconds//3600}h {(seconds%3600)//60}m {seconds%3600%60:.0f}s"
\ No newline at end of file
+            return f"{seconds//3600}h {(seconds%3600)//60}m {seconds%3600%60:.0f}s"
+
+
+class TransferProgress(ProgressBar):
+    """
+    A progress bar driven by bytes rather than files.
+    
+    Shows the transfer rate, bytes remaining and an ETA based on a moving
+    average of the rate, so a mix of tiny and huge files still gives a
+    useful estimate. Bytes of files that were already present (skipped or
+    resumed) count as done without inflating the rate.
+    """
+    def __init__(self, total_bytes=0, total_files=0, prefix='Progress:', suffix='Complete', length=50, fill='█',
+                 growing=False):
+        """
+        Initialize a transfer progress bar.
+        
+        Args:
+            total_bytes (int): Total bytes to transfer
+            total_files (int): Total files to transfer
+            prefix (str): Prefix string
+            suffix (str): Suffix string
+            length (int): Bar length
+            fill (str): Bar fill character
+            growing (bool): Whether the totals will still grow (see add_total)
+        """
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.transferred = 0
+        self.rate = None
+        self.slowest = []
+        self._sample_time = time.time()
+        self._sample_bytes = 0
+        self._last_render = 0
+        self._line_length = 0
+        super().__init__(total_files, prefix, suffix, length, fill, growing=growing)
+    
+    def add_total(self, count, done=False, nbytes=0):
+        """
+        Grow the totals while files are still being discovered.
+        
+        Args:
+            count (int): Number of files to add to the total
+            done (bool): True once no more files will be added
+            nbytes (int): Number of bytes to add to the total
+        """
+        self.total_bytes += nbytes
+        super().add_total(count, done)
+    
+    def add_bytes(self, nbytes):
+        """
+        Record bytes received.
+        
+        Args:
+            nbytes (int): Number of bytes
+        """
+        self.done_bytes += nbytes
+        self.transferred += nbytes
+        self._update_bar(self.current)
+    
+    def finish_file(self, name, size, received, seconds, success=True):
+        """
+        Record a finished (or failed) file.
+        
+        Args:
+            name (str): File name shown in the summary
+            size (int): Size of the file
+            received (int): Bytes received for it in this run (already passed to add_bytes)
+            seconds (float): Time spent transferring it
+            success (bool): Whether the file completed
+        """
+        size = size or 0
+        if success:
+            self.done_bytes += max(0, size - received)
+            if received:
+                heapq.heappush(self.slowest, (seconds, name, received))
+                if len(self.slowest) > SLOWEST_COUNT:
+                    heapq.heappop(self.slowest)
+        else:
+            # Drop the failed file from the totals so they still add up
+            self.done_bytes -= received
+            self.total_bytes -= size
+        self.update(1)
+    
+    def _update_bar(self, current):
+        """
+        Redraw the bar at most every RENDER_INTERVAL seconds (and once when complete).
+        """
+        now = time.time()
+        complete = current == self.total and not self.growing
+        if not complete and now - self._last_render < RENDER_INTERVAL:
+            return
+        self._last_render = now
+        
+        # Moving average of the rate, so one stalled or bursty moment doesn't swing the ETA
+        elapsed = now - self._sample_time
+        if elapsed >= RENDER_INTERVAL:
+            sample = (self.transferred - self._sample_bytes) / elapsed
+            self.rate = sample if self.rate is None else RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * self.rate
+            self._sample_time = now
+            self._sample_bytes = self.transferred
+        
+        if self.total_bytes > 0:
+            fraction = min(1.0, max(0, self.done_bytes) / self.total_bytes)
+        else:
+            fraction = current / max(self.total, 1)
+        filled_length = int(self.length * fraction)
+        bar = self.fill * filled_length + '-' * (self.length - filled_length)
+        
+        remaining = max(0, self.total_bytes - self.done_bytes)
+        line = f'\r{self.prefix} |{bar}| {100 * fraction:.1f}% {self.suffix} | ' \
+               f'{format_bytes(max(0, self.done_bytes))} of {format_bytes(self.total_bytes)} | {current}/{self.total} files'
+        if self.rate is not None:
+            line += f' | {format_bytes(self.rate)}/s | {format_bytes(remaining)} left'
+            if self.rate > 0 and remaining:
+                line += f' | ETA: {self._format_time(remaining / self.rate)}'
+        
+        # Pad over the end of a longer previous line
+        padding = ' ' * max(0, self._line_length - len(line))
+        self._line_length = len(line)
+        print(line + padding, end=self.print_end)
+        
+        if complete:
+            print()
+    
+    def print_summary(self):
+        """Print the bytes transferred, the average rate and the slowest files."""
+        elapsed = time.time() - self.start_time
+        average = self.transferred / elapsed if elapsed > 0 else 0
+        print(f"Transferred {format_bytes(self.transferred)} in {self._format_time(elapsed)} "
+              f"({format_bytes(average)}/s average)")
+        if len(self.slowest) > 1:
+            print("Slowest files:")
+            for seconds, name, size in sorted(self.slowest, reverse=True):
+                rate = size / seconds if seconds > 0 else 0
+                print(f"  {name}: {format_bytes(size)} in {self._format_time(seconds)} ({format_bytes(rate)}/s)")
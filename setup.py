@@ -13,7 +13,7 @@ except (subprocess.SubprocessError, FileNotFoundError):
 setup(
     name="s3u",
     version="0.1.0",
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests', 'tests.*']),
     install_requires=[
         "aioboto3",
         "pyperclip",
@@ -28,6 +28,9 @@ setup(
             "flake8",
             "black",
         ],
+        "watch": [
+            "inotify_simple",  # Event-driven watch mode on Linux (falls back to polling)
+        ],
     },
     entry_points={
         'console_scripts': [
@@ -0,0 +1,17 @@
+import json
+
+import pytest
+
+import s3u.config
+
+@pytest.fixture(autouse=True)
+def config(tmp_path, monkeypatch):
+    """Point s3u at a config in a temporary directory, for a bucket named 'bkt'."""
+    config_dir = tmp_path / '.s3u'
+    config_dir.mkdir()
+    config_file = config_dir / 'config.json'
+    config_file.write_text(json.dumps({'bucket_name': 'bkt', 'cloudfront_url': 'https://cdn.example',
+                                       'setup_complete': True}))
+    monkeypatch.setattr(s3u.config, 'CONFIG_DIR', str(config_dir))
+    monkeypatch.setattr(s3u.config, 'CONFIG_FILE', str(config_file))
+    return config_file
@@ -0,0 +1,170 @@
+"""
+An in-memory stand-in for the parts of the aioboto3 S3 client s3u uses.
+"""
+
+import hashlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+def client_error(code, operation, status=400):
+    """Build the ClientError botocore raises for a failed request."""
+    return ClientError({'Error': {'Code': code, 'Message': code},
+                        'ResponseMetadata': {'HTTPStatusCode': status}}, operation)
+
+class FakeBody:
+    """Streaming body of a GetObject response."""
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+    
+    async def read(self, size=-1):
+        end = len(self.data) if size is None or size < 0 else self.position + size
+        chunk = self.data[self.position:end]
+        self.position += len(chunk)
+        return chunk
+    
+    def close(self):
+        pass
+
+class FakePaginator:
+    """Paginator over FakeS3.list_objects_v2."""
+    def __init__(self, s3):
+        self.s3 = s3
+    
+    async def paginate(self, PaginationConfig=None, **params):
+        if PaginationConfig and PaginationConfig.get('PageSize'):
+            params['MaxKeys'] = PaginationConfig['PageSize']
+        while True:
+            page = await self.s3.list_objects_v2(**params)
+            yield page
+            if not page.get('IsTruncated'):
+                return
+            params['ContinuationToken'] = page['NextContinuationToken']
+
+class FakeS3:
+    """
+    A bucket held in a dict, with list_objects_v2 paging like S3's.
+    
+    Keys are listed in UTF-8 byte order like S3, which for these tests is
+    the same as Python's string order. Requests are recorded in calls.
+    """
+    def __init__(self, keys=(), encryption=None, bucket_encryption=None):
+        self.objects = {}
+        self.calls = []
+        self.bucket_encryption = bucket_encryption
+        for key in keys:
+            self.put(key, encryption=encryption)
+    
+    def put(self, key, data=b'', etag=None, encryption=None, last_modified=None):
+        """Store an object; the ETag defaults to the MD5 of the data."""
+        self.objects[key] = {
+            'data': data,
+            'etag': '"%s"' % (etag or hashlib.md5(data).hexdigest()),
+            'encryption': encryption,
+            'last_modified': last_modified or datetime(2024, 1, 1, tzinfo=timezone.utc)
+        }
+    
+    def _entry(self, key):
+        obj = self.objects[key]
+        return {'Key': key, 'Size': len(obj['data']), 'ETag': obj['etag'], 'LastModified': obj['last_modified']}
+    
+    def get_paginator(self, operation):
+        assert operation == 'list_objects_v2'
+        return FakePaginator(self)
+    
+    async def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, MaxKeys=1000, StartAfter=None,
+                              ContinuationToken=None, **kwargs):
+        self.calls.append(('list_objects_v2', Prefix, StartAfter, ContinuationToken))
+        after = max(filter(None, (StartAfter, ContinuationToken)), default='')
+        contents, prefixes = [], []
+        last = None
+        truncated = False
+        for key in sorted(self.objects):
+            if not key.startswith(Prefix) or key <= after:
+                continue
+            if Delimiter and Delimiter in key[len(Prefix):]:
+                common = Prefix + key[len(Prefix):].split(Delimiter, 1)[0] + Delimiter
+                if prefixes and prefixes[-1] == common:
+                    continue
+                if common <= after:
+                    continue
+                if len(contents) + len(prefixes) >= MaxKeys:
+                    truncated = True
+                    break
+                prefixes.append(common)
+                last = common + '\uffff'
+                continue
+            if len(contents) + len(prefixes) >= MaxKeys:
+                truncated = True
+                break
+            contents.append(self._entry(key))
+            last = key
+        page = {'KeyCount': len(contents) + len(prefixes), 'IsTruncated': truncated}
+        if contents:
+            page['Contents'] = contents
+        if prefixes:
+            page['CommonPrefixes'] = [{'Prefix': common} for common in prefixes]
+        if truncated:
+            page['NextContinuationToken'] = last
+        return page
+    
+    def _headers(self, obj):
+        headers = {'ETag': obj['etag'], 'ContentLength': len(obj['data']), 'LastModified': obj['last_modified']}
+        if obj['encryption'] == 'SSE-C':
+            headers['SSECustomerAlgorithm'] = 'AES256'
+        elif obj['encryption']:
+            headers['ServerSideEncryption'] = obj['encryption']
+        return headers
+    
+    def _lookup(self, Key, IfMatch=None, IfNoneMatch=None, operation='GetObject'):
+        obj = self.objects.get(Key)
+        if obj is None:
+            raise client_error('NoSuchKey', operation, 404)
+        if IfMatch and IfMatch.strip('"') != obj['etag'].strip('"'):
+            raise client_error('PreconditionFailed', operation, 412)
+        if IfNoneMatch and IfNoneMatch.strip('"') == obj['etag'].strip('"'):
+            raise client_error('304', operation, 304)
+        return obj
+    
+    async def get_object(self, Bucket, Key, Range=None, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self.calls.append(('get_object', Key, Range))
+        obj = self._lookup(Key, IfMatch, IfNoneMatch)
+        data = obj['data']
+        if Range:
+            start, _, end = Range[len('bytes='):].partition('-')
+            data = data[int(start):int(end) + 1 if end else None]
+        return dict(self._headers(obj), Body=FakeBody(data))
+    
+    async def head_object(self, Bucket, Key, IfMatch=None, **kwargs):
+        self.calls.append(('head_object', Key))
+        return self._headers(self._lookup(Key, IfMatch, operation='HeadObject'))
+    
+    async def put_object(self, Bucket, Key, Body=b'', IfMatch=None, IfNoneMatch=None, **kwargs):
+        self.calls.append(('put_object', Key))
+        obj = self.objects.get(Key)
+        if (IfMatch and (obj is None or IfMatch.strip('"') != obj['etag'].strip('"'))) or \
+                (IfNoneMatch == '*' and obj is not None):
+            raise client_error('PreconditionFailed', 'PutObject', 412)
+        self.put(Key, Body, last_modified=datetime.now(timezone.utc))
+        return {'ETag': self.objects[Key]['etag']}
+    
+    async def delete_objects(self, Bucket, Delete):
+        self.calls.append(('delete_objects', [obj['Key'] for obj in Delete['Objects']]))
+        for obj in Delete['Objects']:
+            self.objects.pop(obj['Key'], None)
+        return {}
+    
+    async def get_bucket_encryption(self, Bucket):
+        if not self.bucket_encryption:
+            raise client_error('ServerSideEncryptionConfigurationNotFoundError', 'GetBucketEncryption', 404)
+        return {'ServerSideEncryptionConfiguration': {'Rules': [
+            {'ApplyServerSideEncryptionByDefault': {'SSEAlgorithm': self.bucket_encryption}}
+        ]}}
+
+def fake_client(s3):
+    """A replacement for s3_core.get_s3_client that hands out the fake client."""
+    @asynccontextmanager
+    async def get_s3_client(session, max_pool_connections=None):
+        yield s3
+    return get_s3_client
@@ -0,0 +1,76 @@
+import asyncio
+import tarfile
+import zipfile
+
+import pytest
+
+from s3u.core import archive
+
+def _make_archive(path, members):
+    if str(path).endswith('.zip'):
+        with zipfile.ZipFile(path, 'w') as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+    else:
+        with tarfile.open(path, 'w:gz') as tf:
+            for name, data in members.items():
+                path.with_name(name).write_bytes(data)
+                tf.add(str(path.with_name(name)), arcname=name)
+
+@pytest.mark.parametrize('name', ['files.zip', 'files.tar.gz'])
+def test_buffered_members_share_one_memory_budget(tmp_path, monkeypatch, name):
+    monkeypatch.setattr(archive, 'MAX_BUFFERED_BYTES', 250)
+    members = {f"m{i}.bin": bytes([i]) * 100 for i in range(5)}
+    path = tmp_path / name
+    _make_archive(path, members)
+    
+    async def run():
+        held = []
+        async for buffer, s3_key, _ in archive.iter_archive_items(str(path), 'f', max_buffered=10):
+            held.append((s3_key, buffer))
+            if len(held) == 3:
+                # An upload finishing frees its share for the next member
+                held[0][1].close()
+        return held
+    
+    held = asyncio.run(run())
+    
+    assert [s3_key for s3_key, _ in held] == [f"f/m{i}.bin" for i in range(5)]
+    in_memory = [isinstance(buffer, archive._MemberBuffer) for _, buffer in held]
+    assert in_memory[:2] == [True, True] and in_memory[2] is False
+    assert sum(in_memory) <= 3
+    for (s3_key, buffer), data in zip(held[1:], list(members.values())[1:]):
+        assert buffer.read() == data
+        buffer.close()
+
+def test_stopping_early_releases_every_buffer(tmp_path, monkeypatch):
+    budgets = []
+    
+    class RecordedBudget(archive._MemoryBudget):
+        def __init__(self, size):
+            super().__init__(size)
+            budgets.append(self)
+    
+    buffers = []
+    
+    class RecordedBuffer(archive._MemberBuffer):
+        def __init__(self, size, budget):
+            super().__init__(size, budget)
+            buffers.append(self)
+    
+    monkeypatch.setattr(archive, '_MemoryBudget', RecordedBudget)
+    monkeypatch.setattr(archive, '_MemberBuffer', RecordedBuffer)
+    path = tmp_path / 'files.zip'
+    _make_archive(path, {f"m{i}.bin": b'x' * 100 for i in range(20)})
+    
+    async def run():
+        items = archive.iter_archive_items(str(path), 'f', max_buffered=2)
+        buffer, _, _ = await items.__anext__()
+        buffer.close()
+        # Let the reader fill the queue and block on the next member
+        await asyncio.sleep(0.1)
+        await items.aclose()
+    
+    asyncio.run(run())
+    assert len(buffers) > 2 and all(buffer.closed for buffer in buffers)
+    assert budgets[0].available == archive.MAX_BUFFERED_BYTES
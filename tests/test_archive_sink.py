@@ -0,0 +1,22 @@
+import io
+import queue
+import zipfile
+from datetime import datetime
+
+from s3u.core import archive_sink
+
+def test_zip_dates_are_clamped_to_the_zip_range():
+    entries = queue.Queue()
+    for name, year in [('old.txt', 1970), ('now.txt', 2024), ('far.txt', 2200)]:
+        entries.put((name, 1, datetime(year, 6, 1, 12).timestamp(), b'x'))
+    entries.put(None)
+    out = io.BytesIO()
+    
+    archive_sink._write_archive(out, 'zip', entries)
+    
+    with zipfile.ZipFile(out) as archive:
+        dates = {info.filename: info.date_time for info in archive.infolist()}
+        assert archive.read('old.txt') == b'x'
+    assert dates['old.txt'] == (1980, 1, 1, 0, 0, 0)
+    assert dates['now.txt'] == (2024, 6, 1, 12, 0, 0)
+    assert dates['far.txt'] == (2107, 12, 31, 23, 59, 58)
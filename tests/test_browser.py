@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from s3u.core import browser
+from tests.fakes import FakeS3, fake_client
+
+@pytest.fixture
+def use_fake(monkeypatch):
+    """Make list_folders list the given fake bucket."""
+    def install(s3):
+        monkeypatch.setattr(browser, 'get_s3_session', lambda: None)
+        monkeypatch.setattr(browser, 'get_s3_client', fake_client(s3))
+        return s3
+    return install
+
+def _bucket(layout):
+    """A fake bucket from (folder, number of objects) pairs and loose keys."""
+    keys = []
+    for entry in layout:
+        if isinstance(entry, str):
+            keys.append(entry)
+        else:
+            folder, count = entry
+            keys.append(folder + '/')
+            keys.extend(f"{folder}/{i:05d}.jpg" for i in range(count))
+    return FakeS3(keys)
+
+@pytest.mark.parametrize('strategy', ['single', 'parallel', 'auto'])
+def test_strategies_agree(use_fake, strategy):
+    layout = [('a', 2500), ('b', 3), 'loose.txt', ('c', 0), ('d', 1001)] + [(f"e{i:03d}", 2) for i in range(40)]
+    use_fake(_bucket(layout))
+    counts = dict(asyncio.run(browser.list_folders(strategy=strategy)))
+    assert counts == {folder: count for folder, count in (entry for entry in layout if not isinstance(entry, str))}
+
+def test_auto_continuation_after_root_object(use_fake):
+    # The first page ends on a root-level object after a full folder
+    s3 = use_fake(_bucket([('a', 998), 'b.txt'] + [(f"f{i:03d}", 1) for i in range(100)]))
+    counts = dict(asyncio.run(browser.list_folders(strategy='auto')))
+    assert counts['a'] == 998
+    assert all(counts[f"f{i:03d}"] == 1 for i in range(100))
+    # 'a' was complete after the first page, so it wasn't listed again
+    assert not any(call[1] == 'a/' for call in s3.calls)
+
+def test_auto_continues_folder_split_by_first_page(use_fake):
+    use_fake(_bucket([('a', 1500)] + [(f"f{i:03d}", 1) for i in range(100)]))
+    counts = dict(asyncio.run(browser.list_folders(strategy='auto')))
+    assert counts['a'] == 1500
+
+def test_without_counts(use_fake):
+    use_fake(_bucket([('a', 1), ('b', 2), 'c.txt']))
+    assert asyncio.run(browser.list_folders(counts=False)) == [('a', None), ('b', None)]
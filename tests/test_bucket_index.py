@@ -0,0 +1,78 @@
+import asyncio
+import os
+
+import pytest
+
+from s3u.core import bucket_index, search
+from tests.fakes import FakeS3, fake_client
+
+@pytest.fixture
+def use_fake(monkeypatch):
+    """Make searches list the given fake bucket."""
+    def install(s3):
+        monkeypatch.setattr(search, 'get_s3_session', lambda: None)
+        monkeypatch.setattr(search, 'get_s3_client', fake_client(s3))
+        return s3
+    return install
+
+def test_index_is_opened_in_the_config_directory(config):
+    index = bucket_index.get_bucket_index(required=True)
+    assert index.path == str(config.parent / bucket_index.INDEX_DB_NAME)
+    assert os.path.exists(index.path)
+
+def test_search_uses_the_index_in_the_config_directory(use_fake, config):
+    use_fake(FakeS3(['a/hero_banner.jpg', 'a/other.jpg', 'b/hero_banner.png']))
+    records = asyncio.run(search.search_objects('hero_banner'))
+    assert [record.key for record in records] == ['a/hero_banner.jpg', 'b/hero_banner.png']
+    assert os.path.exists(config.parent / bucket_index.INDEX_DB_NAME)
+
+def _indexed(index):
+    return {obj['Key']: (obj['Size'], obj['ETag']) for obj in index.iter_objects('')}
+
+def test_refresh_writes_only_what_changed():
+    s3 = FakeS3()
+    for i in range(2500):
+        s3.put(f"f/{i:05d}.jpg", b'x')
+    index = bucket_index.get_bucket_index(required=True)
+    index.enable_search()
+    asyncio.run(bucket_index.refresh_prefix(s3, index, ''))
+    ids = dict(index._conn.execute('SELECT key, id FROM search_keys'))
+    
+    # Nothing changed: only the prefix's refresh time is written
+    changes = index._conn.total_changes
+    asyncio.run(bucket_index.refresh_prefix(s3, index, ''))
+    assert index._conn.total_changes - changes <= 2
+    
+    s3.put('f/00007.jpg', b'changed')
+    s3.put('f/01500a.jpg', b'new')
+    s3.put('g/new.jpg', b'new')
+    for key in ('f/00000.jpg', 'f/01000.jpg', 'f/02499.jpg'):
+        del s3.objects[key]
+    asyncio.run(bucket_index.refresh_prefix(s3, index, ''))
+    
+    assert _indexed(index) == {key: (len(obj['data']), obj['etag']) for key, obj in s3.objects.items()}
+    # Keys still in the bucket keep their trigram index entries
+    now = dict(index._conn.execute('SELECT key, id FROM search_keys'))
+    assert sorted(now) == sorted(s3.objects)
+    assert all(now[key] == ids[key] for key in now if key in ids)
+    assert [obj['Key'] for obj in index.iter_candidates(['01500a'])] == ['f/01500a.jpg']
+
+def test_refresh_of_a_prefix_leaves_other_keys_alone():
+    s3 = FakeS3(['a/1.jpg', 'b/1.jpg', 'b/2.jpg', 'c/1.jpg'])
+    index = bucket_index.get_bucket_index(required=True)
+    asyncio.run(bucket_index.refresh_prefix(s3, index, ''))
+    del s3.objects['b/2.jpg']
+    del s3.objects['c/1.jpg']
+    
+    asyncio.run(bucket_index.refresh_prefix(s3, index, 'b/'))
+    
+    assert sorted(_indexed(index)) == ['a/1.jpg', 'b/1.jpg', 'c/1.jpg']
+
+@pytest.mark.parametrize('terms', [['ab'], ['img'], []])
+def test_candidates_are_read_in_pages(terms):
+    keys = sorted(f"f/img_{i:04d}_ab.jpg" for i in range(250))
+    index = bucket_index.get_bucket_index(required=True)
+    index.add_objects([{'Key': key, 'Size': 1} for key in keys])
+    
+    assert [obj['Key'] for obj in index.iter_candidates(terms, page_size=100)] == keys
+    assert [obj['Key'] for obj in index.iter_candidates(terms, page_size=50)] == keys
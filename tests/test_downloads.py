@@ -0,0 +1,141 @@
+import os
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+from s3u.core import downloader, mirror
+from s3u.core.download_state import DownloadIndex, FileCommitter, is_md5_etag, response_has_md5_etag
+from tests.fakes import FakeS3, client_error
+
+# A 32-digit ETag that is not the MD5 of the data, as S3 gives SSE-KMS objects
+KMS_ETAG = 'f' * 32
+
+def test_md5_etag_detection():
+    assert is_md5_etag('"%s"' % ('a' * 32))
+    assert not is_md5_etag('a' * 32 + '-3')
+    assert not is_md5_etag('a' * 32, encryption='aws:kms')
+    assert not is_md5_etag('a' * 32, encryption='aws:kms:dsse')
+    assert not is_md5_etag('a' * 32, customer_key=True)
+    assert is_md5_etag('a' * 32, encryption='AES256')
+    assert not response_has_md5_etag({'ETag': 'a' * 32, 'SSECustomerAlgorithm': 'AES256'})
+
+def test_kms_object_downloads_without_checksum(tmp_path):
+    s3 = FakeS3()
+    s3.put('f/secret.bin', b'kms data', etag=KMS_ETAG, encryption='aws:kms')
+    local_path = str(tmp_path / 'secret.bin')
+    recorded = []
+    
+    asyncio.run(downloader.fetch_object(s3, 'f/secret.bin', local_path, 8, '"%s"' % KMS_ETAG,
+                                        on_complete=recorded.append))
+    
+    assert open(local_path, 'rb').read() == b'kms data'
+    assert recorded == [False]
+
+def test_plain_object_with_wrong_data_is_rejected(tmp_path):
+    s3 = FakeS3()
+    s3.put('f/plain.bin', b'data', etag='0' * 32)
+    local_path = str(tmp_path / 'plain.bin')
+    
+    with pytest.raises(IOError, match='checksum mismatch'):
+        asyncio.run(downloader.fetch_object(s3, 'f/plain.bin', local_path, 4, '0' * 32))
+
+def test_index_does_not_hash_kms_objects(tmp_path, monkeypatch):
+    local_path = tmp_path / 'secret.bin'
+    local_path.write_bytes(b'kms data')
+    index = DownloadIndex(str(tmp_path))
+    index.record('secret.bin', str(local_path), KMS_ETAG, md5=False)
+    assert index.is_current('secret.bin', str(local_path), 8, KMS_ETAG)
+    
+    # Touched since it was recorded: can't be verified, and isn't hashed
+    index.entries['secret.bin']['mtime'] = 0
+    monkeypatch.setattr('s3u.core.download_state.file_md5', lambda path: pytest.fail('hashed a KMS object'))
+    assert not index.is_current('secret.bin', str(local_path), 8, KMS_ETAG)
+
+def test_mirror_checksum_skips_kms_buckets():
+    assert asyncio.run(mirror.bucket_etags_are_md5(FakeS3()))
+    assert asyncio.run(mirror.bucket_etags_are_md5(FakeS3(bucket_encryption='AES256')))
+    assert not asyncio.run(mirror.bucket_etags_are_md5(FakeS3(bucket_encryption='aws:kms')))
+
+@pytest.mark.parametrize('policy', ['none', 'always'])
+def test_committer_raises_on_failed_move(tmp_path, policy):
+    part = tmp_path / 'file.s3u-part'
+    part.write_bytes(b'data')
+    committed = []
+    
+    async def run():
+        committer = FileCommitter(policy)
+        with pytest.raises(IOError):
+            await committer.commit(str(part), str(tmp_path / 'missing' / 'file'), 4, lambda: committed.append(1))
+        assert await committer.close() == []
+    
+    asyncio.run(run())
+    assert not committed
+
+def test_committer_batch_reports_failed_moves(tmp_path):
+    good, bad = tmp_path / 'good.s3u-part', tmp_path / 'bad.s3u-part'
+    good.write_bytes(b'1')
+    bad.write_bytes(b'2')
+    committed = []
+    
+    async def run():
+        committer = FileCommitter('batch')
+        await committer.commit(str(good), str(tmp_path / 'good'), 1, lambda: committed.append('good'))
+        await committer.commit(str(bad), str(tmp_path / 'missing' / 'bad'), 1, lambda: committed.append('bad'))
+        return await committer.close()
+    
+    assert asyncio.run(run()) == [str(tmp_path / 'missing' / 'bad')]
+    assert committed == ['good']
+    assert (tmp_path / 'good').read_bytes() == b'1'
+
+def test_ranged_download_writes_every_range(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, 'MIN_PART_SIZE', 1000)
+    monkeypatch.setattr(downloader, 'DOWNLOAD_CHUNK_SIZE', 300)
+    data = bytes(range(256)) * 40
+    s3 = FakeS3()
+    s3.put('f/big.bin', data)
+    local_path = str(tmp_path / 'big.bin')
+    
+    md5 = asyncio.run(downloader.download_ranged(s3, 'f/big.bin', local_path, len(data), concurrency=3))
+    
+    assert md5
+    assert open(local_path, 'rb').read() == data
+    assert len([call for call in s3.calls if call[0] == 'get_object']) > 1
+
+def test_failed_range_stops_the_others_before_closing_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, 'MIN_PART_SIZE', 1000)
+    monkeypatch.setattr(downloader, 'DOWNLOAD_CHUNK_SIZE', 100)
+    data = b'd' * 10000
+    
+    class FailingS3(FakeS3):
+        async def get_object(self, Bucket, Key, Range=None, **kwargs):
+            if Range.startswith('bytes=2000-'):
+                await asyncio.sleep(0.01)
+                raise client_error('InternalError', 'GetObject', 500)
+            response = await super().get_object(Bucket, Key, Range, **kwargs)
+            body = response['Body']
+            read = body.read
+            
+            async def slow_read(size=-1):
+                await asyncio.sleep(0.005)
+                return await read(size)
+            body.read = slow_read
+            return response
+    
+    s3 = FailingS3()
+    s3.put('f/big.bin', data)
+    other_path = tmp_path / 'other.bin'
+    
+    async def run():
+        with pytest.raises(ClientError):
+            await downloader.download_ranged(s3, 'f/big.bin', str(tmp_path / 'big.bin'), len(data), concurrency=5)
+        # The closed descriptor's number is handed out again; nothing may write to it
+        fd = os.open(str(other_path), os.O_WRONLY | os.O_CREAT)
+        try:
+            await asyncio.sleep(0.2)
+            assert [task for task in asyncio.all_tasks() if task is not asyncio.current_task()] == []
+        finally:
+            os.close(fd)
+    
+    asyncio.run(run())
+    assert other_path.read_bytes() == b''
@@ -0,0 +1,98 @@
+import os
+import json
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from s3u.core import folder_manifest
+from tests.fakes import FakeS3
+
+def test_outdated_manifests_of_changed_folders_are_deleted():
+    s3 = FakeS3(['_manifest.json', 'a/_manifest.json', 'a/b/_manifest.json', 'a/b/c/_manifest.json',
+                 'other/_manifest.json', 'a/b/x.jpg'])
+    
+    asyncio.run(folder_manifest.update_folder_manifests(s3, changed_folders={'a/b'}))
+    
+    # The folder and its parents are covered; subfolders and other folders aren't
+    assert sorted(s3.objects) == ['a/b/c/_manifest.json', 'a/b/x.jpg', 'other/_manifest.json']
+    assert [call for call in s3.calls if call[0] == 'delete_objects'] == [
+        ('delete_objects', ['_manifest.json', 'a/_manifest.json', 'a/b/_manifest.json'])
+    ]
+
+def test_nothing_deleted_when_no_manifests_exist():
+    s3 = FakeS3(['a/x.jpg'])
+    asyncio.run(folder_manifest.update_folder_manifests(s3, changed_folders={'a'}))
+    assert not [call for call in s3.calls if call[0] == 'delete_objects']
+
+def test_manifest_keys():
+    assert folder_manifest.is_manifest_key('_manifest.json')
+    assert folder_manifest.is_manifest_key('a/b/_manifest.json')
+    assert not folder_manifest.is_manifest_key('a/my_manifest.json')
+
+def _manifest(s3, folder='a'):
+    return json.loads(s3.objects[f"{folder}/_manifest.json"]['data'])
+
+def _calls(s3, operation):
+    return [call for call in s3.calls if call[0] == operation]
+
+def test_changed_keys_are_patched_into_the_manifest():
+    s3 = FakeS3([f"a/{i:03d}.jpg" for i in range(50)])
+    asyncio.run(folder_manifest.write_folder_manifest(s3, 'a'))
+    listed = _manifest(s3)['listed']
+    
+    s3.put('a/new.jpg', b'new')
+    s3.put('a/001.jpg', b'changed')
+    del s3.objects['a/002.jpg']
+    s3.calls.clear()
+    count = asyncio.run(folder_manifest.write_folder_manifest(
+        s3, 'a', changed_keys=['a/new.jpg', 'a/001.jpg', 'a/002.jpg', 'elsewhere/x.jpg']))
+    
+    manifest = _manifest(s3)
+    assert count == 50
+    assert not _calls(s3, 'list_objects_v2')
+    assert sorted(key for _, key in _calls(s3, 'head_object')) == ['a/001.jpg', 'a/002.jpg', 'a/new.jpg']
+    assert [entry['key'] for entry in manifest['files']] == sorted(key for key in s3.objects if key != 'a/_manifest.json')
+    assert next(entry for entry in manifest['files'] if entry['key'] == 'a/001.jpg')['size'] == len(b'changed')
+    # Patching doesn't count as a listing
+    assert manifest['listed'] == listed
+
+def test_stale_manifest_is_listed_again(config):
+    s3 = FakeS3(['a/1.jpg'])
+    asyncio.run(folder_manifest.write_folder_manifest(s3, 'a'))
+    manifest = _manifest(s3)
+    manifest['listed'] = (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()
+    s3.put('a/_manifest.json', json.dumps(manifest).encode())
+    # Written by another tool
+    s3.put('a/2.jpg', b'other')
+    
+    # Rewritten recently, but listed long ago: browsing lists the folder
+    assert asyncio.run(folder_manifest.read_folder_manifest(s3, 'a/')) is None
+    
+    s3.put('a/3.jpg', b'new')
+    asyncio.run(folder_manifest.write_folder_manifest(s3, 'a', changed_keys=['a/3.jpg']))
+    assert [entry['key'] for entry in _manifest(s3)['files']] == ['a/1.jpg', 'a/2.jpg', 'a/3.jpg']
+    assert [entry['Key'] for entry in asyncio.run(folder_manifest.read_folder_manifest(s3, 'a/'))] == \
+        ['a/1.jpg', 'a/2.jpg', 'a/3.jpg']
+
+def test_many_changed_keys_are_listed_instead():
+    s3 = FakeS3(['a/0.jpg'])
+    asyncio.run(folder_manifest.write_folder_manifest(s3, 'a'))
+    keys = [f"a/{i:03d}.jpg" for i in range(folder_manifest.HEADS_PER_LIST_PAGE + 1)]
+    for key in keys:
+        s3.put(key, b'x')
+    s3.calls.clear()
+    
+    asyncio.run(folder_manifest.write_folder_manifest(s3, 'a', changed_keys=keys))
+    
+    assert _calls(s3, 'list_objects_v2') and not _calls(s3, 'head_object')
+    assert _manifest(s3)['count'] == len(keys) + 1
+
+def test_unchanged_manifest_is_read_from_the_cache(config):
+    s3 = FakeS3(['a/1.jpg'])
+    asyncio.run(folder_manifest.write_folder_manifest(s3, 'a'))
+    s3.calls.clear()
+    
+    entries = asyncio.run(folder_manifest.read_folder_manifest(s3, 'a/'))
+    
+    assert [entry['Key'] for entry in entries] == ['a/1.jpg']
+    assert _calls(s3, 'get_object') == [('get_object', 'a/_manifest.json', None)]
+    assert os.path.isdir(config.parent / folder_manifest.CACHE_DIR_NAME)
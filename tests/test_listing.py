@@ -0,0 +1,87 @@
+import asyncio
+import random
+import string
+
+import pytest
+
+from s3u.core import listing
+from s3u.core.listing import split_points, iter_prefix_pages
+from tests.fakes import FakeS3
+
+def _list(s3, prefix='', **kwargs):
+    async def run():
+        return [[obj['Key'] for obj in page] async for page in iter_prefix_pages(s3, prefix, **kwargs)]
+    return asyncio.run(run())
+
+def _random_keys(count, seed=0):
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + '-_./'
+    return {''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 20))) for _ in range(count)}
+
+def _unicode_keys(count, seed=1):
+    rng = random.Random(seed)
+    alphabet = 'aé日本語фото_-/1😀'
+    return {''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))) for _ in range(count)}
+
+@pytest.mark.parametrize('keys', [
+    _random_keys(6000),
+    {f"img_{i:05d}.jpg" for i in range(7000)},
+    _unicode_keys(4000),
+], ids=['random', 'numbered', 'unicode'])
+def test_parallel_listing_is_complete_and_ordered(keys):
+    s3 = FakeS3(keys)
+    pages = _list(s3)
+    
+    listed = [key for page in pages for key in page]
+    assert listed == sorted(keys)
+    assert all(len(page) <= 1000 for page in pages)
+
+def test_numbered_keys_are_listed_in_parallel_ranges():
+    s3 = FakeS3(f"img_{i:05d}.jpg" for i in range(20000))
+    _list(s3)
+    
+    starts = {start_after for _, _, start_after, _ in s3.calls if start_after}
+    assert len(starts) >= listing.SPLIT_FANOUT - 1
+
+def test_listing_under_a_prefix(monkeypatch):
+    # Ranges ahead of the consumer wait for the buffer to drain
+    monkeypatch.setattr(listing, 'MAX_BUFFERED_PAGES', 2)
+    keys = {f"p/{i:05d}" for i in range(5000)}
+    s3 = FakeS3(keys | {'o/x', 'q/y', 'p'})
+    
+    assert [key for page in _list(s3, 'p/') for key in page] == sorted(keys)
+
+def test_serial_listing_with_page_size():
+    keys = {f"k{i:04d}" for i in range(250)}
+    pages = _list(FakeS3(keys), page_size=100)
+    assert [len(page) for page in pages] == [100, 100, 50]
+    assert [key for page in pages for key in page] == sorted(keys)
+
+def test_split_points_follow_the_keys_characters():
+    assert split_points('img_00999', None, '', 'img_00500') == \
+        ['img_01', 'img_02', 'img_03', 'img_04', 'img_06', 'img_07', 'img_08']
+    assert split_points('p/a', None, 'p/') == ['p/b', 'p/e', 'p/i', 'p/l', 'p/p', 'p/s', 'p/w']
+
+def test_split_points_stay_below_the_high_key():
+    assert split_points('a5', 'a8', '') == ['a6', 'a7']
+
+@pytest.mark.parametrize('low, high, prefix', [
+    ('ab', 'abc', ''),        # low is a prefix of high
+    ('x', 'x', ''),           # empty range
+    ('a9', 'b', ''),          # nothing fits between the ends
+    ('p/zzz', None, 'p/'),    # last character of its class
+    ('é', None, ''),          # character of no class
+])
+def test_unsplittable_ranges(low, high, prefix):
+    assert split_points(low, high, prefix) == []
+
+def test_split_points_are_ordered_and_within_the_range():
+    rng = random.Random(2)
+    keys = sorted(_random_keys(3000, seed=3))
+    for _ in range(2000):
+        low, high = sorted(rng.sample(keys, 2))
+        sample = rng.choice(keys)
+        for end in (high, None):
+            points = split_points(low, end, '', sample)
+            assert points == sorted(set(points))
+            assert all(low < point and (end is None or point < end) for point in points)
@@ -0,0 +1,45 @@
+import asyncio
+
+from s3u.core import manifest, uploader
+
+def test_invalid_jsonl_rows_are_skipped(tmp_path, capsys):
+    path = tmp_path / 'files.jsonl'
+    path.write_text('{"source": "a.txt", "key": "a.txt"}\n'
+                    '{"source": \n'
+                    '\n'
+                    '[1, 2]\n'
+                    '"x"\n'
+                    '{"key": "nothing.txt"}\n'
+                    '{"source": 5}\n'
+                    '{"source": "b.txt"}\n')
+    
+    items = list(manifest.iter_manifest(str(path), base_dir=str(tmp_path)))
+    
+    assert [s3_key for _, s3_key, _ in items] == ['a.txt', 'b.txt']
+    out = capsys.readouterr().out
+    for line_number in (2, 4, 5, 7):
+        assert f"{path}:{line_number}: invalid manifest row" in out
+    assert f"{path}:6: no source path" in out
+
+def test_invalid_csv_rows_report_their_line(tmp_path, capsys):
+    path = tmp_path / 'files.csv'
+    path.write_text('source,key\na.txt,a.txt\n,empty.txt\nb.txt,b.txt\n')
+    
+    items = list(manifest.iter_manifest(str(path), base_dir=str(tmp_path)))
+    
+    assert [s3_key for _, s3_key, _ in items] == ['a.txt', 'b.txt']
+    assert f"{path}:3: no source path" in capsys.readouterr().out
+
+def test_upload_items_does_not_keep_results_for_on_result(monkeypatch):
+    async def fake_upload_file(session, source, s3_folder, s3_key=None, **kwargs):
+        return True, {'key': s3_key}
+    
+    monkeypatch.setattr(uploader, 'upload_file', fake_upload_file)
+    items = ((f"{i}.txt", f"{i}.txt", None) for i in range(25))
+    seen = {}
+    
+    total = asyncio.run(uploader.upload_items(None, items, 4, s3=object(),
+                                              on_result=seen.__setitem__))
+    
+    assert total == 25
+    assert seen == {i: (True, {'key': f"{i}.txt"}) for i in range(25)}
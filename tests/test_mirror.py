@@ -0,0 +1,79 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from s3u.core import mirror
+from tests.fakes import FakeS3
+
+# Modification time of the objects, and of local files older or newer than them
+UPLOADED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+OLDER = UPLOADED.timestamp() - 3600
+NEWER = UPLOADED.timestamp() + 3600
+
+def _diff(s3, local_dir, direction, **kwargs):
+    async def run():
+        return [(action, rel_key) async for action, rel_key, _, _
+                in mirror.diff_trees(s3, str(local_dir), 'f/', direction, **kwargs)]
+    return asyncio.run(run())
+
+def _write(local_dir, rel_key, data, mtime):
+    path = local_dir.joinpath(*rel_key.split('/'))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+
+@pytest.fixture
+def trees(tmp_path):
+    """A local folder and an S3 folder with files on one side, the other, or both."""
+    s3 = FakeS3()
+    for rel_key, data in [('a/c.jpg', b'same'), ('edited.txt', b'v2 data'), ('only-remote.txt', b'r'),
+                          ('touched.txt', b'same'), ('z/deep/old.txt', b'old')]:
+        s3.put('f/' + rel_key, data, last_modified=UPLOADED)
+    s3.put('f/', b'')
+    s3.put('other/a-b.jpg', b'not in the folder')
+    
+    local_dir = tmp_path / 'local'
+    local_dir.mkdir()
+    _write(local_dir, 'a-b.jpg', b'new', OLDER)
+    _write(local_dir, 'a/c.jpg', b'same', UPLOADED.timestamp())
+    _write(local_dir, 'edited.txt', b'v1', OLDER)
+    _write(local_dir, 'touched.txt', b'same', NEWER)
+    _write(local_dir, 'z/deep/new.txt', b'new', OLDER)
+    # Download bookkeeping is never mirrored
+    _write(local_dir, mirror.INDEX_FILENAME, b'{}', OLDER)
+    return s3, local_dir
+
+def test_diff_up(trees):
+    s3, local_dir = trees
+    assert _diff(s3, local_dir, 'up') == [
+        ('new', 'a-b.jpg'),
+        ('changed', 'edited.txt'),
+        ('deleted', 'only-remote.txt'),
+        ('changed', 'touched.txt'),
+        ('new', 'z/deep/new.txt'),
+        ('deleted', 'z/deep/old.txt'),
+    ]
+
+def test_diff_down(trees):
+    s3, local_dir = trees
+    assert _diff(s3, local_dir, 'down') == [
+        ('deleted', 'a-b.jpg'),
+        ('changed', 'edited.txt'),
+        ('new', 'only-remote.txt'),
+        ('deleted', 'z/deep/new.txt'),
+        ('new', 'z/deep/old.txt'),
+    ]
+
+def test_diff_with_checksum_compares_contents(trees):
+    s3, local_dir = trees
+    s3.put('f/touched.txt', b'diff', last_modified=UPLOADED)
+    assert ('changed', 'touched.txt') in _diff(s3, local_dir, 'down', checksum=True)
+    assert ('changed', 'a/c.jpg') not in _diff(s3, local_dir, 'up', checksum=True)
+
+def test_diff_of_missing_local_folder(tmp_path):
+    s3 = FakeS3()
+    s3.put('f/x.txt', b'x')
+    assert _diff(s3, tmp_path / 'missing', 'down') == [('new', 'x.txt')]
+    assert _diff(s3, tmp_path / 'missing', 'up') == [('deleted', 'x.txt')]
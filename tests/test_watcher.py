@@ -0,0 +1,28 @@
+import os
+
+from s3u.core import watcher
+
+def test_optimized_files_keep_their_subfolders(tmp_path, monkeypatch):
+    for folder in ('a', 'b'):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / 'img.jpg').write_bytes(b'jpg')
+    (tmp_path / 'top.jpg').write_bytes(b'jpg')
+    
+    def fake_process_file(job):
+        input_path, output_path, _ = job
+        assert not os.path.exists(output_path), f"{output_path} written twice"
+        with open(output_path, 'w') as f:
+            f.write(input_path)
+        return True, input_path, output_path
+    
+    monkeypatch.setattr(watcher, 'process_file', fake_process_file)
+    paths = [str(tmp_path / 'a' / 'img.jpg'), str(tmp_path / 'b' / 'img.jpg'), str(tmp_path / 'top.jpg')]
+    upload_paths = watcher._optimize_batch(paths, {'output_format': 'webp', 'max_workers': 2}, str(tmp_path))
+    
+    assert upload_paths == {
+        paths[0]: str(tmp_path / 'optimized' / 'a' / 'img.webp'),
+        paths[1]: str(tmp_path / 'optimized' / 'b' / 'img.webp'),
+        paths[2]: str(tmp_path / 'optimized' / 'top.webp')
+    }
+    for path, output_path in upload_paths.items():
+        assert open(output_path).read() == path